@@ -0,0 +1,781 @@
+# =========================================================
+# BENCH: fluxos de ticket e WL contra um Discord falso
+# =========================================================
+# Sobe o bot de verdade (setup_hook + on_ready) em cima de um Discord falso em
+# processo: a sessão HTTP do discord.py é trocada por uma que responde as rotas
+# REST (canais, mensagens, histórico, DM, cargos, interações) com latência,
+# limite por bucket (headers X-RateLimit-*) e 429 configuráveis; o que seria evento de gateway (canal criado/apagado,
+# mensagem do usuário) é injetado direto no ConnectionState / on_message.
+# O discord.py continua fazendo o próprio tratamento de rate limit e retry.
+#
+# Fases, cada uma com N usuários simulados ao mesmo tempo (até --concorrencia):
+#   ticket_abrir   -> TicketSelect.callback
+#   ticket_assumir -> TicketControls.assumir (staff)
+#   ticket_fechar  -> TicketControls.fechar + modal (transcript, log, DM)
+#   wl_iniciar     -> WLPanelView.iniciar
+#   wl_perguntas   -> run_wl_flow_in_channel + uma resposta por pergunta
+#
+# Mostra throughput, p50/p99, chamadas REST por operação (com as rotas), 429s
+# e pico de memória, e grava tudo num JSON pra comparar versões:
+#
+#   python bench/bench_fluxos.py --usuarios 2000
+#   python bench/bench_fluxos.py --latencia-ms 80 --taxa-429 0.02 --fases ticket_abrir,wl_iniciar
+#   python bench/bench_fluxos.py --comparar bench/resultados/fluxos-abc123-20260101-120000.json
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FASES = ("ticket_abrir", "ticket_assumir", "ticket_fechar", "wl_iniciar", "wl_perguntas")
+TIPOS_TICKET = ("Suporte", "Denúncia", "Bug", "Assumir Fac/Corp", "Outro")
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _agora_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# =========================================================
+# DISCORD FALSO (REST)
+# =========================================================
+class RespostaFalsa:
+    def __init__(self, status: int, corpo=None, headers=None):
+        from multidict import CIMultiDict
+
+        self.status = status
+        self.reason = {200: "OK", 204: "No Content", 404: "Not Found", 429: "Too Many Requests"}.get(status, "")
+        self.headers = CIMultiDict(headers or {})
+        if corpo is None:
+            self._texto = ""
+        else:
+            self._texto = json.dumps(corpo)
+            self.headers["Content-Type"] = "application/json"
+
+    async def text(self, encoding: str = "utf-8") -> str:
+        return self._texto
+
+
+class _Requisicao:
+    def __init__(self, discord_falso: "DiscordFalso", method: str, url: str, kwargs: dict):
+        self.discord_falso = discord_falso
+        self.args = (method, url, kwargs)
+
+    async def __aenter__(self) -> RespostaFalsa:
+        return await self.discord_falso.responder(*self.args)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class SessaoFalsa:
+    # Só o pedaço do aiohttp.ClientSession que o discord.py usa
+    def __init__(self, discord_falso: "DiscordFalso"):
+        self.discord_falso = discord_falso
+        self.closed = False
+
+    def request(self, method: str, url, **kwargs) -> _Requisicao:
+        return _Requisicao(self.discord_falso, method, str(url), kwargs)
+
+    async def close(self):
+        self.closed = True
+
+
+class DiscordFalso:
+    def __init__(self, main, latencia: float, jitter: float, taxa_429: float, retry_after: float,
+                 limite_rota: int, janela_rota: float, seed: int):
+        self.main = main
+        self.latencia = latencia
+        self.jitter = jitter
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+        self.limite_rota = limite_rota
+        self.janela_rota = janela_rota
+        self._janelas: dict[tuple, tuple[float, int]] = {}
+        self.rng = random.Random(seed)
+        self._ids = itertools.count(1_400_000_000_000_000_000)
+        self.state = None
+        self.guild_id = 0
+        self.app_id = self.novo_id()
+        self.bot_user = {"id": str(self.novo_id()), "username": "NewRepublicBOT", "discriminator": "0",
+                         "global_name": None, "avatar": None, "bot": True}
+        self.canais: dict[int, dict] = {}
+        self.mensagens: dict[int, dict[int, dict]] = {}
+        self.respostas: dict[str, dict] = {}
+        self.canal_da_interacao: dict[str, int] = {}
+        self.chamadas: Counter = Counter()
+        self.r429: Counter = Counter()
+        self.nao_simuladas: Counter = Counter()
+        self.rotas = [
+            ("PUT", ("applications", None, "guilds", None, "commands"), self._comandos),
+            ("PUT", ("applications", None, "commands"), self._comandos),
+            ("POST", ("guilds", None, "channels"), self._criar_canal),
+            ("PATCH", ("channels", None), self._editar_canal),
+            ("DELETE", ("channels", None), self._apagar_canal),
+            ("GET", ("channels", None, "messages"), self._historico),
+            ("POST", ("channels", None, "messages"), self._enviar_mensagem),
+            ("PATCH", ("channels", None, "messages", None), self._editar_mensagem),
+            ("DELETE", ("channels", None, "messages", None), self._apagar_mensagem),
+            ("POST", ("users", "@me", "channels"), self._abrir_dm),
+            ("PATCH", ("guilds", None, "members", None), self._editar_membro),
+            ("PUT", ("guilds", None, "members", None, "roles", None), self._vazio),
+            ("DELETE", ("guilds", None, "members", None, "roles", None), self._vazio),
+            ("POST", ("interactions", None, None, "callback"), self._callback_interacao),
+            ("POST", ("webhooks", None, None), self._followup),
+            ("PATCH", ("webhooks", None, None, "messages", None), self._editar_followup),
+            ("GET", ("webhooks", None, None, "messages", None), self._ler_followup),
+        ]
+
+    def novo_id(self) -> int:
+        return next(self._ids)
+
+    # ---- transporte ----
+    async def responder(self, method: str, url: str, kwargs: dict) -> RespostaFalsa:
+        from yarl import URL
+
+        u = URL(url)
+        rota = self.main._rota_rest(method, u)
+        partes = u.path.split("/")[3:]  # /api/v10/...
+        self.chamadas[rota] += 1
+        restantes, reset_after = self._janela(rota, partes)
+        atraso = self.latencia + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if atraso > 0:
+            await asyncio.sleep(atraso)
+        if restantes < 0 or (self.taxa_429 and self.rng.random() < self.taxa_429):
+            self.r429[rota] += 1
+            retry_after = reset_after if restantes < 0 else self.retry_after
+            return RespostaFalsa(
+                429,
+                {"message": "You are being rate limited.", "retry_after": retry_after, "global": False},
+                {"Via": "1.1 google", "Retry-After": f"{retry_after:.3f}", "X-RateLimit-Scope": "user"},
+            )
+        resposta = None
+        for metodo, molde, fn in self.rotas:
+            if metodo == method and len(molde) == len(partes) and all(
+                m is None or m == p for m, p in zip(molde, partes)
+            ):
+                resposta = fn(partes, self._corpo(kwargs), dict(u.query))
+                break
+        if resposta is None:
+            self.nao_simuladas[rota] += 1
+            resposta = RespostaFalsa(404, {"message": f"Rota não simulada no bench: {rota}", "code": 0})
+        resposta.headers.update({
+            "X-RateLimit-Limit": str(self.limite_rota),
+            "X-RateLimit-Remaining": str(restantes),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": f"bench-{rota}",
+        })
+        return resposta
+
+    def _janela(self, rota: str, partes: list[str]) -> tuple[int, float]:
+        # Bucket por rota + parâmetro principal (canal, guild, webhook), como no Discord
+        fim = 3 if partes and partes[0] in ("webhooks", "interactions") else 2
+        chave = (rota, "/".join(partes[:fim]))
+        agora = time.monotonic()
+        inicio, usadas = self._janelas.get(chave, (agora, 0))
+        if agora - inicio >= self.janela_rota:
+            inicio, usadas = agora, 0
+        self._janelas[chave] = (inicio, usadas + 1)
+        return self.limite_rota - usadas - 1, max(0.0, self.janela_rota - (agora - inicio))
+
+    @staticmethod
+    def _corpo(kwargs: dict):
+        data = kwargs.get("data")
+        if data is None:
+            return {}
+        if isinstance(data, (str, bytes)):
+            return json.loads(data)
+        # multipart (aiohttp.FormData): só interessa o payload_json
+        for opcoes, _, valor in getattr(data, "_fields", ()):
+            if opcoes.get("name") == "payload_json":
+                return json.loads(valor)
+        return {}
+
+    # ---- payloads ----
+    def _mensagem(self, canal_id: int, corpo: dict, autor: dict) -> dict:
+        anexos = [
+            {"id": str(self.novo_id()), "filename": a.get("filename", "arquivo"), "size": 0,
+             "url": "https://cdn.discordapp.com/bench", "proxy_url": "https://media.discordapp.net/bench"}
+            for a in corpo.get("attachments") or []
+        ]
+        return {
+            "id": str(self.novo_id()), "channel_id": str(canal_id), "author": autor,
+            "content": corpo.get("content") or "", "timestamp": _agora_iso(), "edited_timestamp": None,
+            "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": anexos, "embeds": corpo.get("embeds") or [], "components": corpo.get("components") or [],
+            "pinned": False, "type": 0, "flags": corpo.get("flags") or 0,
+        }
+
+    def guardar_mensagem(self, payload: dict):
+        self.mensagens.setdefault(int(payload["channel_id"]), {})[int(payload["id"])] = payload
+
+    def canal(self, **campos) -> dict:
+        payload = {
+            "id": str(self.novo_id()), "type": 0, "guild_id": str(self.guild_id), "position": len(self.canais),
+            "permission_overwrites": [], "nsfw": False, "parent_id": None, "rate_limit_per_user": 0,
+            "topic": None, "last_message_id": None,
+        }
+        payload.update(campos)
+        self.canais[int(payload["id"])] = payload
+        return payload
+
+    # ---- rotas ----
+    def _vazio(self, partes, corpo, query):
+        return RespostaFalsa(204)
+
+    def _comandos(self, partes, corpo, query):
+        return RespostaFalsa(200, [])
+
+    def _criar_canal(self, partes, corpo, query):
+        payload = self.canal(
+            name=corpo.get("name", "canal"), type=corpo.get("type", 0), parent_id=corpo.get("parent_id"),
+            permission_overwrites=corpo.get("permission_overwrites") or [],
+        )
+        # evento de gateway que o Discord mandaria logo depois
+        self.state.parse_channel_create(payload)
+        return RespostaFalsa(201, payload)
+
+    def _editar_canal(self, partes, corpo, query):
+        payload = self.canais.get(int(partes[1]))
+        if payload is None:
+            return RespostaFalsa(404, {"message": "Unknown Channel", "code": 10003})
+        payload.update({k: v for k, v in corpo.items() if k in ("name", "topic", "parent_id", "permission_overwrites")})
+        self.state.parse_channel_update(payload)
+        return RespostaFalsa(200, payload)
+
+    def _apagar_canal(self, partes, corpo, query):
+        payload = self.canais.pop(int(partes[1]), None)
+        if payload is None:
+            return RespostaFalsa(404, {"message": "Unknown Channel", "code": 10003})
+        self.mensagens.pop(int(partes[1]), None)
+        self.state.parse_channel_delete(payload)
+        return RespostaFalsa(200, payload)
+
+    def _historico(self, partes, corpo, query):
+        msgs = self.mensagens.get(int(partes[1]), {})
+        limite = int(query.get("limit", 50))
+        ids = sorted(msgs)
+        if "after" in query:
+            depois = int(query["after"])
+            ids = [i for i in ids if i > depois][:limite]
+        elif "before" in query:
+            antes = int(query["before"])
+            ids = [i for i in ids if i < antes][-limite:]
+        else:
+            ids = ids[-limite:]
+        # o Discord devolve do mais novo pro mais antigo
+        return RespostaFalsa(200, [msgs[i] for i in reversed(ids)])
+
+    def _enviar_mensagem(self, partes, corpo, query):
+        canal_id = int(partes[1])
+        if canal_id not in self.canais:
+            return RespostaFalsa(404, {"message": "Unknown Channel", "code": 10003})
+        payload = self._mensagem(canal_id, corpo, self.bot_user)
+        self.guardar_mensagem(payload)
+        return RespostaFalsa(200, payload)
+
+    def _editar_mensagem(self, partes, corpo, query):
+        payload = self.mensagens.get(int(partes[1]), {}).get(int(partes[3]))
+        if payload is None:
+            return RespostaFalsa(404, {"message": "Unknown Message", "code": 10008})
+        payload.update({k: v for k, v in corpo.items() if k in ("content", "embeds", "components", "flags")})
+        payload["edited_timestamp"] = _agora_iso()
+        return RespostaFalsa(200, payload)
+
+    def _apagar_mensagem(self, partes, corpo, query):
+        if self.mensagens.get(int(partes[1]), {}).pop(int(partes[3]), None) is None:
+            return RespostaFalsa(404, {"message": "Unknown Message", "code": 10008})
+        return RespostaFalsa(204)
+
+    def _abrir_dm(self, partes, corpo, query):
+        payload = self.canal(type=1, recipients=[{"id": str(corpo["recipient_id"]), "username": "dm",
+                                                  "discriminator": "0", "avatar": None}])
+        payload.pop("guild_id")
+        return RespostaFalsa(200, payload)
+
+    def _editar_membro(self, partes, corpo, query):
+        membro = self.state._get_guild(self.guild_id).get_member(int(partes[3]))
+        if membro is None:
+            return RespostaFalsa(404, {"message": "Unknown Member", "code": 10007})
+        return RespostaFalsa(200, {
+            "user": {"id": str(membro.id), "username": membro.name, "discriminator": "0", "avatar": None},
+            "roles": corpo.get("roles", [str(r.id) for r in membro.roles[1:]]),
+            "nick": corpo.get("nick", membro.nick), "joined_at": _agora_iso(), "deaf": False, "mute": False,
+        })
+
+    def _callback_interacao(self, partes, corpo, query):
+        if corpo.get("type") == 9:  # modal: o bench responde com o envio
+            self.respostas[partes[2]] = corpo
+        return RespostaFalsa(204)
+
+    def _followup(self, partes, corpo, query):
+        canal_id = self.canal_da_interacao.get(partes[2], 0)
+        return RespostaFalsa(200, self._mensagem(canal_id, corpo, self.bot_user))
+
+    def _editar_followup(self, partes, corpo, query):
+        canal_id = self.canal_da_interacao.get(partes[2], 0)
+        return RespostaFalsa(200, self._mensagem(canal_id, corpo, self.bot_user))
+
+    def _ler_followup(self, partes, corpo, query):
+        return self._editar_followup(partes, {}, query)
+
+
+# =========================================================
+# SERVIDOR SIMULADO (guild, membros, interações)
+# =========================================================
+class Simulacao:
+    def __init__(self, main, falso: DiscordFalso, usuarios: int, staff: int):
+        self.main = main
+        self.falso = falso
+        self.discord = main.discord
+        self.bot = main.bot
+        self.state = main.bot._connection
+        self.usuarios: list[dict] = []
+        self.staff: list[dict] = []
+        self._n_usuarios = usuarios
+        self._n_staff = staff
+        self.painel_ticket: dict = {}
+        self.painel_wl: dict = {}
+
+    def _membro(self, nome: str, cargos: list[int]) -> dict:
+        return {
+            "user": {"id": str(self.falso.novo_id()), "username": nome, "discriminator": "0",
+                     "global_name": None, "avatar": None},
+            "roles": [str(r) for r in cargos], "joined_at": _agora_iso(), "deaf": False, "mute": False, "flags": 0,
+        }
+
+    async def subir(self):
+        main, falso, discord = self.main, self.falso, self.discord
+        guild_id = falso.guild_id = int(main.GUILD_ID or falso.novo_id())
+
+        def cargo(nome: str, posicao: int, permissoes: int = 0) -> dict:
+            return {"id": str(falso.novo_id()), "name": nome, "color": 0, "hoist": False, "position": posicao,
+                    "permissions": str(permissoes), "managed": False, "mentionable": False, "flags": 0}
+
+        cargos = [cargo("@everyone", 0)]
+        cargos[0]["id"] = str(guild_id)
+        por_nome = {}
+        for i, (chave, (tipo, nome)) in enumerate(main.CONFIG_ITENS.items()):
+            if tipo == "cargo":
+                cargos.append(cargo(main.CONFIG.nome(chave), i + 1))
+                por_nome[chave] = int(cargos[-1]["id"])
+        cargos.append(cargo("Bot", 50, 8))
+
+        for chave, (tipo, _) in main.CONFIG_ITENS.items():
+            if tipo == "categoria":
+                falso.canal(name=main.CONFIG.nome(chave), type=4)
+        for chave, (tipo, _) in main.CONFIG_ITENS.items():
+            if tipo == "canal":
+                falso.canal(name=main.CONFIG.nome(chave))
+        canal_painel = falso.canal(name="painel")
+
+        bot_membro = {"user": falso.bot_user, "roles": [cargos[-1]["id"]], "joined_at": _agora_iso(),
+                      "deaf": False, "mute": False, "flags": 0}
+        self.usuarios = [self._membro(f"membro{i}", [por_nome["CARGO_MEMBRO"]]) for i in range(self._n_usuarios)]
+        self.staff = [self._membro(f"staff{i}", [por_nome["CARGO_STAFF"]]) for i in range(self._n_staff)]
+
+        # cliente "logado": loop, sessão HTTP falsa, usuário e application id
+        await self.bot._async_setup_hook()
+        self.bot.http._HTTPClient__session = SessaoFalsa(falso)
+        self.bot.http.token = "bench"
+        self.bot.http._global_over = asyncio.Event()
+        self.bot.http._global_over.set()
+        self.state.user = discord.ClientUser(state=self.state, data=falso.bot_user)
+        self.state.application_id = falso.app_id
+        falso.state = self.state
+
+        guild = discord.Guild(data={
+            "id": str(guild_id), "name": "New Republic (bench)", "owner_id": falso.bot_user["id"],
+            "roles": cargos, "channels": [c for c in falso.canais.values()], "emojis": [], "stickers": [],
+            "features": [], "members": [bot_membro] + self.usuarios + self.staff,
+            "member_count": 1 + len(self.usuarios) + len(self.staff), "preferred_locale": "pt-BR",
+        }, state=self.state)
+        self.state._add_guild(guild)
+
+        self.painel_ticket = falso._mensagem(int(canal_painel["id"]), {}, falso.bot_user)
+        self.painel_wl = falso._mensagem(int(canal_painel["id"]), {}, falso.bot_user)
+        for painel in (self.painel_ticket, self.painel_wl):
+            falso.guardar_mensagem(painel)
+
+        await self.bot.setup_hook()
+        await self.bot.on_ready()
+        return guild
+
+    async def descer(self):
+        await self.bot.close()
+
+    # ---- interações ----
+    def interacao(self, membro: dict, canal_id: int, tipo: int, data: dict, mensagem: dict = None):
+        token = secrets.token_urlsafe(24)
+        self.falso.canal_da_interacao[token] = canal_id
+        payload = {
+            "id": str(self.falso.novo_id()), "application_id": str(self.falso.app_id), "type": tipo,
+            "token": token, "version": 1, "guild_id": str(self.falso.guild_id),
+            "channel": {"id": str(canal_id), "type": 0}, "channel_id": str(canal_id),
+            "member": dict(membro, permissions="0"), "data": data, "locale": "pt-BR", "guild_locale": "pt-BR",
+        }
+        if mensagem is not None:
+            payload["message"] = mensagem
+        return self.discord.Interaction(data=payload, state=self.state)
+
+    async def clicar(self, view, custom_id: str, membro: dict, canal_id: int, mensagem: dict, valores=None):
+        item = next(i for i in view.children if getattr(i, "custom_id", None) == custom_id)
+        data = {"custom_id": custom_id, "component_type": item.type.value}
+        if valores is not None:
+            data["values"] = valores
+        interaction = self.interacao(membro, canal_id, 3, data, mensagem)
+        item._refresh_state(interaction, data)
+        await item.callback(interaction)
+        return interaction
+
+    async def enviar_modal(self, interaction, membro: dict, canal_id: int, valores: list[str]):
+        corpo = self.falso.respostas.pop(interaction.token, None)
+        if not corpo or corpo.get("type") != 9:
+            raise RuntimeError("o handler não abriu um modal")
+        custom_id = corpo["data"]["custom_id"]
+        modal = self.state._view_store._modals.pop(custom_id)
+        componentes = [
+            {"type": 1, "components": [{"type": 4, "custom_id": linha["components"][0]["custom_id"], "value": valor}]}
+            for linha, valor in zip(corpo["data"]["components"], valores)
+        ]
+        envio = self.interacao(membro, canal_id, 5, {"custom_id": custom_id, "components": componentes})
+        modal._refresh(envio, componentes)
+        await modal.on_submit(envio)
+        modal.stop()
+
+    async def mensagem_do_usuario(self, membro: dict, canal_id: int, conteudo: str):
+        # MESSAGE_CREATE: fica no histórico do canal e passa pelo on_message do bot
+        payload = self.falso._mensagem(canal_id, {"content": conteudo}, membro["user"])
+        payload["guild_id"] = str(self.falso.guild_id)
+        payload["member"] = {k: v for k, v in membro.items() if k != "user"}
+        self.falso.guardar_mensagem(payload)
+        canal = self.bot.get_channel(canal_id)
+        await self.bot.on_message(self.discord.Message(state=self.state, channel=canal, data=payload))
+
+    def mensagem_com_botao(self, canal_id: int, custom_id: str) -> dict:
+        for msg in self.falso.mensagens.get(canal_id, {}).values():
+            for linha in msg["components"]:
+                if any(c.get("custom_id") == custom_id for c in linha.get("components", ())):
+                    return msg
+        raise RuntimeError(f"nenhuma mensagem com {custom_id} em {canal_id}")
+
+    async def esperar_fundo(self, timeout: float = 60.0):
+        # logs na fila e canais com exclusão agendada saem antes da próxima fase
+        main = self.main
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite and any(k.startswith("apagar:") for k in main.AGENDA._tarefas):
+            await asyncio.sleep(0.1)
+        await main.LOGS.esvaziar(max(1.0, limite - time.monotonic()))
+        await main.STATE.flush()
+
+
+def resposta_valida(p) -> str:
+    if p.opcoes:
+        return "A"
+    if p.faixa:
+        return str(p.faixa[0])
+    if p.regex:
+        return "12345"
+    return ("Resposta de teste do bench. " * 10)[:max(p.min_caracteres, 20)] if p.min_caracteres else "Resposta do bench"
+
+
+# =========================================================
+# FASES
+# =========================================================
+class Fase:
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.latencias: list[float] = []
+        self.erros: Counter = Counter()
+        self.inicio = 0.0
+        self.fim = 0.0
+
+    async def medir(self, coro):
+        t0 = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            self.erros[f"{type(e).__name__}: {e}"[:200]] += 1
+        else:
+            self.latencias.append(time.perf_counter() - t0)
+
+
+async def rodar_fase(sim: Simulacao, nome: str, concorrencia: int, tarefas, memoria: bool) -> dict:
+    fase = Fase(nome)
+    sem = asyncio.Semaphore(concorrencia)
+    antes = Counter(sim.falso.chamadas)
+    antes_429 = sum(sim.falso.r429.values())
+    if memoria:
+        tracemalloc.reset_peak()
+
+    async def uma(fabrica):
+        async with sem:
+            await fabrica(fase)
+
+    fase.inicio = time.perf_counter()
+    await asyncio.gather(*(uma(f) for f in tarefas))
+    fase.fim = time.perf_counter()
+    await sim.esperar_fundo()
+
+    chamadas = sim.falso.chamadas - antes
+    ops = len(fase.latencias) + sum(fase.erros.values())
+    duracao = fase.fim - fase.inicio
+    lat = sorted(fase.latencias)
+
+    def q(p: float):
+        return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2) if lat else None
+
+    resultado = {
+        "ops": ops,
+        "erros": sum(fase.erros.values()),
+        "duracao_s": round(duracao, 3),
+        "ops_por_s": round(ops / duracao, 1) if duracao else None,
+        "p50_ms": q(0.50),
+        "p90_ms": q(0.90),
+        "p99_ms": q(0.99),
+        "max_ms": round(lat[-1] * 1000, 2) if lat else None,
+        "rest_total": sum(chamadas.values()),
+        "rest_por_op": round(sum(chamadas.values()) / ops, 2) if ops else None,
+        "rest_429": sum(sim.falso.r429.values()) - antes_429,
+        "rotas": {r: round(n / ops, 2) for r, n in chamadas.most_common()} if ops else {},
+    }
+    if memoria:
+        resultado["pico_memoria_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+    if fase.erros:
+        resultado["exemplos_erro"] = dict(fase.erros.most_common(5))
+    return resultado
+
+
+def tarefas_ticket_abrir(sim: Simulacao, view):
+    canal_id = int(sim.painel_ticket["channel_id"])
+
+    def fabrica(i: int, membro: dict):
+        async def run(fase: Fase):
+            await fase.medir(sim.clicar(view, "nr_ticket_select", membro, canal_id, sim.painel_ticket,
+                                        [TIPOS_TICKET[i % len(TIPOS_TICKET)]]))
+        return run
+    return [fabrica(i, m) for i, m in enumerate(sim.usuarios)]
+
+
+def tickets_por_usuario(sim: Simulacao) -> dict[int, int]:
+    return {info["user_id"]: cid for cid, info in sim.main.STATE.tickets.items()}
+
+
+def tarefas_ticket_assumir(sim: Simulacao, view):
+    tickets = tickets_por_usuario(sim)
+
+    def fabrica(i: int, canal_id: int):
+        staff = sim.staff[i % len(sim.staff)]
+
+        async def run(fase: Fase):
+            msg = sim.mensagem_com_botao(canal_id, "nr_ticket_assumir")
+            await fase.medir(sim.clicar(view, "nr_ticket_assumir", staff, canal_id, msg))
+        return run
+    return [fabrica(i, cid) for i, cid in enumerate(tickets.values())]
+
+
+def tarefas_ticket_fechar(sim: Simulacao, view):
+    tickets = tickets_por_usuario(sim)
+    membros = {int(m["user"]["id"]): m for m in sim.usuarios}
+
+    def fabrica(membro: dict, canal_id: int):
+        async def fechar():
+            msg = sim.mensagem_com_botao(canal_id, "nr_ticket_fechar")
+            interaction = await sim.clicar(view, "nr_ticket_fechar", membro, canal_id, msg)
+            await sim.enviar_modal(interaction, membro, canal_id, ["Resolvido (bench)"])
+
+        async def run(fase: Fase):
+            await fase.medir(fechar())
+        return run
+    return [fabrica(membros[uid], cid) for uid, cid in tickets.items() if uid in membros]
+
+
+def tarefas_wl_iniciar(sim: Simulacao, view):
+    canal_id = int(sim.painel_wl["channel_id"])
+
+    def fabrica(membro: dict):
+        async def run(fase: Fase):
+            await fase.medir(sim.clicar(view, "nr_wl_iniciar", membro, canal_id, sim.painel_wl))
+        return run
+    return [fabrica(m) for m in sim.usuarios]
+
+
+def tarefas_wl_perguntas(sim: Simulacao):
+    main = sim.main
+    guild = sim.bot.get_guild(sim.falso.guild_id)
+    respostas = [resposta_valida(p) for p in main.QUESTIONARIO.perguntas]
+
+    def fabrica(membro: dict):
+        async def questionario():
+            ativa = main.WL_ATIVAS.get(guild.id, int(membro["user"]["id"]))
+            if ativa is None or not ativa.channel_id:
+                raise RuntimeError("WL sem canal")
+            canal = guild.get_channel(ativa.channel_id)
+            await main.run_wl_flow_in_channel(sim.bot, canal, guild.get_member(int(membro["user"]["id"])))
+            for texto in respostas:
+                await sim.mensagem_do_usuario(membro, canal.id, texto)
+
+        async def run(fase: Fase):
+            await fase.medir(questionario())
+        return run
+    return [fabrica(m) for m in sim.usuarios]
+
+
+async def executar(args, main) -> dict:
+    falso = DiscordFalso(main, args.latencia_ms / 1000, args.jitter_ms / 1000, args.taxa_429,
+                         args.retry_after, args.limite_rota, args.janela_rota, args.seed)
+    sim = Simulacao(main, falso, args.usuarios, args.staff)
+    if args.tracemalloc:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    await sim.subir()
+    subida = time.perf_counter() - t0
+    falso.chamadas.clear()
+
+    construtores = {
+        "ticket_abrir": lambda: tarefas_ticket_abrir(sim, main.TicketPanel()),
+        "ticket_assumir": lambda: tarefas_ticket_assumir(sim, main.TicketControls()),
+        "ticket_fechar": lambda: tarefas_ticket_fechar(sim, main.TicketControls()),
+        "wl_iniciar": lambda: tarefas_wl_iniciar(sim, main.WLPanelView()),
+        "wl_perguntas": lambda: tarefas_wl_perguntas(sim),
+    }
+    fases = {}
+    for nome in args.fases:
+        fases[nome] = await rodar_fase(sim, nome, args.concorrencia, construtores[nome](), args.tracemalloc)
+        r = fases[nome]
+        print(
+            f"{nome:<15} {r['ops']:>6} ops  {r['ops_por_s'] or 0:>8.1f} ops/s  "
+            f"p50 {r['p50_ms'] or 0:>8.1f} ms  p99 {r['p99_ms'] or 0:>8.1f} ms  "
+            f"REST/op {r['rest_por_op'] or 0:>5.2f}  429 {r['rest_429']:>4}  erros {r['erros']}"
+        )
+    await sim.descer()
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    pico_rss = None
+    if resource is not None:
+        pico_rss = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KB no Linux
+    return {
+        "subida_s": round(subida, 3),
+        "pico_rss_mb": pico_rss,
+        "rotas_nao_simuladas": dict(falso.nao_simuladas),
+        "fases": fases,
+    }
+
+
+# =========================================================
+# JSON / COMPARAÇÃO
+# =========================================================
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or "desconhecido"
+    except Exception:
+        return "desconhecido"
+
+
+def comparar(antigo: dict, novo: dict):
+    print(f"\ncomparando com {antigo.get('commit')} ({antigo.get('data')}):")
+    metricas = (("ops_por_s", True), ("p50_ms", False), ("p99_ms", False), ("rest_por_op", False))
+    for nome, r in novo["fases"].items():
+        base = antigo.get("fases", {}).get(nome)
+        if not base:
+            continue
+        partes = []
+        for m, maior_melhor in metricas:
+            a, b = base.get(m), r.get(m)
+            if not a or b is None:
+                continue
+            delta = (b - a) / a
+            pior = delta < -0.05 if maior_melhor else delta > 0.05
+            partes.append(f"{m} {a}→{b} ({delta:+.0%}){' ⚠️' if pior else ''}")
+        print(f"  {nome:<15} " + "  ".join(partes))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--usuarios", type=int, default=2000)
+    parser.add_argument("--staff", type=int, default=20)
+    parser.add_argument("--concorrencia", type=int, default=200, help="usuários agindo ao mesmo tempo")
+    parser.add_argument("--latencia-ms", type=float, default=40.0, help="latência de cada chamada REST")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--taxa-429", type=float, default=0.01, help="fração das chamadas que voltam 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="retry_after (s) das 429 injetadas")
+    parser.add_argument("--limite-rota", type=int, default=50, help="chamadas por bucket (rota + canal/guild) por janela")
+    parser.add_argument("--janela-rota", type=float, default=1.0, help="janela (s) do limite por bucket")
+    parser.add_argument("--fases", default=",".join(FASES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tracemalloc", action="store_true", help="pico de memória Python por fase (mais lento)")
+    parser.add_argument("--saida", type=Path, help="JSON de resultado (padrão: bench/resultados/)")
+    parser.add_argument("--comparar", type=Path, help="JSON de uma rodada anterior")
+    args = parser.parse_args()
+    args.fases = [f.strip() for f in args.fases.split(",") if f.strip()]
+    invalidas = set(args.fases) - set(FASES)
+    if invalidas:
+        parser.error(f"fases desconhecidas: {', '.join(sorted(invalidas))}")
+
+    # a fila de provisão anda no ritmo que o Discord falso aceita por guild (o padrão de
+    # produção, 0.5 canal/s, faria a fase medir só a espera na fila)
+    os.environ.setdefault("NR_PROVISAO_TAXA", str(args.limite_rota / args.janela_rota))
+    os.environ.setdefault("NR_PROVISAO_RAJADA", str(args.limite_rota))
+    os.environ.setdefault("NR_LOOP_LAG_LIMITE", "0")
+    os.environ.setdefault("NR_TICKET_BACKEND", "sqlite")
+    logging.basicConfig(level=logging.ERROR)
+
+    commit = _commit()
+    saida = args.saida or ROOT / "bench" / "resultados" / f"fluxos-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    saida = saida.resolve()
+    comparar_com = args.comparar.resolve() if args.comparar else None
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        sys.path.insert(0, str(ROOT))
+        import discord
+        import main as bot_main
+
+        print(
+            f"{args.usuarios} usuários, concorrência {args.concorrencia}, latência {args.latencia_ms:.0f}±"
+            f"{args.jitter_ms:.0f} ms, 429 em {args.taxa_429:.1%}"
+        )
+        resultado = asyncio.run(executar(args, bot_main))
+
+    relatorio = {
+        "commit": commit,
+        "data": _agora_iso(),
+        "ambiente": {"python": platform.python_version(), "discord.py": discord.__version__,
+                     "plataforma": platform.platform()},
+        "parametros": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+                       if k not in ("saida", "comparar")},
+        **resultado,
+    }
+    if resultado["rotas_nao_simuladas"]:
+        print(f"⚠️ rotas sem simulação (responderam 404): {resultado['rotas_nao_simuladas']}")
+    print(f"subida {resultado['subida_s']}s | pico RSS {resultado['pico_rss_mb']} MB")
+
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    saida.write_text(json.dumps(relatorio, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"resultado: {saida}")
+
+    if comparar_com:
+        comparar(json.loads(comparar_com.read_text(encoding="utf-8")), relatorio)
+
+
+if __name__ == "__main__":
+    main()
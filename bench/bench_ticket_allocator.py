@@ -0,0 +1,103 @@
+# =========================================================
+# STRESS: alocação de número de ticket
+# =========================================================
+# Dispara milhares de alocações concorrentes (asyncio) em vários processos
+# que compartilham a mesma pasta de dados e confere que nenhum número repete.
+#
+#   python bench/bench_ticket_allocator.py --processos 4 --alocacoes 5000
+#   python bench/bench_ticket_allocator.py --backend json
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _worker(data_dir: str, backend: str, alocacoes: int, bloco: int, fila):
+    os.chdir(data_dir)
+    sys.path.insert(0, str(ROOT))
+    import main
+
+    async def run():
+        if backend == "json":
+            repo = main.JsonTicketRepository(main.TICKETS_DB_FILE, main.TICKETS_COUNTER_FILE)
+        else:
+            repo = main.SQLiteTicketRepository(main.SQLiteDB(main.SQLITE_FILE))
+        await repo.abrir()
+        alloc = main.TicketNumberAllocator(repo, bloco=bloco)
+        numeros = await asyncio.gather(*(alloc.proximo() for _ in range(alocacoes)))
+        await repo.fechar()
+        return numeros
+
+    inicio = time.perf_counter()
+    numeros = asyncio.run(run())
+    fila.put((numeros, time.perf_counter() - inicio))
+
+
+def _worker_setup(data_dir: str):
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        sys.path.insert(0, str(ROOT))
+        import main
+
+        async def run():
+            repo = main.SQLiteTicketRepository(main.SQLiteDB(main.SQLITE_FILE))
+            await repo.abrir()
+            await repo.fechar()
+        asyncio.run(run())
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processos", type=int, default=4)
+    parser.add_argument("--alocacoes", type=int, default=5000, help="alocações concorrentes por processo")
+    parser.add_argument("--bloco", type=int, default=20)
+    parser.add_argument("--backend", choices=("sqlite", "json"), default="sqlite")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as data_dir:
+        if args.backend == "sqlite":
+            # cria o schema antes pra os processos não disputarem o CREATE TABLE
+            _worker_setup(data_dir)
+
+        fila = ctx.Queue()
+        procs = [
+            ctx.Process(target=_worker, args=(data_dir, args.backend, args.alocacoes, args.bloco, fila))
+            for _ in range(args.processos)
+        ]
+        inicio = time.perf_counter()
+        for p in procs:
+            p.start()
+        resultados = [fila.get() for _ in procs]
+        for p in procs:
+            p.join()
+        total_s = time.perf_counter() - inicio
+
+    todos = [n for numeros, _ in resultados for n in numeros]
+    unicos = set(todos)
+    duplicados = len(todos) - len(unicos)
+
+    print(f"backend={args.backend} processos={args.processos} alocacoes/proc={args.alocacoes} bloco={args.bloco}")
+    print(f"total={len(todos)} unicos={len(unicos)} duplicados={duplicados}")
+    print(f"maior numero={max(todos)} (lacunas={max(todos) - len(unicos)})")
+    print(f"tempo={total_s:.2f}s  ->  {len(todos) / total_s:,.0f} alocacoes/s")
+    for i, (_, dt) in enumerate(resultados):
+        print(f"  processo {i}: {dt:.2f}s")
+
+    if duplicados:
+        print("❌ FALHOU: números de ticket duplicados")
+        sys.exit(1)
+    print("✅ OK: nenhum número duplicado")
+
+
+if __name__ == "__main__":
+    main()
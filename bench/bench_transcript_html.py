@@ -0,0 +1,107 @@
+# =========================================================
+# BENCH: transcript HTML de um canal sintético
+# =========================================================
+# Renderiza um canal falso com N mensagens (padrão 50k) em streaming e mostra
+# tempo, tamanho gerado e pico de memória. Roda também com N/10 pra comparar:
+# o pico de memória tem que ficar praticamente igual (memória "plana").
+#
+#   python bench/bench_transcript_html.py
+#   python bench/bench_transcript_html.py --mensagens 200000 --formato txt
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class Autor(SimpleNamespace):
+    def __str__(self):
+        return self.name
+
+
+class CanalSintetico:
+    def __init__(self, main, total: int):
+        self.name = "suporte-042"
+        self.total = total
+        self.main = main
+        self.autores = [
+            Autor(id=100000000000000000 + i, display_name=f"membro{i}", name=f"membro{i}")
+            for i in range(20)
+        ]
+        self.cargo = SimpleNamespace(id=555, name="Equipe Staff")
+
+    async def history(self, limit=None, oldest_first=True):
+        discord = self.main.discord
+        inicio = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        for i in range(self.total):
+            autor = self.autores[i % len(self.autores)]
+            alvo = self.autores[(i + 1) % len(self.autores)]
+            embeds = []
+            if i % 50 == 0:
+                e = discord.Embed(title=f"🎫 Ticket #{i}", description="Status atualizado", color=0x7A35FF)
+                e.add_field(name="Usuário", value=f"<@{alvo.id}>", inline=True)
+                embeds.append(e)
+            anexos = []
+            if i % 25 == 0:
+                anexos.append(SimpleNamespace(
+                    url=f"https://cdn.discordapp.com/attachments/1/{i}/print.png",
+                    filename="print.png", size=123456 + i, content_type="image/png"
+                ))
+            yield SimpleNamespace(
+                id=i,
+                author=autor,
+                content=f"Mensagem {i} para <@{alvo.id}> e <@&555> — <t:1767225600:f> <b>não é html</b>",
+                created_at=inicio + timedelta(seconds=i),
+                embeds=embeds,
+                attachments=anexos,
+                mentions=[alvo],
+                role_mentions=[self.cargo],
+                channel_mentions=[],
+            )
+
+
+async def renderizar(main, total: int):
+    canal = CanalSintetico(main, total)
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    transcript = await main.gerar_transcript(canal)
+    dt = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    manifesto = sum(b.seek(0, os.SEEK_END) for b, _ in transcript.extras)
+    transcript.close()
+    return dt, pico, transcript.tamanho, manifesto, transcript.filename
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mensagens", type=int, default=50_000)
+    parser.add_argument("--formato", choices=("html", "txt"), default="html")
+    args = parser.parse_args()
+
+    os.environ["NR_TRANSCRIPT_FORMATO"] = args.formato
+    # sem gzip aqui: medimos só a renderização
+    os.environ["NR_TRANSCRIPT_GZIP_ACIMA_DE"] = "0"
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        sys.path.insert(0, str(ROOT))
+        import main as bot_main
+
+        for total in (max(1, args.mensagens // 10), args.mensagens):
+            dt, pico, tamanho, manifesto, nome = asyncio.run(renderizar(bot_main, total))
+            print(
+                f"{nome}: {total:>7} mensagens em {dt:6.2f}s ({total / dt:,.0f} msg/s) | "
+                f"saída {tamanho / 1024 / 1024:6.1f} MB | manifesto {manifesto / 1024:6.1f} KB | "
+                f"pico de memória {pico / 1024 / 1024:5.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,30 @@
 import os
 import json
 import asyncio
-import io
+import gzip
+import heapq
+import html
+import logging
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from contextlib import contextmanager, suppress
+from functools import lru_cache, partial, wraps
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
+import aiohttp
 import discord
+from aiohttp import web
 from discord.ext import commands
 from discord import app_commands
 
@@ -35,15 +54,102 @@ CARGO_CIDADAO = "🌃「Cidadão 」"
 CATEGORIA_WL = "WHITELIST"
 
 TEMPO_WL_POR_PERGUNTA = 600  # 10 min
+TEMPO_WL_LEMBRETE = 120  # aviso quando faltar 2 min (0 = sem aviso)
+TEMPO_WL_REENVIO = 60  # WL concluída que não chegou na staff: tenta de novo depois disso (s)
+# "mensagem" (uma pergunta por vez no chat) ou "formulario" (modais + selects, bem menos chamadas)
+WL_MODO = os.getenv("NR_WL_MODO", "mensagem").lower()
+# /wl_fila: quantos membros recebem cargo/nick ao mesmo tempo num lote
+WL_LOTE_CONCORRENCIA = int(os.getenv("NR_WL_LOTE_CONCORRENCIA", "4"))
 
 # ✅ Coloque o ID do seu servidor aqui (para sync rápido)
 # Se quiser global (mais lento), use: GUILD_ID = None
 GUILD_ID = 1475152340326813796
+# Outras guilds atendidas pelo mesmo bot: NR_GUILD_IDS="123,456" e/ou "guilds" no config.json
 
 DATA_DIR = Path(".")
 TICKETS_COUNTER_FILE = DATA_DIR / "tickets.json"
 TICKETS_DB_FILE = DATA_DIR / "ticket_data.json"
 WL_LOCK_FILE = DATA_DIR / "wl_lock.json"
+SQLITE_FILE = DATA_DIR / "new_republic.db"
+
+# Backend do repositório de tickets: "sqlite" (padrão, WAL) ou "json" (legado)
+TICKET_BACKEND = os.getenv("NR_TICKET_BACKEND", "sqlite").lower()
+
+# Janela (s) em que mudanças de estado são agrupadas antes de ir pro disco
+STATE_FLUSH_INTERVALO = float(os.getenv("NR_STATE_FLUSH_INTERVALO", "1.0"))
+
+# Quantos números de ticket cada processo reserva por vez (só o teto vai pro disco)
+TICKET_NUM_BLOCO = int(os.getenv("NR_TICKET_NUM_BLOCO", "20"))
+
+# Sharding: "" = um processo (commands.Bot); "auto" = AutoShardedBot com a contagem do Discord;
+# "N" = N shards no total. NR_SHARD_IDS="0,1" = shards deste processo (exige N; vazio = todos)
+SHARDS = os.getenv("NR_SHARDS", "").strip().lower()
+SHARD_COUNT = int(SHARDS) if SHARDS.isdigit() else None
+SHARD_IDS = tuple(int(x) for x in os.getenv("NR_SHARD_IDS", "").split(",") if x.strip())
+# Estado entre processos (travas, trava da WL): "sqlite" (new_republic.db em disco comum) ou
+# "memoria" (um processo só / testes)
+ESTADO_BACKEND = os.getenv("NR_ESTADO_BACKEND", "sqlite").lower()
+# Prazo da trava "uma WL por usuário" entre processos (a checagem local continua valendo)
+TRAVA_WL_TTL = 24 * 3600
+
+# Transcript: até esse tamanho fica em memória, depois vai pra arquivo temporário
+TRANSCRIPT_MEMORIA_MAX = int(os.getenv("NR_TRANSCRIPT_MEMORIA_MAX", str(2 * 1024 * 1024)))
+# Acima desse tamanho o transcript é enviado como .gz (0 = nunca compacta)
+TRANSCRIPT_GZIP_ACIMA_DE = int(os.getenv("NR_TRANSCRIPT_GZIP_ACIMA_DE", str(4 * 1024 * 1024)))
+# Formato do transcript: "html" (com embeds e manifesto de anexos) ou "txt"
+TRANSCRIPT_FORMATO = os.getenv("NR_TRANSCRIPT_FORMATO", "html").lower()
+
+# Logs: embeds que chegam dentro da janela (s) saem juntos (até 10 por mensagem)
+LOG_JANELA = float(os.getenv("NR_LOG_JANELA", "1.5"))
+LOG_FILA_MAX = int(os.getenv("NR_LOG_FILA_MAX", "500"))
+# Fila cheia: "descartar_antigo" (padrão), "descartar_novo" ou "esperar" (backpressure)
+LOG_FILA_CHEIA = os.getenv("NR_LOG_FILA_CHEIA", "descartar_antigo").lower()
+LOG_TENTATIVAS = 4
+
+# Criação de canais (ticket/WL): no máximo N ao mesmo tempo e um ritmo, ambos por guild
+PROVISAO_CONCORRENCIA = int(os.getenv("NR_PROVISAO_CONCORRENCIA", "3"))
+PROVISAO_TAXA = float(os.getenv("NR_PROVISAO_TAXA", "0.5"))  # canais/s por guild
+PROVISAO_RAJADA = int(os.getenv("NR_PROVISAO_RAJADA", "5"))
+PROVISAO_AVISO_POSICAO = 3  # a partir dessa posição o usuário é avisado da fila
+
+# Pool de canais pré-criados (0 = desligado): N canais ocultos por categoria
+POOL_TAMANHO = int(os.getenv("NR_POOL_TAMANHO", "0"))
+POOL_REFILL_INTERVALO = float(os.getenv("NR_POOL_REFILL_INTERVALO", "15"))  # s entre criações
+POOL_PREFIXO = "nr-pool-"
+
+# Anti-spam de cliques por (guild, usuário, ação): "taxa,rajada" (taxa em cliques/s).
+# Ex.: NR_THROTTLE_TICKET_ABRIR="0.05,2" = 2 seguidos, depois 1 a cada 20s
+THROTTLE_PADRAO = {
+    "ticket_abrir": (1 / 30, 2),
+    "wl_iniciar": (1 / 30, 2),
+    "verificar": (1 / 10, 3),
+    "ticket_controle": (1 / 3, 4),
+}
+# Tickets abertos ao mesmo tempo por usuário (staff não tem limite)
+TICKETS_POR_USUARIO = int(os.getenv("NR_TICKETS_POR_USUARIO", "2"))
+
+# Métricas no formato Prometheus em http://127.0.0.1:<porta>/metrics (0 = desligado)
+METRICAS_PORTA = int(os.getenv("NR_METRICAS_PORTA", "0"))
+METRICAS_HOST = "127.0.0.1"
+
+# Watchdog do event loop: travou mais que isso (s), loga a pilha de quem travou (0 = desligado)
+LOOP_LAG_LIMITE = float(os.getenv("NR_LOOP_LAG_LIMITE", "0.5"))
+# /perfil: amostragem da thread do loop (s entre amostras) e pasta dos .folded
+PERFIL_INTERVALO = float(os.getenv("NR_PERFIL_INTERVALO", "0.005"))
+PERFIL_DIR = DATA_DIR / "perfis"
+# Quantos .folded ficam na pasta; os mais antigos saem (0 = sem limite)
+PERFIL_MAX_ARQUIVOS = int(os.getenv("NR_PERFIL_MAX_ARQUIVOS", "20"))
+
+logger = logging.getLogger("new_republic")
+
+# Tarefas "dispara e esquece" precisam de referência forte até terminar
+_TAREFAS: set[asyncio.Task] = set()
+
+def criar_tarefa(coro, nome: Optional[str] = None) -> asyncio.Task:
+    task = asyncio.create_task(coro, name=nome)
+    _TAREFAS.add(task)
+    task.add_done_callback(_TAREFAS.discard)
+    return task
 
 # =========================================================
 # CORES
@@ -81,37 +187,339 @@ def _save_json(path: Path, data):
         json.dump(data, f, ensure_ascii=False, indent=2)
     tmp.replace(path)
 
+@contextmanager
+def _trava_arquivo(path: Path):
+    # Lock exclusivo entre processos (bloqueante: use fora do event loop)
+    with path.open("a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
 # =========================================================
-# WL LOCK
+# CONFIG: IDs (com fallback por nome)
 # =========================================================
-def is_wl_locked() -> bool:
-    data = _load_json(WL_LOCK_FILE, {"locked": False})
-    return bool(data.get("locked", False))
+# Cada item pode ter um ID fixo: config.json ("ids": {"CARGO_STAFF": 123})
+# ou variável de ambiente NR_ID_CARGO_STAFF=123. Com ID, a busca é direta
+# (get_role/get_channel); sem ID, cai no nome de sempre (índice abaixo).
+# Nomes também podem ser trocados em config.json ("nomes": {...}).
+#
+# Várias guilds: "guilds": {"<guild_id>": {"ids": {...}, "nomes": {...},
+# "wl_perguntas": "outra.json", "tempo_wl_por_pergunta": 600, "tempo_wl_lembrete": 120}}.
+# Nomes, questionário e tempos herdam do topo; IDs não (ID é de uma guild só).
+CONFIG_FILE = Path(os.getenv("NR_CONFIG_FILE", "config.json"))
+
+CONFIG_ITENS: dict[str, tuple[str, str]] = {
+    "CARGO_VISITANTE": ("cargo", CARGO_VISITANTE),
+    "CARGO_MEMBRO": ("cargo", CARGO_MEMBRO),
+    "CARGO_STAFF": ("cargo", CARGO_STAFF),
+    "CARGO_CIDADAO": ("cargo", CARGO_CIDADAO),
+    "CANAL_LOG": ("canal", CANAL_LOG),
+    "CANAL_WL_STAFF": ("canal", CANAL_WL_STAFF),
+    "CANAL_WL_APROVADAS": ("canal", CANAL_WL_APROVADAS),
+    "CANAL_WL_REPROVADAS": ("canal", CANAL_WL_REPROVADAS),
+    "CATEGORIA_TICKET": ("categoria", CATEGORIA_TICKET),
+    "CATEGORIA_WL": ("categoria", CATEGORIA_WL),
+}
+
+class BotConfig:
+    def __init__(self, ids: dict[str, int], nomes: dict[str, str], wl_perguntas: Optional[Path] = None,
+                 tempo_wl_por_pergunta: int = TEMPO_WL_POR_PERGUNTA, tempo_wl_lembrete: int = TEMPO_WL_LEMBRETE):
+        self.ids = ids
+        self.nomes = nomes
+        self.wl_perguntas = wl_perguntas  # None = questionário padrão
+        self.tempo_wl_por_pergunta = tempo_wl_por_pergunta
+        self.tempo_wl_lembrete = tempo_wl_lembrete
+        self.guilds: dict[int, "BotConfig"] = {}
+
+    @classmethod
+    def carregar(cls, path: Path) -> "BotConfig":
+        data = _load_json(path, {})
+        brutos = dict(data.get("ids") or {})
+        for chave in CONFIG_ITENS:
+            env = os.getenv(f"NR_ID_{chave}")
+            if env:
+                brutos[chave] = env
+        padrao = cls._montar(path, data, brutos, None)
+
+        for gid, bloco in (data.get("guilds") or {}).items():
+            try:
+                padrao.guilds[int(gid)] = cls._montar(path, bloco or {}, dict(bloco.get("ids") or {}), padrao)
+            except (AttributeError, TypeError, ValueError):
+                logger.warning("Config: guild inválida %r ignorada.", gid)
+        return padrao
+
+    @classmethod
+    def _montar(cls, path: Path, data: dict, brutos: dict, base: Optional["BotConfig"]) -> "BotConfig":
+        nomes = dict(base.nomes) if base else {chave: nome for chave, (_, nome) in CONFIG_ITENS.items()}
+        for chave, nome in (data.get("nomes") or {}).items():
+            if chave in CONFIG_ITENS and nome:
+                nomes[chave] = str(nome)
+
+        ids: dict[str, int] = {}
+        for chave, valor in brutos.items():
+            if chave not in CONFIG_ITENS:
+                logger.warning("Config: chave desconhecida %r ignorada.", chave)
+                continue
+            try:
+                if valor:
+                    ids[chave] = int(valor)
+            except (TypeError, ValueError):
+                logger.warning("Config: ID inválido para %s: %r", chave, valor)
+
+        wl_perguntas = base.wl_perguntas if base else None
+        if data.get("wl_perguntas"):
+            # relativo ao próprio config.json
+            wl_perguntas = path.parent / data["wl_perguntas"]
+        tempo = data.get("tempo_wl_por_pergunta") or (base.tempo_wl_por_pergunta if base else TEMPO_WL_POR_PERGUNTA)
+        lembrete = data.get("tempo_wl_lembrete")
+        if lembrete is None:
+            lembrete = base.tempo_wl_lembrete if base else TEMPO_WL_LEMBRETE
+        return cls(ids, nomes, wl_perguntas, int(tempo), int(lembrete))
+
+    def da_guild(self, guild_id: Optional[int]) -> "BotConfig":
+        # guild sem bloco próprio usa a config do topo
+        return self.guilds.get(guild_id, self)
+
+    def id(self, chave: str) -> Optional[int]:
+        return self.ids.get(chave)
+
+    def nome(self, chave: str) -> str:
+        return self.nomes[chave]
+
+    def nomes_do_tipo(self, tipo: str) -> tuple[str, ...]:
+        return tuple(self.nomes[c] for c, (t, _) in CONFIG_ITENS.items() if t == tipo)
+
+CONFIG = BotConfig.carregar(CONFIG_FILE)
+
+def _guild_ids() -> tuple[int, ...]:
+    ids = set(CONFIG.guilds)
+    if GUILD_ID:
+        ids.add(int(GUILD_ID))
+    for bruto in os.getenv("NR_GUILD_IDS", "").split(","):
+        if bruto.strip():
+            try:
+                ids.add(int(bruto))
+            except ValueError:
+                logger.warning("NR_GUILD_IDS: ID inválido %r ignorado.", bruto)
+    return tuple(sorted(ids))
+
+# Guilds com sync rápido dos slash commands (vazio = sync global)
+GUILD_IDS = _guild_ids()
 
-def set_wl_locked(value: bool):
-    _save_json(WL_LOCK_FILE, {"locked": bool(value)})
+def config_da_guild(guild: discord.Guild) -> BotConfig:
+    return CONFIG.da_guild(guild.id)
+
+# =========================================================
+# ÍNDICE DE CARGOS/CANAIS (nome -> id, por guild)
+# =========================================================
+# Só os nomes configurados (da config daquela guild) são indexados; o índice
+# guarda ids e resolve com guild.get_role/get_channel (O(1)), então nunca
+# segura objeto velho.
+class GuildIndex:
+    def __init__(self, cfg: BotConfig):
+        self.nomes_cargos = cfg.nomes_do_tipo("cargo")
+        self.nomes_canais = cfg.nomes_do_tipo("canal")
+        self.nomes_categorias = cfg.nomes_do_tipo("categoria")
+        self.cargos: dict[str, int] = {}
+        self.canais: dict[str, int] = {}
+        self.categorias: dict[str, int] = {}
+
+class LookupIndex:
+    def __init__(self):
+        self._guilds: dict[int, GuildIndex] = {}
+
+    def construir(self, guild: discord.Guild) -> GuildIndex:
+        idx = GuildIndex(config_da_guild(guild))
+        # mesma regra do discord.utils.get: o primeiro com o nome vence
+        for role in guild.roles:
+            if role.name in idx.nomes_cargos:
+                idx.cargos.setdefault(role.name, role.id)
+        for ch in guild.text_channels:
+            if ch.name in idx.nomes_canais:
+                idx.canais.setdefault(ch.name, ch.id)
+        for cat in guild.categories:
+            if cat.name in idx.nomes_categorias:
+                idx.categorias.setdefault(cat.name, cat.id)
+        self._guilds[guild.id] = idx
+        return idx
+
+    def remover_guild(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def _idx(self, guild: discord.Guild) -> GuildIndex:
+        idx = self._guilds.get(guild.id)
+        return idx if idx is not None else self.construir(guild)
+
+    # ---- consultas ----
+    def cargo_id(self, guild: discord.Guild, nome: str) -> Optional[int]:
+        idx = self._idx(guild)
+        if nome not in idx.nomes_cargos:
+            role = discord.utils.get(guild.roles, name=nome)
+            return role.id if role else None
+        return idx.cargos.get(nome)
+
+    def cargo(self, guild: discord.Guild, nome: str) -> Optional[discord.Role]:
+        rid = self.cargo_id(guild, nome)
+        return guild.get_role(rid) if rid else None
+
+    def canal(self, guild: discord.Guild, nome: str) -> Optional[discord.TextChannel]:
+        idx = self._idx(guild)
+        if nome not in idx.nomes_canais:
+            return discord.utils.get(guild.text_channels, name=nome)
+        cid = idx.canais.get(nome)
+        ch = guild.get_channel(cid) if cid else None
+        return ch if isinstance(ch, discord.TextChannel) else None
+
+    def categoria(self, guild: discord.Guild, nome: str) -> Optional[discord.CategoryChannel]:
+        idx = self._idx(guild)
+        if nome not in idx.nomes_categorias:
+            return discord.utils.get(guild.categories, name=nome)
+        cid = idx.categorias.get(nome)
+        ch = guild.get_channel(cid) if cid else None
+        return ch if isinstance(ch, discord.CategoryChannel) else None
+
+    # ---- eventos do gateway ----
+    def _tabela_canal(self, idx: GuildIndex, ch) -> tuple[Optional[dict], tuple]:
+        if isinstance(ch, discord.CategoryChannel):
+            return idx.categorias, idx.nomes_categorias
+        if isinstance(ch, discord.TextChannel):
+            return idx.canais, idx.nomes_canais
+        return None, ()
+
+    def _reindexar_nome(self, tabela: dict, nome: str, candidatos):
+        tabela.pop(nome, None)
+        achado = discord.utils.get(candidatos, name=nome)
+        if achado:
+            tabela[nome] = achado.id
+
+    def cargo_criado(self, role: discord.Role):
+        idx = self._guilds.get(role.guild.id)
+        if idx and role.name in idx.nomes_cargos:
+            idx.cargos.setdefault(role.name, role.id)
+
+    def cargo_removido(self, role: discord.Role):
+        idx = self._guilds.get(role.guild.id)
+        if idx and idx.cargos.get(role.name) == role.id:
+            self._reindexar_nome(idx.cargos, role.name, [r for r in role.guild.roles if r.id != role.id])
+
+    def cargo_atualizado(self, before: discord.Role, after: discord.Role):
+        if before.name == after.name:
+            return
+        self.cargo_removido(before)
+        self.cargo_criado(after)
+
+    def canal_criado(self, ch: discord.abc.GuildChannel):
+        idx = self._guilds.get(ch.guild.id)
+        if not idx:
+            return
+        tabela, nomes = self._tabela_canal(idx, ch)
+        if tabela is not None and ch.name in nomes:
+            tabela.setdefault(ch.name, ch.id)
+
+    def canal_removido(self, ch: discord.abc.GuildChannel):
+        idx = self._guilds.get(ch.guild.id)
+        if not idx:
+            return
+        tabela, _ = self._tabela_canal(idx, ch)
+        if tabela is not None and tabela.get(ch.name) == ch.id:
+            candidatos = ch.guild.categories if isinstance(ch, discord.CategoryChannel) else ch.guild.text_channels
+            self._reindexar_nome(tabela, ch.name, [c for c in candidatos if c.id != ch.id])
+
+    def canal_atualizado(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        if before.name == after.name:
+            return
+        self.canal_removido(before)
+        self.canal_criado(after)
+
+LOOKUP = LookupIndex()
 
 # =========================================================
 # HELPERS DISCORD
 # =========================================================
 def get_text_channel_by_name(guild: discord.Guild, name: str):
-    return discord.utils.get(guild.text_channels, name=name)
+    return LOOKUP.canal(guild, name)
+
+def get_role_by_name(guild: discord.Guild, name: str):
+    return LOOKUP.cargo(guild, name)
+
+def get_category_by_name(guild: discord.Guild, name: str):
+    return LOOKUP.categoria(guild, name)
+
+# ✅ Itens configurados: ID primeiro; nome só quando não há ID
+def get_config_role_id(guild: discord.Guild, chave: str) -> Optional[int]:
+    cfg = config_da_guild(guild)
+    return cfg.id(chave) or LOOKUP.cargo_id(guild, cfg.nome(chave))
+
+def get_config_role(guild: discord.Guild, chave: str) -> Optional[discord.Role]:
+    cfg = config_da_guild(guild)
+    rid = cfg.id(chave)
+    if rid:
+        return guild.get_role(rid)
+    return get_role_by_name(guild, cfg.nome(chave))
+
+def get_config_channel(guild: discord.Guild, chave: str) -> Optional[discord.TextChannel]:
+    cfg = config_da_guild(guild)
+    cid = cfg.id(chave)
+    if cid:
+        ch = guild.get_channel(cid)
+        return ch if isinstance(ch, discord.TextChannel) else None
+    return get_text_channel_by_name(guild, cfg.nome(chave))
+
+def get_config_category(guild: discord.Guild, chave: str) -> Optional[discord.CategoryChannel]:
+    cfg = config_da_guild(guild)
+    cid = cfg.id(chave)
+    if cid:
+        ch = guild.get_channel(cid)
+        return ch if isinstance(ch, discord.CategoryChannel) else None
+    return get_category_by_name(guild, cfg.nome(chave))
+
+def validar_config(guild: discord.Guild) -> tuple[list[str], list[str]]:
+    # Retorna (problemas, itens resolvidos só pelo nome -> sugestão de ID)
+    resolvers = {"cargo": get_config_role, "canal": get_config_channel, "categoria": get_config_category}
+    problemas: list[str] = []
+    sem_id: list[str] = []
+    cfg = config_da_guild(guild)
+    for chave, (tipo, _) in CONFIG_ITENS.items():
+        obj = resolvers[tipo](guild, chave)
+        rid = cfg.id(chave)
+        if obj is None:
+            if rid:
+                problemas.append(f"{chave}: ID {rid} não existe (ou não é {tipo}).")
+            else:
+                problemas.append(f"{chave}: '{cfg.nome(chave)}' ({tipo}) não encontrado pelo nome.")
+        elif not rid:
+            # guild com bloco próprio no config.json fixa os IDs lá, não no env
+            sem_id.append(f'"{chave}": {obj.id}' if guild.id in CONFIG.guilds else f"NR_ID_{chave}={obj.id}")
+    return problemas, sem_id
 
 def get_log_channel(guild: discord.Guild):
-    return get_text_channel_by_name(guild, CANAL_LOG)
+    return get_config_channel(guild, "CANAL_LOG")
 
 def get_wl_staff_channel(guild: discord.Guild):
-    return get_text_channel_by_name(guild, CANAL_WL_STAFF)
+    return get_config_channel(guild, "CANAL_WL_STAFF")
 
 def get_wl_aprovadas_channel(guild: discord.Guild):
-    return get_text_channel_by_name(guild, CANAL_WL_APROVADAS)
+    return get_config_channel(guild, "CANAL_WL_APROVADAS")
 
 def get_wl_reprovadas_channel(guild: discord.Guild):
-    return get_text_channel_by_name(guild, CANAL_WL_REPROVADAS)
+    return get_config_channel(guild, "CANAL_WL_REPROVADAS")
 
 def is_staff(member: discord.Member) -> bool:
-    staff_role = discord.utils.get(member.guild.roles, name=CARGO_STAFF)
-    return bool(staff_role and staff_role in member.roles)
+    staff_role_id = get_config_role_id(member.guild, "CARGO_STAFF")
+    return bool(staff_role_id and member.get_role(staff_role_id))
 
 def _slug_channel_name(text: str) -> str:
     # slug simples e seguro pra nome de canal
@@ -130,9 +538,9 @@ async def ensure_log_channel(guild: discord.Guild) -> Optional[discord.TextChann
     # tenta criar se não existir
     try:
         # se existir categoria Tickets, joga lá; se não, cria solto mesmo
-        categoria = discord.utils.get(guild.categories, name=CATEGORIA_TICKET)
+        categoria = get_config_category(guild, "CATEGORIA_TICKET")
         ch = await guild.create_text_channel(
-            name=CANAL_LOG,
+            name=config_da_guild(guild).nome("CANAL_LOG"),
             category=categoria,
             reason="Canal de logs do bot"
         )
@@ -141,42 +549,1646 @@ async def ensure_log_channel(guild: discord.Guild) -> Optional[discord.TextChann
         return None
 
 # =========================================================
-# TICKETS DB
+# MÉTRICAS (texto Prometheus, servido no mesmo event loop)
+# =========================================================
+METRICAS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escapar_label(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def _labels_txt(labels: tuple, le: Optional[str] = None) -> str:
+    partes = ['%s="%s"' % (k, _escapar_label(v)) for k, v in labels]
+    if le is not None:
+        partes.append('le="%s"' % le)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+class Metricas:
+    # Contadores e histogramas com labels, mais gauges lidos na hora do scrape
+    def __init__(self):
+        self._tipos: dict[str, tuple[str, str]] = {}
+        self._contadores: dict[str, dict[tuple, float]] = {}
+        self._hist: dict[str, dict[tuple, list]] = {}
+        self._gauges: list[tuple[str, str, str, object]] = []
+
+    def definir(self, nome: str, tipo: str, ajuda: str):
+        self._tipos[nome] = (tipo, ajuda)
+        if tipo == "counter":
+            self._contadores.setdefault(nome, {})
+        elif tipo == "histogram":
+            self._hist.setdefault(nome, {})
+
+    def inc(self, nome: str, valor: float = 1, **labels):
+        chave = tuple(sorted(labels.items()))
+        serie = self._contadores[nome]
+        serie[chave] = serie.get(chave, 0) + valor
+
+    def observar(self, nome: str, valor: float, **labels):
+        chave = tuple(sorted(labels.items()))
+        serie = self._hist[nome]
+        h = serie.get(chave)
+        if h is None:
+            # [contagem por bucket..., soma, total]
+            h = serie[chave] = [0] * len(METRICAS_BUCKETS) + [0.0, 0]
+        for i, limite in enumerate(METRICAS_BUCKETS):
+            if valor <= limite:
+                h[i] += 1
+        h[-2] += valor
+        h[-1] += 1
+
+    def gauge(self, nome: str, ajuda: str, fn, tipo: str = "gauge"):
+        # fn() -> número ou {(("label", "valor"),): número}
+        self._gauges.append((nome, tipo, ajuda, fn))
+
+    def exportar(self) -> str:
+        linhas: list[str] = []
+        for nome, serie in self._contadores.items():
+            tipo, ajuda = self._tipos[nome]
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} counter"]
+            linhas += [f"{nome}{_labels_txt(k)} {v}" for k, v in serie.items()]
+        for nome, serie in self._hist.items():
+            tipo, ajuda = self._tipos[nome]
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} histogram"]
+            for k, h in serie.items():
+                for i, limite in enumerate(METRICAS_BUCKETS):
+                    linhas.append(f"{nome}_bucket{_labels_txt(k, str(limite))} {h[i]}")
+                linhas.append(f"{nome}_bucket{_labels_txt(k, '+Inf')} {h[-1]}")
+                linhas.append(f"{nome}_sum{_labels_txt(k)} {h[-2]}")
+                linhas.append(f"{nome}_count{_labels_txt(k)} {h[-1]}")
+        for nome, tipo, ajuda, fn in self._gauges:
+            try:
+                valor = fn()
+            except Exception:
+                continue
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+            if isinstance(valor, dict):
+                linhas += [f"{nome}{_labels_txt(k)} {v}" for k, v in valor.items()]
+            else:
+                linhas.append(f"{nome} {valor}")
+        return "\n".join(linhas) + "\n"
+
+METRICAS = Metricas()
+METRICAS.definir("nr_handler_segundos", "histogram", "Tempo de cada callback de UI/slash command")
+METRICAS.definir("nr_handler_erros_total", "counter", "Exceções em callbacks de UI/slash command")
+METRICAS.definir("nr_etapa_segundos", "histogram", "Tempo de etapas internas (criar canal, transcript, disco...)")
+METRICAS.definir("nr_rest_requisicoes_total", "counter", "Chamadas REST ao Discord por rota e status")
+METRICAS.definir("nr_rest_429_total", "counter", "Respostas 429 (rate limit) por rota")
+METRICAS.definir("nr_rest_segundos", "histogram", "Latência das chamadas REST por rota")
+
+def _nome_handler(fn) -> str:
+    return fn.__qualname__.replace("<locals>.", "")
+
+def instrumentado(fn):
+    # Vai logo acima do "async def" (abaixo de @discord.ui.button / @bot.tree.command)
+    nome = _nome_handler(fn)
+
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            METRICAS.inc("nr_handler_erros_total", handler=nome)
+            raise
+        finally:
+            METRICAS.observar("nr_handler_segundos", time.perf_counter() - inicio, handler=nome)
+    return wrapper
+
+@contextmanager
+def medir(etapa: str):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICAS.observar("nr_etapa_segundos", time.perf_counter() - inicio, etapa=etapa)
+
+_RE_ROTA_ID = re.compile(r"/\d{15,21}")
+_RE_ROTA_TOKEN = re.compile(r"(/(?:webhooks|interactions)/\{id\})/[^/]+")
+
+def _rota_rest(method: str, url) -> str:
+    # ids e tokens viram {id}/{token}: a cardinalidade fica limitada às rotas da API
+    path = url.path
+    if path.startswith("/api/v"):
+        path = path.split("/", 3)[-1]
+        path = "/" + path
+    path = _RE_ROTA_ID.sub("/{id}", path)
+    path = _RE_ROTA_TOKEN.sub(r"\1/{token}", path)
+    return f"{method} {path}"
+
+def trace_http() -> aiohttp.TraceConfig:
+    # Passado ao Client (http_trace): vê cada requisição real, inclusive as 429 que a lib repete
+    tc = aiohttp.TraceConfig()
+
+    async def inicio(session, ctx, params):
+        ctx.nr_inicio = time.perf_counter()
+
+    async def fim(session, ctx, params):
+        rota = _rota_rest(params.method, params.url)
+        status = params.response.status
+        METRICAS.inc("nr_rest_requisicoes_total", rota=rota, status=str(status))
+        if status == 429:
+            METRICAS.inc("nr_rest_429_total", rota=rota)
+        METRICAS.observar("nr_rest_segundos", time.perf_counter() - ctx.nr_inicio, rota=rota)
+
+    async def falha(session, ctx, params):
+        METRICAS.inc("nr_rest_requisicoes_total", rota=_rota_rest(params.method, params.url), status="erro")
+
+    tc.on_request_start.append(inicio)
+    tc.on_request_end.append(fim)
+    tc.on_request_exception.append(falha)
+    return tc
+
+class ServidorMetricas:
+    def __init__(self, host: str, porta: int):
+        self.host = host
+        self.porta = porta
+        self._runner: Optional[web.AppRunner] = None
+
+    async def iniciar(self):
+        if not self.porta or self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.porta).start()
+        logger.info("Métricas em http://%s:%s/metrics", self.host, self.porta)
+
+    async def parar(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=METRICAS.exportar(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+SERVIDOR_METRICAS = ServidorMetricas(METRICAS_HOST, METRICAS_PORTA)
+
+# =========================================================
+# DIAGNÓSTICO DO EVENT LOOP (watchdog + perfil por amostragem)
+# =========================================================
+METRICAS.definir("nr_loop_lag_segundos", "histogram", "Atraso do event loop medido pelo watchdog")
+METRICAS.definir("nr_loop_travamentos_total", "counter", "Vezes que o event loop passou do limite de atraso")
+
+def _quadro_txt(frame) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).stem}:{getattr(code, 'co_qualname', code.co_name)}"
+
+def _pilha_dobrada(frame) -> str:
+    # Formato "folded" (flamegraph.pl, speedscope, inferno): raiz;...;folha
+    quadros = []
+    while frame is not None:
+        quadros.append(_quadro_txt(frame))
+        frame = frame.f_back
+    return ";".join(reversed(quadros))
+
+def _loop_ocioso(frame) -> bool:
+    # Parado no select() do loop = esperando evento, não é trabalho
+    return Path(frame.f_code.co_filename).name == "selectors.py"
+
+class LoopWatchdog:
+    # Uma task bate o ponto no loop; uma thread confere de fora e, se o ponto atrasar,
+    # tira a pilha da thread do loop enquanto ela ainda está presa.
+    def __init__(self, limite: float, intervalo: float = 0.1):
+        self.limite = limite
+        self.intervalo = intervalo
+        self.travamentos = 0
+        self.pior_lag = 0.0
+        self._batida = time.monotonic()
+        self._thread_loop: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+
+    def iniciar(self):
+        if self.limite <= 0 or self._task is not None:
+            return
+        self._thread_loop = threading.get_ident()
+        self._batida = time.monotonic()
+        self._parar.clear()
+        self._task = asyncio.create_task(self._bater(), name="nr-loop-watchdog")
+        self._thread = threading.Thread(target=self._vigiar, name="nr-loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def parar(self):
+        self._parar.set()
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._thread:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    async def _bater(self):
+        while True:
+            antes = time.monotonic()
+            await asyncio.sleep(self.intervalo)
+            self._batida = time.monotonic()
+            lag = max(self._batida - antes - self.intervalo, 0.0)
+            METRICAS.observar("nr_loop_lag_segundos", lag)
+            if lag >= self.limite:
+                self.travamentos += 1
+                self.pior_lag = max(self.pior_lag, lag)
+                METRICAS.inc("nr_loop_travamentos_total")
+                logger.warning("Event loop ficou %.2fs sem responder.", lag)
+
+    def _vigiar(self):
+        reportada = None
+        while not self._parar.wait(self.intervalo):
+            batida = self._batida
+            atraso = time.monotonic() - batida
+            # 1 pilha por travamento: a batida só muda quando o loop volta
+            if atraso < self.limite + self.intervalo or batida == reportada:
+                continue
+            frame = sys._current_frames().get(self._thread_loop)
+            if frame is None:
+                continue
+            reportada = batida
+            logger.warning(
+                "Event loop travado há %.2fs. Pilha da thread do loop:\n%s",
+                atraso, "".join(traceback.format_stack(frame))
+            )
+
+WATCHDOG = LoopWatchdog(LOOP_LAG_LIMITE)
+
+class PerfilAmostragem:
+    # Perfil por amostragem da thread do loop, ligado sob demanda (/perfil).
+    # Uma thread lê o frame atual a cada intervalo; o resultado vai em formato folded.
+    def __init__(self, intervalo: float, pasta: Path, max_arquivos: int = 0):
+        self.intervalo = intervalo
+        self.pasta = pasta
+        self.max_arquivos = max_arquivos
+        self.amostras: dict[str, int] = {}
+        self.ociosas = 0
+        self.inicio = 0.0
+        self._thread_loop: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None
+
+    def ligar(self) -> bool:
+        if self.ativo:
+            return False
+        self._thread_loop = threading.get_ident()
+        self.amostras = {}
+        self.ociosas = 0
+        self.inicio = time.monotonic()
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._amostrar, name="nr-perfil", daemon=True)
+        self._thread.start()
+        return True
+
+    async def desligar(self, gravar: bool = True) -> Optional[Path]:
+        if not self.ativo:
+            return None
+        self._parar.set()
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+        if not gravar:
+            return None
+        return await asyncio.to_thread(self._gravar)
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self._thread_loop)
+            if frame is None:
+                continue
+            if _loop_ocioso(frame):
+                self.ociosas += 1
+                continue
+            pilha = _pilha_dobrada(frame)
+            self.amostras[pilha] = self.amostras.get(pilha, 0) + 1
+
+    def _gravar(self) -> Path:
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        caminho = self.pasta / f"perfil-{datetime.now():%Y%m%d-%H%M%S}.folded"
+        with open(caminho, "w", encoding="utf-8") as f:
+            for pilha, n in sorted(self.amostras.items(), key=lambda kv: kv[1], reverse=True):
+                f.write(f"{pilha} {n}\n")
+        if self.max_arquivos > 0:
+            # nome tem a data: ordem alfabética = ordem cronológica
+            for antigo in sorted(self.pasta.glob("perfil-*.folded"))[:-self.max_arquivos]:
+                antigo.unlink(missing_ok=True)
+        return caminho
+
+    def mais_pesados(self, n: int = 5) -> list[tuple[str, int]]:
+        # Tempo inclusivo por função deste arquivo (handlers, engine...), sem contar 2x em recursão
+        modulo = Path(__file__).stem + ":"
+        total: dict[str, int] = {}
+        for pilha, qtd in self.amostras.items():
+            for quadro in {q for q in pilha.split(";") if q.startswith(modulo)}:
+                total[quadro] = total.get(quadro, 0) + qtd
+        return heapq.nlargest(n, total.items(), key=lambda kv: kv[1])
+
+PERFIL = PerfilAmostragem(PERFIL_INTERVALO, PERFIL_DIR, PERFIL_MAX_ARQUIVOS)
+
+# =========================================================
+# LOGS: despachante com fila, lote e retry
+# =========================================================
+class LogItem:
+    __slots__ = ("guild", "embed", "content", "files", "futuro")
+
+    def __init__(self, guild: discord.Guild, embed=None, content=None, files=None, futuro=None):
+        self.guild = guild
+        self.embed = embed
+        self.content = content
+        self.files = files
+        self.futuro: Optional[asyncio.Future] = futuro
+
+    @property
+    def agrupavel(self) -> bool:
+        return self.embed is not None and not self.content and self.files is None and self.futuro is None
+
+class LogDispatcher:
+    # Todo log do bot passa por aqui: 1 fila + 1 worker por guild (uma guild
+    # com muito log não atrasa as outras), canal resolvido 1x por guild,
+    # até 10 embeds por send() e backoff em 429.
+    def __init__(self):
+        self._filas: dict[int, asyncio.Queue[LogItem]] = {}
+        self._canais: dict[int, int] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._ativo = False
+        self._esperando: set[asyncio.Task] = set()
+        self.enviados = 0
+        self.descartados = 0
+        self.retries = 0
+
+    def iniciar(self):
+        self._ativo = True
+        # o que entrou antes do start já tem fila esperando worker
+        for guild_id in self._filas:
+            self._iniciar_worker(guild_id)
+
+    def _iniciar_worker(self, guild_id: int):
+        if guild_id not in self._tasks:
+            self._tasks[guild_id] = asyncio.create_task(
+                self._worker(self._filas[guild_id]), name=f"nr-log-dispatcher-{guild_id}"
+            )
+
+    def _fila(self, guild_id: int) -> asyncio.Queue:
+        fila = self._filas.get(guild_id)
+        if fila is None:
+            fila = self._filas[guild_id] = asyncio.Queue(maxsize=LOG_FILA_MAX)
+            if self._ativo:
+                self._iniciar_worker(guild_id)
+        return fila
+
+    async def esvaziar(self, timeout: float = 5.0) -> bool:
+        # Espera até tudo que está nas filas (e nos lotes atuais) ter saído
+        try:
+            await asyncio.wait_for(asyncio.gather(*(f.join() for f in list(self._filas.values()))), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def parar(self, timeout: float = 5.0):
+        # ✅ Tenta esvaziar as filas antes de desligar
+        if not self._ativo:
+            return
+        await self.esvaziar(timeout)
+        self._ativo = False
+        tasks, self._tasks = list(self._tasks.values()), {}
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def tamanho_fila(self) -> int:
+        return sum(f.qsize() for f in self._filas.values())
+
+    def esquecer_canal(self, channel: discord.abc.GuildChannel):
+        if self._canais.get(channel.guild.id) == channel.id:
+            del self._canais[channel.guild.id]
+
+    # ---- entrada ----
+    def enviar(self, guild: discord.Guild, *, embed: Optional[discord.Embed] = None, content: Optional[str] = None):
+        # fire-and-forget: quem chama nunca espera HTTP
+        item = LogItem(guild, embed=embed, content=content)
+        if LOG_FILA_CHEIA == "esperar":
+            task = asyncio.create_task(self._colocar(item))
+            self._esperando.add(task)
+            task.add_done_callback(self._esperando.discard)
+        else:
+            self._colocar_nowait(item)
+
+    async def enviar_e_aguardar(self, guild: discord.Guild, *, embed=None, content=None, files=None) -> bool:
+        futuro = asyncio.get_running_loop().create_future()
+        await self._colocar(LogItem(guild, embed=embed, content=content, files=files, futuro=futuro))
+        return await futuro
+
+    async def _colocar(self, item: LogItem):
+        if LOG_FILA_CHEIA == "esperar":
+            await self._fila(item.guild.id).put(item)
+        else:
+            self._colocar_nowait(item)
+
+    def _colocar_nowait(self, item: LogItem):
+        fila = self._fila(item.guild.id)
+        if fila.full():
+            if LOG_FILA_CHEIA == "descartar_novo":
+                self._descartar(item)
+                return
+            with suppress(asyncio.QueueEmpty):
+                self._descartar(fila.get_nowait())
+                fila.task_done()
+        fila.put_nowait(item)
+
+    def _descartar(self, item: LogItem):
+        self.descartados += 1
+        if item.futuro and not item.futuro.done():
+            item.futuro.set_result(False)
+        if self.descartados % 50 == 1:
+            logger.warning("Fila de logs cheia: %s logs descartados até agora.", self.descartados)
+
+    # ---- worker ----
+    async def _worker(self, fila: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await fila.get()
+            lote = [item]
+            if item.agrupavel:
+                # junta o que chegar dentro da janela
+                fim = loop.time() + LOG_JANELA
+                while len(lote) < 50:
+                    restante = fim - loop.time()
+                    if restante <= 0:
+                        break
+                    try:
+                        lote.append(await asyncio.wait_for(fila.get(), restante))
+                    except asyncio.TimeoutError:
+                        break
+            try:
+                await self._processar(lote)
+            except Exception:
+                logger.exception("Erro no despachante de logs.")
+            finally:
+                for it in lote:
+                    if it.futuro and not it.futuro.done():
+                        it.futuro.set_result(False)
+                    fila.task_done()
+
+    async def _processar(self, lote: list[LogItem]):
+        # ordem preservada por guild: embeds acumulam até aparecer algo não agrupável
+        pendentes: dict[int, list[LogItem]] = {}
+        for item in lote:
+            gid = item.guild.id
+            if item.agrupavel:
+                pendentes.setdefault(gid, []).append(item)
+                continue
+            await self._flush_embeds(pendentes.pop(gid, []))
+            ok = await self._send(item.guild, embed=item.embed, content=item.content, files=item.files)
+            if item.futuro and not item.futuro.done():
+                item.futuro.set_result(ok)
+        for itens in pendentes.values():
+            await self._flush_embeds(itens)
+
+    async def _flush_embeds(self, itens: list[LogItem]):
+        for i in range(0, len(itens), 10):
+            parte = itens[i:i + 10]
+            await self._send(parte[0].guild, embeds=[it.embed for it in parte])
+
+    async def _canal(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+        cid = self._canais.get(guild.id)
+        ch = guild.get_channel(cid) if cid else None
+        if ch is None:
+            ch = await ensure_log_channel(guild)
+            if ch:
+                self._canais[guild.id] = ch.id
+        return ch
+
+    async def _send(self, guild: discord.Guild, **kwargs) -> bool:
+        kwargs = {k: v for k, v in kwargs.items() if v is not None}
+        for tentativa in range(LOG_TENTATIVAS):
+            ch = await self._canal(guild)
+            if ch is None:
+                return False
+            try:
+                await ch.send(**kwargs)
+                self.enviados += 1
+                return True
+            except discord.NotFound:
+                # canal apagado: resolve de novo na próxima tentativa
+                self._canais.pop(guild.id, None)
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    logger.warning("Log descartado (%s): %s", e.status, e.text)
+                    return False
+                self.retries += 1
+                espera = getattr(e, "retry_after", None) or min(30.0, 2.0 ** tentativa)
+                await asyncio.sleep(espera)
+            except Exception:
+                logger.exception("Falha ao enviar log.")
+                return False
+            for f in kwargs.get("files") or ():
+                f.reset()
+        return False
+
+LOGS = LogDispatcher()
+
+# =========================================================
+# PROVISÃO DE CANAIS: fila FIFO por guild + token bucket
+# =========================================================
+class TokenBucket:
+    def __init__(self, taxa: float, capacidade: float):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self._atualizado = time.monotonic()
+
+    def _repor(self):
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self._atualizado) * self.taxa)
+        self._atualizado = agora
+
+    def consumir(self, n: float = 1) -> bool:
+        self._repor()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def espera(self, n: float = 1) -> float:
+        # segundos até ter n tokens (0 se já tem)
+        self._repor()
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.taxa if self.taxa > 0 else float("inf")
+
+class PedidoCanal:
+    __slots__ = ("chave", "seq", "criar", "futuro", "criado_em")
+
+    def __init__(self, chave: tuple, seq: int, criar):
+        self.chave = chave
+        self.seq = seq
+        self.criar = criar
+        self.futuro: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.criado_em = time.monotonic()
+
+class ChannelProvisioner:
+    # Um pedido por (guild, usuário, tipo); posição na fila em O(1) pelo seq
+    def __init__(self, concorrencia: int = PROVISAO_CONCORRENCIA):
+        self._filas: dict[int, deque[PedidoCanal]] = {}
+        self._buckets: dict[int, TokenBucket] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._pedidos: dict[tuple, PedidoCanal] = {}
+        self._seq: dict[int, int] = {}
+        self._concorrencia = max(1, concorrencia)
+        # por guild: uma guild com fila grande não ocupa as vagas das outras
+        self._sems: dict[int, asyncio.Semaphore] = {}
+        self._rodando: set[asyncio.Task] = set()
+        # métricas
+        self.atendidos = 0
+        self.falhas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def posicao(self, pedido: PedidoCanal) -> int:
+        fila = self._filas.get(pedido.chave[0])
+        if not fila or pedido.futuro.done():
+            return 0
+        if not pedido.seq or pedido.seq < fila[0].seq:
+            return 0  # já saiu da fila, está sendo criado
+        return pedido.seq - fila[0].seq + 1
+
+    def solicitar(
+        self, guild: discord.Guild, user_id: int, tipo: str, criar, prioritario: bool = False
+    ) -> tuple[PedidoCanal, int, bool]:
+        # Retorna (pedido, posição, novo). Clique repetido devolve o pedido que já existe.
+        # prioritario: não gasta criação de canal (ex.: pool), roda na hora sem fila.
+        chave = (guild.id, user_id, tipo)
+        existente = self._pedidos.get(chave)
+        if existente is not None:
+            return existente, self.posicao(existente), False
+
+        if prioritario:
+            pedido = PedidoCanal(chave, 0, criar)
+            self._pedidos[chave] = pedido
+            self._disparar(pedido, usa_semaforo=False)
+            return pedido, 0, True
+
+        seq = self._seq.get(guild.id, 0) + 1
+        self._seq[guild.id] = seq
+        pedido = PedidoCanal(chave, seq, criar)
+        self._pedidos[chave] = pedido
+        self._filas.setdefault(guild.id, deque()).append(pedido)
+        if guild.id not in self._workers:
+            self._workers[guild.id] = asyncio.create_task(self._worker(guild.id), name=f"nr-provisao-{guild.id}")
+        return pedido, self.posicao(pedido), True
+
+    async def _worker(self, guild_id: int):
+        fila = self._filas[guild_id]
+        bucket = self._bucket(guild_id)
+        try:
+            while fila:
+                espera = bucket.espera()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                    continue
+                await self._sem(guild_id).acquire()
+                bucket.consumir()
+                self._disparar(fila.popleft(), usa_semaforo=True)
+        finally:
+            del self._workers[guild_id]
+
+    def _disparar(self, pedido: PedidoCanal, usa_semaforo: bool):
+        task = asyncio.create_task(self._executar(pedido, usa_semaforo))
+        self._rodando.add(task)
+        task.add_done_callback(self._rodando.discard)
+
+    async def _executar(self, pedido: PedidoCanal, usa_semaforo: bool):
+        espera = time.monotonic() - pedido.criado_em
+        self.espera_total += espera
+        self.espera_max = max(self.espera_max, espera)
+        try:
+            with medir("criar_canal"):
+                resultado = await pedido.criar()
+        except Exception as e:
+            self.falhas += 1
+            pedido.futuro.set_exception(e)
+        else:
+            self.atendidos += 1
+            pedido.futuro.set_result(resultado)
+        finally:
+            if usa_semaforo:
+                self._sem(pedido.chave[0]).release()
+            self._pedidos.pop(pedido.chave, None)
+
+    def _bucket(self, guild_id: int) -> TokenBucket:
+        return self._buckets.setdefault(guild_id, TokenBucket(PROVISAO_TAXA, PROVISAO_RAJADA))
+
+    def consumir_ritmo(self, guild_id: int) -> bool:
+        # Criação fora da fila (reposição do pool) gasta do mesmo balde da guild
+        return self._bucket(guild_id).consumir()
+
+    def pendente(self, guild_id: int, user_id: int, tipo: str) -> bool:
+        return (guild_id, user_id, tipo) in self._pedidos
+
+    def _sem(self, guild_id: int) -> asyncio.Semaphore:
+        sem = self._sems.get(guild_id)
+        if sem is None:
+            sem = self._sems[guild_id] = asyncio.Semaphore(self._concorrencia)
+        return sem
+
+    def fila_vazia(self, guild_id: int) -> bool:
+        return not self._filas.get(guild_id)
+
+    def metricas(self) -> dict:
+        total = self.atendidos + self.falhas
+        return {
+            "fila_por_guild": {gid: len(f) for gid, f in self._filas.items() if f},
+            "fila_total": sum(len(f) for f in self._filas.values()),
+            "em_andamento": len(self._rodando),
+            "atendidos": self.atendidos,
+            "falhas": self.falhas,
+            "espera_media_s": (self.espera_total / total) if total else 0.0,
+            "espera_max_s": self.espera_max,
+        }
+
+PROVISAO = ChannelProvisioner()
+
+# =========================================================
+# POOL DE CANAIS (warm pool)
+# =========================================================
+class ChannelPool:
+    # Canais ocultos já criados nas categorias de ticket/WL. Retirar um custa
+    # uma única edição (nome + permissões); a reposição roda em segundo plano,
+    # devagar e só quando a fila de criação da guild está vazia.
+    CATEGORIAS = ("CATEGORIA_TICKET", "CATEGORIA_WL")
+
+    def __init__(self, tamanho: int = POOL_TAMANHO, intervalo: float = POOL_REFILL_INTERVALO):
+        self.tamanho = tamanho
+        self.intervalo = intervalo
+        self._disponiveis: dict[tuple[int, str], deque[int]] = {}
+        self._adotadas: set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.criados = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self.tamanho > 0
+
+    def iniciar(self, client: discord.Client):
+        if self.ativo and self._task is None:
+            self._task = asyncio.create_task(self._refill_loop(client), name="nr-channel-pool")
+
+    async def parar(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def adotar(self, guild: discord.Guild):
+        # ✅ Reaproveita os canais de pool que já existem (restart). Uma vez por guild:
+        # o on_ready volta a cada reconexão e um canal já retirado (ainda com o nome
+        # do pool enquanto é preparado) não pode voltar pra fila
+        if guild.id in self._adotadas:
+            return
+        self._adotadas.add(guild.id)
+        for chave in self.CATEGORIAS:
+            categoria = get_config_category(guild, chave)
+            if not categoria:
+                continue
+            ids = deque(ch.id for ch in categoria.text_channels if ch.name.startswith(POOL_PREFIXO))
+            self._disponiveis[(guild.id, chave)] = ids
+
+    def esquecer(self, channel: discord.abc.GuildChannel):
+        for (gid, _), ids in self._disponiveis.items():
+            if gid == channel.guild.id and channel.id in ids:
+                ids.remove(channel.id)
+                return
+
+    def disponiveis(self, guild_id: int, chave: str) -> int:
+        return len(self._disponiveis.get((guild_id, chave), ()))
+
+    def reservar(self, guild: discord.Guild, chave: str) -> Optional[discord.TextChannel]:
+        # Síncrono: dois cliques ao mesmo tempo nunca levam o mesmo canal
+        if not self.ativo:
+            return None
+        ids = self._disponiveis.get((guild.id, chave))
+        while ids:
+            ch = guild.get_channel(ids.popleft())
+            if isinstance(ch, discord.TextChannel):
+                return ch
+        self.misses += 1
+        return None
+
+    async def preparar(self, ch: discord.TextChannel, nome: str, overwrites: dict) -> Optional[discord.TextChannel]:
+        try:
+            await ch.edit(name=nome, overwrites=overwrites, reason="Canal retirado do pool")
+        except discord.HTTPException:
+            logger.warning("Pool: falha ao preparar %s; criando do zero.", ch.id)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ch
+
+    async def _refill_loop(self, client: discord.Client):
+        await client.wait_until_ready()
+        while True:
+            criou = False
+            for guild in client.guilds:
+                if not PROVISAO.fila_vazia(guild.id):
+                    continue  # usuários na fila têm prioridade
+                for chave in self.CATEGORIAS:
+                    if self.disponiveis(guild.id, chave) < self.tamanho:
+                        # mesmo ritmo de criação da fila: sem token, fica pra próxima volta
+                        if PROVISAO.consumir_ritmo(guild.id):
+                            criou = await self._criar_um(guild, chave) or criou
+                        break
+                if criou:
+                    break
+            await asyncio.sleep(self.intervalo if criou else max(self.intervalo, 30.0))
+
+    async def _criar_um(self, guild: discord.Guild, chave: str) -> bool:
+        categoria = get_config_category(guild, chave)
+        if not categoria:
+            return False
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(view_channel=False),
+            guild.me: discord.PermissionOverwrite(view_channel=True, manage_channels=True, send_messages=True),
+        }
+        try:
+            ch = await guild.create_text_channel(
+                name=f"{POOL_PREFIXO}{os.urandom(3).hex()}", category=categoria, overwrites=overwrites,
+                reason="Pool de canais"
+            )
+        except discord.HTTPException:
+            logger.exception("Pool: falha ao criar canal em %s.", guild.id)
+            return False
+        self._disponiveis.setdefault((guild.id, chave), deque()).append(ch.id)
+        self.criados += 1
+        return True
+
+    def metricas(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_hit": (self.hits / total) if total else 0.0,
+            "criados": self.criados,
+            "disponiveis": sum(len(ids) for ids in self._disponiveis.values()),
+        }
+
+POOL = ChannelPool()
+
+async def obter_canal(
+    interaction: discord.Interaction, tipo: str, chave_categoria: str,
+    categoria: discord.CategoryChannel, overwrites: dict, gerar_nome, rotulo: str
+) -> Optional[discord.TextChannel]:
+    # Canal do pool quando houver (reservado na hora, sem fila); todo o resto
+    # vira create_text_channel pela fila, no ritmo da guild
+    guild = interaction.guild
+    nome: Optional[str] = None
+
+    async def nome_unico() -> str:
+        # o nome (e o número do ticket) sai uma vez só, mesmo se o pool falhar
+        nonlocal nome
+        if nome is None:
+            nome = await gerar_nome()
+        return nome
+
+    async def criar():
+        return await guild.create_text_channel(name=await nome_unico(), category=categoria, overwrites=overwrites)
+
+    # sem await entre a checagem, a reserva e o solicitar(): clique repetido não gasta canal do pool
+    reservado = None
+    if not PROVISAO.pendente(guild.id, interaction.user.id, tipo):
+        reservado = POOL.reservar(guild, chave_categoria)
+    if reservado is not None:
+        async def do_pool():
+            return await POOL.preparar(reservado, await nome_unico(), overwrites)
+
+        canal = await aguardar_provisao(interaction, tipo, do_pool, rotulo, prioritario=True)
+        if canal is not None:
+            return canal
+    return await aguardar_provisao(interaction, tipo, criar, rotulo)
+
+async def aguardar_provisao(interaction: discord.Interaction, tipo: str, criar, rotulo: str, prioritario: bool = False):
+    # Enfileira a criação e mantém o usuário informado; devolve o resultado de criar()
+    pedido, posicao, novo = PROVISAO.solicitar(interaction.guild, interaction.user.id, tipo, criar, prioritario)
+    if not novo:
+        msg = f"⏳ Seu pedido de {rotulo} já está na fila"
+        await interaction.followup.send(msg + (f" (você é o {posicao}º)." if posicao else "."), ephemeral=True)
+        return None
+    if posicao >= PROVISAO_AVISO_POSICAO:
+        await interaction.followup.send(
+            f"⏳ Muitos pedidos agora — você é o **{posicao}º** na fila. Seu {rotulo} sai já já.", ephemeral=True
+        )
+    return await pedido.futuro
+
+# =========================================================
+# SQLITE (WAL)
+# =========================================================
+class SQLiteDB:
+    # Uma conexão só, usada por uma thread dedicada: o event loop nunca espera disco
+    def __init__(self, path: Path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nr-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._conn = conn
+        return self._conn
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(self._connect(), *args))
+
+    async def close(self):
+        def _close(conn: sqlite3.Connection):
+            conn.close()
+            self._conn = None
+        if self._conn is not None:
+            await self.run(_close)
+        self._executor.shutdown(wait=True)
+
+def _sqlite_tx(conn: sqlite3.Connection, fn, *args):
+    # BEGIN IMMEDIATE: pega o lock de escrita já no início (seguro entre processos)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        result = fn(conn, *args)
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return result
+
+# =========================================================
+# TICKETS DB (repositório plugável)
+# =========================================================
+TICKET_COLUNAS = ("user_id", "tipo", "ticket_num", "assumido_por", "guild_id")
+
+def _chave_contador(guild_id: Optional[int]) -> str:
+    # Cada guild numera os próprios tickets; a guild principal mantém o contador antigo
+    if guild_id is None or guild_id == GUILD_ID:
+        return "contador"
+    return f"contador:{guild_id}"
+
+class TicketRepository(ABC):
+    # O StateCache lê tudo no boot e grava em lote no flush; não há acesso por linha
+    async def abrir(self):
+        pass
+
+    async def fechar(self):
+        pass
+
+    @abstractmethod
+    async def reservar_bloco(self, tamanho: int, guild_id: Optional[int] = None) -> tuple[int, int]:
+        # Retorna (primeiro, último) de uma faixa exclusiva de números de ticket da guild
+        ...
+
+    @abstractmethod
+    async def load_all(self) -> dict[int, dict]:
+        ...
+
+    @abstractmethod
+    async def bulk_apply(self, upserts: dict[int, dict], deletes: list[int]):
+        ...
+
+class JsonTicketRepository(TicketRepository):
+    # Backend legado: arquivo inteiro por operação (fora do loop, mas O(n))
+    def __init__(self, db_file: Path, counter_file: Path):
+        self.db_file = db_file
+        self.counter_file = counter_file
+        self._lock = asyncio.Lock()
+
+    async def _mutate(self, fn):
+        # ler-alterar-gravar inteiro sob trava de arquivo: outro processo (sharding)
+        # não pode gravar entre a nossa leitura e a nossa escrita
+        def rmw():
+            with _trava_arquivo(self.db_file.with_suffix(self.db_file.suffix + ".lock")):
+                db = _load_json(self.db_file, {})
+                if fn(db):
+                    _save_json(self.db_file, db)
+        async with self._lock:
+            await asyncio.to_thread(rmw)
+
+    async def reservar_bloco(self, tamanho: int, guild_id: Optional[int] = None) -> tuple[int, int]:
+        chave = _chave_contador(guild_id)
+
+        def fn() -> tuple[int, int]:
+            with _trava_arquivo(self.counter_file.with_suffix(self.counter_file.suffix + ".lock")):
+                data = _load_json(self.counter_file, {"contador": 0})
+                inicio = int(data.get(chave, 0)) + 1
+                data[chave] = inicio + tamanho - 1
+                _save_json(self.counter_file, data)
+                return (inicio, data[chave])
+        return await asyncio.to_thread(fn)
+
+    async def load_all(self) -> dict[int, dict]:
+        db = await asyncio.to_thread(_load_json, self.db_file, {})
+        return {int(k): v for k, v in db.items()}
+
+    async def bulk_apply(self, upserts: dict[int, dict], deletes: list[int]):
+        def fn(db):
+            for channel_id, data in upserts.items():
+                db[str(channel_id)] = dict(data)
+            for channel_id in deletes:
+                db.pop(str(channel_id), None)
+            return True
+        await self._mutate(fn)
+
+class SQLiteTicketRepository(TicketRepository):
+    # Índice B-tree por channel_id (INTEGER PRIMARY KEY): leitura/escrita O(log n)
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    async def abrir(self):
+        await self.db.run(self._criar_schema)
+        migrados = await self.db.run(migrar_json_para_sqlite, TICKETS_DB_FILE, TICKETS_COUNTER_FILE)
+        if migrados is not None:
+            logger.info("Migração JSON -> SQLite concluída: %s tickets importados.", migrados)
+
+    async def fechar(self):
+        await self.db.close()
+
+    @staticmethod
+    def _criar_schema(conn: sqlite3.Connection):
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tickets (
+                channel_id   INTEGER PRIMARY KEY,
+                user_id      INTEGER NOT NULL,
+                tipo         TEXT    NOT NULL,
+                ticket_num   INTEGER NOT NULL,
+                assumido_por INTEGER,
+                guild_id     INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                chave TEXT PRIMARY KEY,
+                valor TEXT
+            );
+            """
+        )
+        colunas = {r["name"] for r in conn.execute("PRAGMA table_info(tickets)")}
+        if "guild_id" not in colunas:
+            conn.execute("ALTER TABLE tickets ADD COLUMN guild_id INTEGER")
+
+    async def reservar_bloco(self, tamanho: int, guild_id: Optional[int] = None) -> tuple[int, int]:
+        chave = _chave_contador(guild_id)
+
+        def fn(conn: sqlite3.Connection) -> tuple[int, int]:
+            row = conn.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+            inicio = (int(row["valor"]) if row else 0) + 1
+            fim = inicio + tamanho - 1
+            conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (chave, str(fim)))
+            return (inicio, fim)
+        return await self.db.run(_sqlite_tx, fn)
+
+    async def load_all(self) -> dict[int, dict]:
+        def fn(conn: sqlite3.Connection):
+            rows = conn.execute(
+                "SELECT channel_id, user_id, tipo, ticket_num, assumido_por, guild_id FROM tickets"
+            ).fetchall()
+            return {r["channel_id"]: {k: r[k] for k in TICKET_COLUNAS} for r in rows}
+        return await self.db.run(fn)
+
+    async def bulk_apply(self, upserts: dict[int, dict], deletes: list[int]):
+        rows = [
+            (cid, d["user_id"], d["tipo"], d["ticket_num"], d.get("assumido_por"), d.get("guild_id"))
+            for cid, d in upserts.items()
+        ]
+
+        def fn(conn: sqlite3.Connection):
+            if rows:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO tickets (channel_id, user_id, tipo, ticket_num, assumido_por, guild_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            if deletes:
+                conn.executemany("DELETE FROM tickets WHERE channel_id = ?", [(cid,) for cid in deletes])
+        await self.db.run(_sqlite_tx, fn)
+
+def migrar_json_para_sqlite(conn: sqlite3.Connection, db_file: Path, counter_file: Path) -> Optional[int]:
+    # ✅ One-shot: importa ticket_data.json + tickets.json uma única vez (marcado em meta)
+    if conn.execute("SELECT 1 FROM meta WHERE chave = 'migracao_json'").fetchone():
+        return None
+
+    def fn(conn: sqlite3.Connection) -> int:
+        db = _load_json(db_file, {})
+        rows = []
+        for key, info in db.items():
+            try:
+                rows.append((
+                    int(key), int(info["user_id"]), str(info.get("tipo", "ticket")),
+                    int(info.get("ticket_num", 0)), info.get("assumido_por")
+                ))
+            except (KeyError, TypeError, ValueError):
+                continue
+        conn.executemany(
+            "INSERT OR IGNORE INTO tickets (channel_id, user_id, tipo, ticket_num, assumido_por) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+
+        contador = int(_load_json(counter_file, {"contador": 0}).get("contador", 0))
+        row = conn.execute("SELECT valor FROM meta WHERE chave = 'contador'").fetchone()
+        atual = int(row["valor"]) if row else 0
+        conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('contador', ?)", (str(max(atual, contador)),))
+        conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('migracao_json', '1')")
+        return len(rows)
+
+    return _sqlite_tx(conn, fn)
+
+# ✅ Um banco só pro bot (tickets, sessões de WL, ...)
+DB = SQLiteDB(SQLITE_FILE)
+
+def _criar_ticket_repo() -> TicketRepository:
+    if TICKET_BACKEND == "json":
+        return JsonTicketRepository(TICKETS_DB_FILE, TICKETS_COUNTER_FILE)
+    return SQLiteTicketRepository(DB)
+
+TICKET_REPO = _criar_ticket_repo()
+
+# =========================================================
+# SHARDING + ESTADO COMPARTILHADO (entre processos)
 # =========================================================
-def gerar_ticket_numero() -> int:
-    data = _load_json(TICKETS_COUNTER_FILE, {"contador": 0})
-    data["contador"] = int(data.get("contador", 0)) + 1
-    _save_json(TICKETS_COUNTER_FILE, data)
-    return data["contador"]
+# Cada guild é de um shard só ((guild_id >> 22) % shard_count), então cada
+# processo só carrega e agenda o que é das suas guilds. O que precisa valer
+# entre processos (trava da WL, WL por usuário, ticket assumido) vai pro
+# estado compartilhado; o resto continua na memória.
+PROCESSO_PRINCIPAL = not SHARD_IDS or 0 in SHARD_IDS  # sync de comandos e tarefas sem guild
+PROCESSO_ID = f"{os.getpid()}-{os.urandom(4).hex()}"
+
+def guild_local(guild_id: Optional[int]) -> bool:
+    if guild_id is None:
+        return PROCESSO_PRINCIPAL
+    if not SHARD_IDS or not SHARD_COUNT:
+        return True
+    return (guild_id >> 22) % SHARD_COUNT in SHARD_IDS
+
+class EstadoCompartilhado(ABC):
+    # Chave/valor com prazo opcional + "adquirir": grava só se a chave estiver
+    # livre (ou vencida), atômico entre processos.
+    duravel = True  # sobrevive a restart? (senão quem precisa persiste por conta própria)
+    async def abrir(self):
+        pass
+
+    async def fechar(self):
+        pass
+
+    @abstractmethod
+    async def get(self, chave: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, chave: str, valor: str, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def delete(self, chave: str):
+        ...
+
+    @abstractmethod
+    async def itens(self, prefixo: str) -> dict[str, str]:
+        ...
+
+    @abstractmethod
+    async def adquirir(self, chave: str, dono: str, ttl: Optional[float] = None) -> bool:
+        ...
+
+    @abstractmethod
+    async def liberar(self, chave: str, dono: str):
+        # só solta se ainda for nossa (pode ter vencido e sido pega por outro)
+        ...
+
+class EstadoMemoria(EstadoCompartilhado):
+    duravel = False
+
+    def __init__(self):
+        self._dados: dict[str, tuple[str, Optional[float]]] = {}
+
+    def _vivo(self, chave: str) -> Optional[str]:
+        item = self._dados.get(chave)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.time():
+            del self._dados[chave]
+            return None
+        return item[0]
+
+    async def get(self, chave: str) -> Optional[str]:
+        return self._vivo(chave)
+
+    async def set(self, chave: str, valor: str, ttl: Optional[float] = None):
+        self._dados[chave] = (valor, time.time() + ttl if ttl else None)
+
+    async def delete(self, chave: str):
+        self._dados.pop(chave, None)
+
+    async def itens(self, prefixo: str) -> dict[str, str]:
+        achados = {}
+        for chave in [c for c in self._dados if c.startswith(prefixo)]:
+            valor = self._vivo(chave)
+            if valor is not None:
+                achados[chave] = valor
+        return achados
+
+    async def adquirir(self, chave: str, dono: str, ttl: Optional[float] = None) -> bool:
+        if self._vivo(chave) is not None:
+            return False
+        await self.set(chave, dono, ttl)
+        return True
+
+    async def liberar(self, chave: str, dono: str):
+        if self._vivo(chave) == dono:
+            del self._dados[chave]
+
+class EstadoSQLite(EstadoCompartilhado):
+    # Mesmo arquivo do resto do bot; BEGIN IMMEDIATE serializa entre processos
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    async def abrir(self):
+        def fn(conn: sqlite3.Connection):
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS estado (
+                    chave  TEXT PRIMARY KEY,
+                    valor  TEXT NOT NULL,
+                    expira REAL
+                )
+                """
+            )
+            conn.execute("DELETE FROM estado WHERE expira IS NOT NULL AND expira <= ?", (time.time(),))
+        await self.db.run(fn)
+
+    async def get(self, chave: str) -> Optional[str]:
+        def fn(conn: sqlite3.Connection):
+            row = conn.execute(
+                "SELECT valor FROM estado WHERE chave = ? AND (expira IS NULL OR expira > ?)", (chave, time.time())
+            ).fetchone()
+            return row["valor"] if row else None
+        return await self.db.run(fn)
+
+    async def set(self, chave: str, valor: str, ttl: Optional[float] = None):
+        linha = (chave, valor, time.time() + ttl if ttl else None)
+        await self.db.run(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO estado (chave, valor, expira) VALUES (?, ?, ?)", linha
+        ))
+
+    async def delete(self, chave: str):
+        await self.db.run(lambda conn: conn.execute("DELETE FROM estado WHERE chave = ?", (chave,)))
+
+    async def itens(self, prefixo: str) -> dict[str, str]:
+        def fn(conn: sqlite3.Connection):
+            rows = conn.execute(
+                "SELECT chave, valor FROM estado WHERE substr(chave, 1, ?) = ? AND (expira IS NULL OR expira > ?)",
+                (len(prefixo), prefixo, time.time())
+            ).fetchall()
+            return {r["chave"]: r["valor"] for r in rows}
+        return await self.db.run(fn)
+
+    async def adquirir(self, chave: str, dono: str, ttl: Optional[float] = None) -> bool:
+        def fn(conn: sqlite3.Connection) -> bool:
+            agora = time.time()
+            conn.execute("DELETE FROM estado WHERE chave = ? AND expira IS NOT NULL AND expira <= ?", (chave, agora))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO estado (chave, valor, expira) VALUES (?, ?, ?)",
+                (chave, dono, agora + ttl if ttl else None)
+            )
+            return cur.rowcount == 1
+        return await self.db.run(_sqlite_tx, fn)
+
+    async def liberar(self, chave: str, dono: str):
+        await self.db.run(lambda conn: conn.execute("DELETE FROM estado WHERE chave = ? AND valor = ?", (chave, dono)))
+
+def _criar_estado() -> EstadoCompartilhado:
+    if ESTADO_BACKEND == "memoria":
+        return EstadoMemoria()
+    return EstadoSQLite(DB)
+
+ESTADO = _criar_estado()
+
+# =========================================================
+# CACHE DE ESTADO (write-behind: lê da memória, grava em lote)
+# =========================================================
+class StateCache:
+    def __init__(self, repo: TicketRepository, wl_lock_file: Path, estado: EstadoCompartilhado):
+        self.repo = repo
+        self.wl_lock_file = wl_lock_file
+        self.estado = estado
+        self.tickets: dict[int, dict] = {}
+        # (guild_id, user_id) -> abertos: o limite é por guild
+        self.abertos_por_usuario: dict[tuple[Optional[int], int], int] = {}
+        # trava da WL por guild; guild sem entrada usa o padrão (o "locked" antigo)
+        self.wl_locked_padrao = False
+        self.wl_locked: dict[int, bool] = {}
+        self._dirty_tickets: set[int] = set()
+        self._wl_lock_dirty: set[int] = set()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def carregar(self):
+        self.tickets = {}
+        self.abertos_por_usuario = {}
+        for channel_id, info in (await self.repo.load_all()).items():
+            # tickets de antes do multi-guild são da guild principal
+            if info.get("guild_id") is None:
+                info["guild_id"] = GUILD_ID
+            # com sharding, ticket de guild de outro processo fica com ele
+            if not guild_local(info["guild_id"]):
+                continue
+            self.tickets[channel_id] = info
+            self._contar(info, 1)
+        # wl_lock.json: legado (ou a própria persistência, com backend em memória);
+        # o estado compartilhado manda
+        data = await asyncio.to_thread(_load_json, self.wl_lock_file, {"locked": False})
+        self.wl_locked_padrao = bool(data.get("locked", False))
+        self.wl_locked = {int(gid): bool(v) for gid, v in (data.get("guilds") or {}).items()}
+        for chave, valor in (await self.estado.itens("wl_trancada:")).items():
+            self.wl_locked[int(chave.split(":", 1)[1])] = valor == "1"
+        self._task = asyncio.create_task(self._flush_loop(), name="nr-state-flush")
+
+    # ---- tickets ----
+    def get_ticket(self, channel_id: int) -> Optional[dict]:
+        return self.tickets.get(channel_id)
+
+    def set_ticket(self, channel_id: int, data: dict):
+        anterior = self.tickets.get(channel_id)
+        if anterior is not None:
+            self._contar(anterior, -1)
+        self.tickets[channel_id] = data
+        self._contar(data, 1)
+        self._marcar_ticket(channel_id)
+
+    def tickets_abertos(self, guild_id: int, user_id: int) -> int:
+        return self.abertos_por_usuario.get((guild_id, user_id), 0)
+
+    def _contar(self, info: dict, delta: int):
+        user_id = info.get("user_id")
+        if user_id is None:
+            return
+        chave = (info.get("guild_id"), user_id)
+        n = self.abertos_por_usuario.get(chave, 0) + delta
+        if n > 0:
+            self.abertos_por_usuario[chave] = n
+        else:
+            self.abertos_por_usuario.pop(chave, None)
+
+    def update_ticket(self, channel_id: int, **kwargs):
+        info = self.tickets.get(channel_id)
+        if info is None:
+            return
+        info.update(kwargs)
+        self._marcar_ticket(channel_id)
+
+    def delete_ticket(self, channel_id: int):
+        info = self.tickets.pop(channel_id, None)
+        if info is not None:
+            self._contar(info, -1)
+            self._marcar_ticket(channel_id)
+
+    def _marcar_ticket(self, channel_id: int):
+        self._dirty_tickets.add(channel_id)
+        self._wake.set()
+
+    # ---- WL lock ----
+    def is_wl_locked(self, guild_id: int) -> bool:
+        return self.wl_locked.get(guild_id, self.wl_locked_padrao)
+
+    def set_wl_locked(self, guild_id: int, value: bool):
+        self.wl_locked[guild_id] = bool(value)
+        self._wl_lock_dirty.add(guild_id)
+        self._wake.set()
+
+    # ---- flush ----
+    async def _flush_loop(self):
+        while True:
+            await self._wake.wait()
+            # ✅ Segura um pouco pra juntar várias mudanças numa escrita só
+            await asyncio.sleep(STATE_FLUSH_INTERVALO)
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Falha ao gravar estado; tentando de novo no próximo ciclo.")
+                self._wake.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            dirty, self._dirty_tickets = self._dirty_tickets, set()
+            wl_dirty, self._wl_lock_dirty = self._wl_lock_dirty, set()
+
+            upserts = {cid: dict(self.tickets[cid]) for cid in dirty if cid in self.tickets}
+            deletes = [cid for cid in dirty if cid not in self.tickets]
+            try:
+                with medir("state_flush"):
+                    if upserts or deletes:
+                        await self.repo.bulk_apply(upserts, deletes)
+                    if wl_dirty and not self.estado.duravel:
+                        # backend em memória: a trava da WL continua indo pro wl_lock.json
+                        await asyncio.to_thread(_save_json, self.wl_lock_file, {
+                            "locked": self.wl_locked_padrao,
+                            "guilds": {str(gid): v for gid, v in self.wl_locked.items()},
+                        })
+                    for gid in wl_dirty:
+                        await self.estado.set(f"wl_trancada:{gid}", "1" if self.wl_locked[gid] else "0")
+            except Exception:
+                self._dirty_tickets |= dirty
+                self._wl_lock_dirty |= wl_dirty
+                raise
 
-def load_ticket_db() -> dict:
-    return _load_json(TICKETS_DB_FILE, {})
+    async def fechar(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
 
-def save_ticket_db(data: dict):
-    _save_json(TICKETS_DB_FILE, data)
+STATE = StateCache(TICKET_REPO, WL_LOCK_FILE, ESTADO)
 
-def set_ticket_data(channel_id: int, user_id: int, tipo: str, ticket_num: int):
-    db = load_ticket_db()
-    db[str(channel_id)] = {"user_id": user_id, "tipo": tipo, "ticket_num": ticket_num, "assumido_por": None}
-    save_ticket_db(db)
+# =========================================================
+# NÚMERO DO TICKET (alocação em blocos)
+# =========================================================
+class TicketNumberAllocator:
+    # Entrega números da memória; só o teto do bloco é persistido.
+    # Cada processo reserva faixas exclusivas, então nunca há número repetido
+    # (números não usados de um bloco se perdem num restart, o que é aceitável).
+    def __init__(self, repo: TicketRepository, bloco: int = TICKET_NUM_BLOCO, guild_id: Optional[int] = None):
+        self.repo = repo
+        self.bloco = max(1, bloco)
+        self.guild_id = guild_id
+        self._proximo = 1
+        self._limite = 0
+        self._lock = asyncio.Lock()
+
+    async def proximo(self) -> int:
+        if self._proximo > self._limite:
+            async with self._lock:
+                # outra corrotina pode ter reservado enquanto esperávamos o lock
+                if self._proximo > self._limite:
+                    self._proximo, self._limite = await self.repo.reservar_bloco(self.bloco, self.guild_id)
+        n = self._proximo
+        self._proximo += 1
+        return n
+
+# Um alocador (e um contador) por guild
+TICKET_NUMEROS: dict[int, TicketNumberAllocator] = {}
+
+async def gerar_ticket_numero(guild_id: int) -> int:
+    alloc = TICKET_NUMEROS.get(guild_id)
+    if alloc is None:
+        alloc = TICKET_NUMEROS[guild_id] = TicketNumberAllocator(TICKET_REPO, guild_id=guild_id)
+    return await alloc.proximo()
+
+def set_ticket_data(channel_id: int, guild_id: int, user_id: int, tipo: str, ticket_num: int):
+    STATE.set_ticket(channel_id, {
+        "user_id": user_id, "tipo": tipo, "ticket_num": ticket_num, "assumido_por": None, "guild_id": guild_id
+    })
 
 def get_ticket_data(channel_id: int):
-    return load_ticket_db().get(str(channel_id))
+    return STATE.get_ticket(channel_id)
 
 def update_ticket_data(channel_id: int, **kwargs):
-    db = load_ticket_db()
-    key = str(channel_id)
-    if key not in db:
-        return
-    db[key].update(kwargs)
-    save_ticket_db(db)
+    STATE.update_ticket(channel_id, **kwargs)
 
 def delete_ticket_data(channel_id: int):
-    db = load_ticket_db()
-    key = str(channel_id)
-    if key in db:
-        del db[key]
-        save_ticket_db(db)
+    STATE.delete_ticket(channel_id)
+    criar_tarefa(ESTADO.delete(f"ticket_assumido:{channel_id}"))
+
+def reconciliar_tickets(guild: discord.Guild):
+    # Canal apagado com o bot fora do ar: o ticket sai do estado (e do limite por usuário)
+    for channel_id in [cid for cid, info in STATE.tickets.items() if info.get("guild_id") == guild.id]:
+        if guild.get_channel(channel_id) is None:
+            delete_ticket_data(channel_id)
+
+# =========================================================
+# AGENDADOR (todos os prazos num heap só, persistido)
+# =========================================================
+class Tarefa:
+    __slots__ = ("chave", "tipo", "quando", "dados", "seq", "guild_id")
+
+    def __init__(self, chave: str, tipo: str, quando: float, dados: dict, seq: int, guild_id: Optional[int] = None):
+        self.chave = chave
+        self.tipo = tipo
+        self.quando = quando
+        self.dados = dados
+        self.seq = seq
+        self.guild_id = guild_id
+
+class Agendador:
+    # Timeouts de WL, canais a apagar e lembretes: um único loop dorme até o
+    # próximo prazo, em vez de uma corrotina parada em sleep por item.
+    # Cada tarefa tem uma chave ("apagar:<canal>"); agendar de novo a mesma
+    # chave substitui, cancelar remove. Tudo vai pro SQLite e volta num restart
+    # (com sharding, cada processo só carrega as tarefas das suas guilds).
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+        self._tarefas: dict[str, Tarefa] = {}
+        self._heap: list[tuple[float, int, str]] = []
+        self._seq = 0
+        self._handlers: dict[str, object] = {}
+        self._acordar = asyncio.Event()
+        self._client: Optional[discord.Client] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._gravacoes: set[asyncio.Task] = set()
+
+    def registrar(self, tipo: str, fn):
+        # fn(client, dados) -> corrotina
+        self._handlers[tipo] = fn
+
+    async def carregar(self):
+        def fn(conn: sqlite3.Connection):
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS agenda (
+                    chave    TEXT PRIMARY KEY,
+                    tipo     TEXT NOT NULL,
+                    quando   REAL NOT NULL,
+                    dados    TEXT NOT NULL,
+                    guild_id INTEGER
+                )
+                """
+            )
+            colunas = {r["name"] for r in conn.execute("PRAGMA table_info(agenda)")}
+            if "guild_id" not in colunas:
+                conn.execute("ALTER TABLE agenda ADD COLUMN guild_id INTEGER")
+            _preencher_guild_agenda(conn)
+            return conn.execute("SELECT chave, tipo, quando, dados, guild_id FROM agenda").fetchall()
+        for r in await self.db.run(fn):
+            # sem guild (legado que não deu pra resolver): todo processo carrega; ver _executar
+            if r["guild_id"] is None or guild_local(r["guild_id"]):
+                self._colocar(r["chave"], r["tipo"], r["quando"], json.loads(r["dados"]), r["guild_id"])
+
+    def iniciar(self, client: discord.Client):
+        self._client = client
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._loop(), name="nr-agendador")
+
+    async def parar(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._loop_task
+            self._loop_task = None
+        if self._gravacoes:
+            await asyncio.gather(*self._gravacoes, return_exceptions=True)
+
+    def agendar(self, chave: str, tipo: str, quando: float, guild_id: Optional[int] = None, **dados):
+        self._colocar(chave, tipo, quando, dados, guild_id)
+        linha = (chave, tipo, quando, json.dumps(dados, ensure_ascii=False), guild_id)
+        self._gravar(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO agenda (chave, tipo, quando, dados, guild_id) VALUES (?, ?, ?, ?, ?)", linha
+        ))
+
+    def cancelar(self, chave: str) -> bool:
+        if self._tarefas.pop(chave, None) is None:
+            return False
+        # a entrada no heap fica órfã e é ignorada quando chegar a vez
+        self._gravar(lambda conn: conn.execute("DELETE FROM agenda WHERE chave = ?", (chave,)))
+        return True
+
+    def pendentes(self) -> int:
+        return len(self._tarefas)
+
+    def _colocar(self, chave: str, tipo: str, quando: float, dados: dict, guild_id: Optional[int] = None):
+        self._seq += 1
+        self._tarefas[chave] = Tarefa(chave, tipo, quando, dados, self._seq, guild_id)
+        heapq.heappush(self._heap, (quando, self._seq, chave))
+        # só precisa acordar o loop se o novo prazo for o mais próximo
+        if self._heap[0][1] == self._seq:
+            self._acordar.set()
+
+    def _gravar(self, fn):
+        # a thread do SQLite é FIFO, então a ordem das gravações é preservada
+        task = asyncio.create_task(self.db.run(fn))
+        self._gravacoes.add(task)
+        task.add_done_callback(self._gravacoes.discard)
+
+    async def _loop(self):
+        while True:
+            self._acordar.clear()
+            agora = time.time()
+            while self._heap and self._heap[0][0] <= agora:
+                _, seq, chave = heapq.heappop(self._heap)
+                tarefa = self._tarefas.get(chave)
+                if tarefa is None or tarefa.seq != seq:
+                    continue
+                del self._tarefas[chave]
+                criar_tarefa(self._executar(tarefa))
+            espera = self._heap[0][0] - agora if self._heap else None
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._acordar.wait(), espera)
+
+    async def _executar(self, tarefa: Tarefa):
+        if SHARD_IDS and tarefa.guild_id is None and "canal" in tarefa.dados \
+                and self._client.get_channel(tarefa.dados["canal"]) is None:
+            # legado sem guild e canal que não é nosso: a linha fica pro processo dono
+            return
+        fn = self._handlers.get(tarefa.tipo)
+        try:
+            if fn is None:
+                logger.warning("Agendador: tipo de tarefa desconhecido %r (%s)", tarefa.tipo, tarefa.chave)
+            else:
+                await fn(self._client, tarefa.dados)
+        except Exception:
+            logger.exception("Agendador: falha em %s", tarefa.chave)
+        finally:
+            # se o handler reagendou a mesma chave, a linha nova fica
+            if tarefa.chave not in self._tarefas:
+                self._gravar(lambda conn: conn.execute("DELETE FROM agenda WHERE chave = ?", (tarefa.chave,)))
+
+def _preencher_guild_agenda(conn: sqlite3.Connection):
+    # Linhas de antes da coluna guild_id: resolve pelo canal nas tabelas que sabem a guild
+    # (sessão de WL, WL ativa, ticket; ticket sem guild é da guild principal)
+    tabelas = {r["name"] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    fontes = []
+    if "wl_sessoes" in tabelas:
+        fontes.append("(SELECT guild_id FROM wl_sessoes WHERE channel_id = json_extract(agenda.dados, '$.canal'))")
+    if "wl_ativas" in tabelas:
+        fontes.append("(SELECT guild_id FROM wl_ativas WHERE channel_id = json_extract(agenda.dados, '$.canal'))")
+    if "tickets" in tabelas:
+        fontes.append(
+            "(SELECT COALESCE(guild_id, ?) FROM tickets WHERE channel_id = json_extract(agenda.dados, '$.canal'))"
+        )
+    if not fontes:
+        return
+    params = (GUILD_ID,) if "tickets" in tabelas else ()
+    conn.execute(f"UPDATE agenda SET guild_id = COALESCE({', '.join(fontes)}, NULL) WHERE guild_id IS NULL", params)
+
+AGENDA = Agendador(DB)
+
+async def _tarefa_apagar_canal(client: discord.Client, dados: dict):
+    channel = client.get_channel(dados["canal"])
+    if channel is None:
+        return
+    try:
+        await channel.delete(reason=dados.get("motivo"))
+    except Exception:
+        pass
+
+AGENDA.registrar("apagar_canal", _tarefa_apagar_canal)
+
+def agendar_apagar_canal(channel: discord.abc.GuildChannel, depois: float, motivo: str):
+    AGENDA.agendar(f"apagar:{channel.id}", "apagar_canal", time.time() + depois, channel.guild.id,
+                   canal=channel.id, motivo=motivo)
+
+# =========================================================
+# WL LOCK
+# =========================================================
+def is_wl_locked(guild_id: int) -> bool:
+    return STATE.is_wl_locked(guild_id)
+
+def set_wl_locked(guild_id: int, value: bool):
+    STATE.set_wl_locked(guild_id, value)
 
 # =========================================================
 # EMBED: ANÚNCIO
@@ -198,6 +2210,311 @@ def norm(text: str) -> str:
     text = "\n".join(line.rstrip() for line in text.split("\n")).strip()
     return text
 
+# =========================================================
+# TRANSCRIPT (streaming, memória limitada)
+# =========================================================
+def _abrir_buffer(buffer, filename: str) -> discord.File:
+    buffer.seek(0)
+    return discord.File(buffer, filename=filename)
+
+def _fechar_buffer(buffer):
+    # discord.File troca o .close() da instância; chama o da classe direto
+    type(buffer).close(buffer)
+
+class Transcript:
+    # Um único buffer codificado, compartilhado por todos os discord.File
+    def __init__(self, buffer, filename: str, tamanho: int, mensagens: int, extras: Optional[list] = None):
+        self.buffer = buffer
+        self.filename = filename
+        self.tamanho = tamanho
+        self.mensagens = mensagens
+        self.extras: list[tuple] = extras or []  # (buffer, filename) — ex.: manifesto de anexos
+
+    def arquivo(self) -> discord.File:
+        return _abrir_buffer(self.buffer, self.filename)
+
+    def arquivos(self) -> list[discord.File]:
+        return [self.arquivo()] + [_abrir_buffer(b, nome) for b, nome in self.extras]
+
+    def close(self):
+        _fechar_buffer(self.buffer)
+        for b, _ in self.extras:
+            _fechar_buffer(b)
+
+class TranscriptWriter:
+    extensao = "txt"
+
+    def __init__(self):
+        self.buffer = tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_MEMORIA_MAX, mode="w+b")
+        self.mensagens = 0
+        self._pagina: list[str] = []
+
+    def escrever(self, m: discord.Message):
+        anexos = ""
+        if m.attachments:
+            anexos = " | Anexos: " + ", ".join([a.url for a in m.attachments])
+        conteudo = m.content if m.content else ""
+        if m.embeds:
+            conteudo += f" | (embeds: {len(m.embeds)})"
+        self._pagina.append(
+            f"[{m.created_at.strftime('%d/%m %H:%M')}] {m.author} ({m.author.id}): {conteudo}{anexos}\n"
+        )
+        self.mensagens += 1
+
+    def flush_pagina(self):
+        # ✅ Codifica uma vez por página e escreve direto no buffer
+        if self._pagina:
+            self.buffer.write("".join(self._pagina).encode("utf-8"))
+            self._pagina.clear()
+
+    def escrever_pagina(self, mensagens: list):
+        # Roda fora do loop (to_thread): render, escape e escrita da página inteira
+        for m in mensagens:
+            self.escrever(m)
+        self.flush_pagina()
+
+    def finalizar(self):
+        self.flush_pagina()
+        if not self.mensagens:
+            self.buffer.write("Sem mensagens no ticket.".encode("utf-8"))
+
+    def extras(self, nome_base: str) -> list[tuple]:
+        return []
+
+# ---- HTML: fragmentos de template, renderizados mensagem a mensagem ----
+_HTML_INICIO = """<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>{titulo}</title>
+<style>
+body{{background:#313338;color:#dbdee1;font:15px/1.4 "gg sans","Segoe UI",Arial,sans-serif;margin:0;padding:24px}}
+h1{{color:#fff;font-size:20px;margin:0 0 16px}}
+.msg{{display:flex;gap:12px;padding:6px 0;border-top:1px solid #3f4147}}
+.autor{{color:#fff;font-weight:600}}.id,.data{{color:#949ba4;font-size:12px}}
+.conteudo{{white-space:pre-wrap;word-wrap:break-word}}
+.mencao{{background:#5865f24d;color:#c9cdfb;border-radius:3px;padding:0 2px}}
+.embed{{border-left:4px solid #1e1f22;background:#2b2d31;border-radius:4px;padding:8px 12px;margin:4px 0;max-width:520px}}
+.embed .titulo{{color:#fff;font-weight:600}}.embed .campo{{margin-top:4px}}.embed .nome{{font-weight:600;color:#fff}}
+.anexo a{{color:#00a8fc}}.rodape{{color:#949ba4;margin-top:24px;font-size:12px}}
+</style></head><body><h1>{titulo}</h1>
+"""
+_HTML_MENSAGEM = (
+    '<div class="msg" id="m{id}"><div><span class="autor">{autor}</span> '
+    '<span class="id">({autor_id})</span> <time class="data" datetime="{iso}">{data}</time>'
+    '<div class="conteudo">{conteudo}</div>{embeds}{anexos}</div></div>\n'
+)
+_HTML_EMBED = '<div class="embed" style="border-left-color:{cor}">{titulo}{descricao}{campos}{imagem}</div>'
+_HTML_CAMPO = '<div class="campo"><div class="nome">{nome}</div><div class="conteudo">{valor}</div></div>'
+_HTML_ANEXO = '<div class="anexo">📎 <a href="{url}">{nome}</a> <span class="id">({tamanho})</span></div>'
+_HTML_FIM = '<div class="rodape">{total} mensagens • gerado por New Republic BOT</div></body></html>\n'
+
+_RE_MENCAO = re.compile(r"<(@!?|@&|#)(\d+)>|<t:(\d+)(?::[tTdDfFR])?>")
+
+def _tamanho_legivel(n: int) -> str:
+    for unidade in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unidade}" if unidade == "B" else f"{n:.1f} {unidade}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+@lru_cache(maxsize=1024)
+def _html_timestamp(unix: int) -> str:
+    quando = datetime.fromtimestamp(unix, tz=timezone.utc)
+    return f'<time datetime="{quando.isoformat()}">{quando.strftime("%d/%m/%Y %H:%M")}</time>'
+
+class HtmlTranscriptWriter(TranscriptWriter):
+    extensao = "html"
+
+    def __init__(self, titulo: str):
+        super().__init__()
+        self.buffer.write(_HTML_INICIO.format(titulo=html.escape(titulo)).encode("utf-8"))
+        # Manifesto de anexos: também em streaming, num buffer próprio (JSON)
+        self.manifesto = tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_MEMORIA_MAX, mode="w+b")
+        self.manifesto.write(b"[")
+        self.anexos = 0
+
+    def _texto(self, texto: str, m) -> str:
+        if not texto:
+            return ""
+        nomes: dict[str, str] = {}
+        for u in getattr(m, "mentions", ()):
+            nomes[f"@{u.id}"] = "@" + getattr(u, "display_name", str(u))
+        for r in getattr(m, "role_mentions", ()):
+            nomes[f"@&{r.id}"] = "@" + r.name
+        for c in getattr(m, "channel_mentions", ()):
+            nomes[f"#{c.id}"] = "#" + c.name
+
+        partes = []
+        pos = 0
+        for match in _RE_MENCAO.finditer(texto):
+            partes.append(html.escape(texto[pos:match.start()]))
+            pos = match.end()
+            if match.group(3):
+                partes.append(_html_timestamp(int(match.group(3))))
+                continue
+            tipo = match.group(1).replace("!", "")
+            alvo = nomes.get(f"{tipo}{match.group(2)}", f"{tipo}{match.group(2)}")
+            partes.append(f'<span class="mencao">{html.escape(alvo)}</span>')
+        partes.append(html.escape(texto[pos:]))
+        return "".join(partes)
+
+    def _embed(self, e: discord.Embed, m) -> str:
+        cor = f"#{e.colour.value:06x}" if e.colour else "#1e1f22"
+        titulo = f'<div class="titulo">{self._texto(e.title or "", m)}</div>' if e.title else ""
+        descricao = f'<div class="conteudo">{self._texto(e.description or "", m)}</div>' if e.description else ""
+        campos = "".join(
+            _HTML_CAMPO.format(nome=self._texto(f.name or "", m), valor=self._texto(f.value or "", m))
+            for f in e.fields
+        )
+        url_imagem = e.image.url if e.image else None
+        imagem = f'<div class="anexo"><a href="{html.escape(url_imagem)}">🖼️ imagem</a></div>' if url_imagem else ""
+        return _HTML_EMBED.format(cor=cor, titulo=titulo, descricao=descricao, campos=campos, imagem=imagem)
+
+    def escrever(self, m: discord.Message):
+        anexos = []
+        for a in m.attachments:
+            anexos.append(_HTML_ANEXO.format(
+                url=html.escape(a.url), nome=html.escape(a.filename), tamanho=_tamanho_legivel(a.size)
+            ))
+            registro = {
+                "mensagem_id": m.id, "autor_id": m.author.id, "arquivo": a.filename,
+                "url": a.url, "tamanho": a.size, "tipo": a.content_type,
+            }
+            self.manifesto.write((("," if self.anexos else "") + "\n" + json.dumps(registro, ensure_ascii=False)).encode("utf-8"))
+            self.anexos += 1
+
+        self._pagina.append(_HTML_MENSAGEM.format(
+            id=m.id,
+            autor=html.escape(str(m.author)),
+            autor_id=m.author.id,
+            iso=m.created_at.isoformat(),
+            data=m.created_at.strftime("%d/%m/%Y %H:%M"),
+            conteudo=self._texto(m.content, m),
+            embeds="".join(self._embed(e, m) for e in m.embeds),
+            anexos="".join(anexos),
+        ))
+        self.mensagens += 1
+
+    def finalizar(self):
+        self.flush_pagina()
+        if not self.mensagens:
+            self.buffer.write('<div class="msg">Sem mensagens no ticket.</div>\n'.encode("utf-8"))
+        self.buffer.write(_HTML_FIM.format(total=self.mensagens).encode("utf-8"))
+        self.manifesto.write(b"\n]\n")
+
+    def extras(self, nome_base: str) -> list[tuple]:
+        if not self.anexos:
+            _fechar_buffer(self.manifesto)
+            return []
+        return [(self.manifesto, f"{nome_base}-anexos.json")]
+
+def novo_transcript_writer(canal: discord.TextChannel) -> TranscriptWriter:
+    if TRANSCRIPT_FORMATO == "html":
+        return HtmlTranscriptWriter(titulo=f"Transcript • #{canal.name}")
+    return TranscriptWriter()
+
+def _gzip_buffer(origem) -> tempfile.SpooledTemporaryFile:
+    destino = tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_MEMORIA_MAX, mode="w+b")
+    origem.seek(0)
+    with gzip.GzipFile(fileobj=destino, mode="wb") as gz:
+        shutil.copyfileobj(origem, gz, 64 * 1024)
+    return destino
+
+async def gerar_transcript(canal: discord.TextChannel, writer: Optional[TranscriptWriter] = None) -> Transcript:
+    writer = writer or novo_transcript_writer(canal)
+    # No loop só a leitura do histórico; o writer só é tocado por uma thread de cada vez
+    pagina: list[discord.Message] = []
+    async for m in canal.history(limit=None, oldest_first=True):
+        pagina.append(m)
+        if len(pagina) >= 100:  # mesmo tamanho das páginas da API
+            await asyncio.to_thread(writer.escrever_pagina, pagina)
+            pagina = []
+    await asyncio.to_thread(writer.escrever_pagina, pagina)
+    await asyncio.to_thread(writer.finalizar)
+
+    buffer = writer.buffer
+    tamanho = buffer.tell()
+    filename = f"{canal.name}.{writer.extensao}"
+
+    if TRANSCRIPT_GZIP_ACIMA_DE and tamanho > TRANSCRIPT_GZIP_ACIMA_DE:
+        try:
+            gz = await asyncio.to_thread(_gzip_buffer, buffer)
+        except Exception:
+            logger.exception("Falha ao compactar transcript; enviando sem gzip.")
+        else:
+            buffer.close()
+            buffer = gz
+            tamanho = gz.tell()
+            filename += ".gz"
+
+    return Transcript(buffer, filename, tamanho, writer.mensagens, extras=writer.extras(canal.name))
+
+# =========================================================
+# THROTTLE: limite de cliques por (usuário, ação)
+# =========================================================
+def _regras_throttle() -> dict[str, tuple[float, float]]:
+    regras = dict(THROTTLE_PADRAO)
+    for acao in regras:
+        env = os.getenv(f"NR_THROTTLE_{acao.upper()}")
+        if not env:
+            continue
+        try:
+            taxa, rajada = (float(x) for x in env.split(","))
+            regras[acao] = (taxa, rajada)
+        except ValueError:
+            logger.warning("Throttle: valor inválido em NR_THROTTLE_%s: %r", acao.upper(), env)
+    return regras
+
+class Throttle:
+    # Tudo em memória: a recusa não toca disco nem REST. Buckets em ordem de uso
+    # (LRU) e limitados a max_buckets, mesmo com enxurrada de chaves distintas
+    def __init__(self, regras: dict[str, tuple[float, float]], max_buckets: int = 20000):
+        self.regras = regras
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[tuple[int, int, str], TokenBucket] = OrderedDict()
+        self.recusas = 0
+
+    def espera(self, guild_id: int, user_id: int, acao: str) -> float:
+        # 0 = liberado (e já consome); > 0 = segundos até poder de novo
+        regra = self.regras.get(acao)
+        if regra is None:
+            return 0.0
+        chave = (guild_id, user_id, acao)
+        bucket = self._buckets.get(chave)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._podar()
+            bucket = self._buckets[chave] = TokenBucket(*regra)
+        else:
+            self._buckets.move_to_end(chave)
+        if bucket.consumir():
+            return 0.0
+        self.recusas += 1
+        return bucket.espera()
+
+    def _podar(self):
+        # bucket cheio de novo = igual a um novo, pode sair
+        for chave in [k for k, b in self._buckets.items() if b.espera(b.capacidade) == 0]:
+            del self._buckets[chave]
+        # ainda cheio (muitas chaves ativas): sai o uso mais antigo, com folga de 10%
+        # pra não varrer tudo de novo a cada chave nova
+        while len(self._buckets) > self.max_buckets * 0.9:
+            self._buckets.popitem(last=False)
+
+THROTTLE = Throttle(_regras_throttle())
+
+async def recusar_se_limitado(interaction: discord.Interaction, acao: str) -> bool:
+    # Antes do defer a recusa vai como resposta efêmera direta; depois, por followup
+    if is_staff(interaction.user):
+        return False
+    espera = THROTTLE.espera(interaction.guild_id, interaction.user.id, acao)
+    if espera <= 0:
+        return False
+    aviso = f"⏳ Muitas tentativas seguidas. Tente de novo em **{max(1, round(espera))}s**."
+    if interaction.response.is_done():
+        await interaction.followup.send(aviso, ephemeral=True)
+    else:
+        await interaction.response.send_message(aviso, ephemeral=True)
+    return True
+
 # =========================================================
 # VIEW: REGISTRO (MELHORADO, MENOS VAZIO)
 # =========================================================
@@ -206,11 +2523,14 @@ class VerificarView(discord.ui.View):
         super().__init__(timeout=None)
 
     @discord.ui.button(label="Registrar-se", emoji="✅", style=discord.ButtonStyle.green, custom_id="nr_registrar")
+    @instrumentado
     async def registrar(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if await recusar_se_limitado(interaction, "verificar"):
+            return
         await interaction.response.defer(ephemeral=True)
 
-        cargo_visitante = discord.utils.get(interaction.guild.roles, name=CARGO_VISITANTE)
-        cargo_membro = discord.utils.get(interaction.guild.roles, name=CARGO_MEMBRO)
+        cargo_visitante = get_config_role(interaction.guild, "CARGO_VISITANTE")
+        cargo_membro = get_config_role(interaction.guild, "CARGO_MEMBRO")
 
         if not cargo_membro:
             await interaction.followup.send("❌ Cargo de membro não encontrado.", ephemeral=True)
@@ -255,23 +2575,34 @@ class TicketSelect(discord.ui.Select):
             max_values=1
         )
 
+    @instrumentado
     async def callback(self, interaction: discord.Interaction):
-        await interaction.response.defer(ephemeral=True)
+        # ✅ Reset do Select na própria resposta da interação (sem edit extra no painel),
+        # em todo caminho, inclusive recusa; o resto sai por followup efêmero
+        await interaction.response.edit_message(view=self.view)
+        if await recusar_se_limitado(interaction, "ticket_abrir"):
+            return
+        if TICKETS_POR_USUARIO and not is_staff(interaction.user) \
+                and STATE.tickets_abertos(interaction.guild.id, interaction.user.id) >= TICKETS_POR_USUARIO:
+            await interaction.followup.send(
+                f"⚠️ Você já tem **{TICKETS_POR_USUARIO}** ticket(s) aberto(s). Feche um antes de abrir outro.",
+                ephemeral=True
+            )
+            return
 
         guild = interaction.guild
         user = interaction.user
         tipo = self.values[0]
 
-        categoria = discord.utils.get(guild.categories, name=CATEGORIA_TICKET)
+        categoria = get_config_category(guild, "CATEGORIA_TICKET")
         if not categoria:
             try:
-                categoria = await guild.create_category(CATEGORIA_TICKET)
+                categoria = await guild.create_category(config_da_guild(guild).nome("CATEGORIA_TICKET"))
             except discord.Forbidden:
                 await interaction.followup.send("❌ Sem permissão para criar categoria.", ephemeral=True)
                 return
 
-        staff = discord.utils.get(guild.roles, name=CARGO_STAFF)
-        ticket_id = gerar_ticket_numero()
+        staff = get_config_role(guild, "CARGO_STAFF")
 
         overwrites = {
             guild.default_role: discord.PermissionOverwrite(view_channel=False),
@@ -281,15 +2612,23 @@ class TicketSelect(discord.ui.Select):
             overwrites[staff] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
 
         tipo_slug = _slug_channel_name(tipo)
-        canal_nome = f"{tipo_slug}-{ticket_id:03d}"
+        ticket_id = 0
 
+        async def gerar_nome() -> str:
+            nonlocal ticket_id
+            ticket_id = await gerar_ticket_numero(guild.id)
+            return f"{tipo_slug}-{ticket_id:03d}"
+
+        # ✅ Pool primeiro; sem canal pronto, a criação passa pela fila
         try:
-            canal = await guild.create_text_channel(name=canal_nome, category=categoria, overwrites=overwrites)
+            canal = await obter_canal(interaction, "ticket", "CATEGORIA_TICKET", categoria, overwrites, gerar_nome, "ticket")
         except discord.Forbidden:
             await interaction.followup.send("❌ Sem permissão para criar canal.", ephemeral=True)
             return
+        if canal is None:
+            return
 
-        set_ticket_data(canal.id, user.id, tipo, ticket_id)
+        set_ticket_data(canal.id, guild.id, user.id, tipo, ticket_id)
 
         embed = discord.Embed(title=f"🎫 Ticket #{ticket_id}", color=CINZA)
         embed.add_field(name="Usuário", value=user.mention, inline=True)
@@ -301,34 +2640,25 @@ class TicketSelect(discord.ui.Select):
         await canal.send(embed=embed, view=TicketControls())
 
         # ✅ Envia log de criação
-        log = await ensure_log_channel(guild)
-        if log:
-            try:
-                e = discord.Embed(title="🆕 Ticket Criado", color=AZUL)
-                e.add_field(name="Canal", value=canal.mention, inline=False)
-                e.add_field(name="Autor", value=user.mention, inline=True)
-                e.add_field(name="Tipo", value=tipo, inline=True)
-                e.add_field(name="Ticket #", value=str(ticket_id), inline=True)
-                e.set_thumbnail(url=LOGO)
-                await log.send(embed=e)
-            except Exception:
-                pass
+        e = discord.Embed(title="🆕 Ticket Criado", color=AZUL)
+        e.add_field(name="Canal", value=canal.mention, inline=False)
+        e.add_field(name="Autor", value=user.mention, inline=True)
+        e.add_field(name="Tipo", value=tipo, inline=True)
+        e.add_field(name="Ticket #", value=str(ticket_id), inline=True)
+        e.set_thumbnail(url=LOGO)
+        LOGS.enviar(guild, embed=e)
 
         await interaction.followup.send(f"✅ Ticket criado: {canal.mention}", ephemeral=True)
 
-        # ✅ Reset do Select
-        try:
-            if interaction.message:
-                await interaction.message.edit(view=TicketPanel())
-        except Exception:
-            pass
-
 class TicketControls(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
 
     @discord.ui.button(label="Assumir Ticket", style=discord.ButtonStyle.blurple, emoji="👮", custom_id="nr_ticket_assumir")
+    @instrumentado
     async def assumir(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if await recusar_se_limitado(interaction, "ticket_controle"):
+            return
         await interaction.response.defer(ephemeral=True)
 
         if not is_staff(interaction.user):
@@ -343,6 +2673,10 @@ class TicketControls(discord.ui.View):
         if info.get("assumido_por"):
             await interaction.followup.send("⚠️ Esse ticket já foi assumido.", ephemeral=True)
             return
+        # ✅ Quem grava primeiro no estado compartilhado leva (vale entre processos)
+        if not await ESTADO.adquirir(f"ticket_assumido:{interaction.channel.id}", str(interaction.user.id)):
+            await interaction.followup.send("⚠️ Esse ticket já foi assumido.", ephemeral=True)
+            return
 
         update_ticket_data(interaction.channel.id, assumido_por=interaction.user.id)
 
@@ -369,22 +2703,20 @@ class TicketControls(discord.ui.View):
             await interaction.message.edit(embed=embed, view=self)
 
         # ✅ Log
-        log = await ensure_log_channel(interaction.guild)
-        if log:
-            try:
-                e = discord.Embed(title="👮 Ticket Assumido", color=VERDE)
-                e.add_field(name="Canal", value=interaction.channel.mention, inline=False)
-                e.add_field(name="Staff", value=interaction.user.mention, inline=True)
-                e.add_field(name="Tipo", value=info.get("tipo", "-"), inline=True)
-                e.set_thumbnail(url=LOGO)
-                await log.send(embed=e)
-            except Exception:
-                pass
+        e = discord.Embed(title="👮 Ticket Assumido", color=VERDE)
+        e.add_field(name="Canal", value=interaction.channel.mention, inline=False)
+        e.add_field(name="Staff", value=interaction.user.mention, inline=True)
+        e.add_field(name="Tipo", value=info.get("tipo", "-"), inline=True)
+        e.set_thumbnail(url=LOGO)
+        LOGS.enviar(interaction.guild, embed=e)
 
         await interaction.followup.send("✅ Ticket assumido.", ephemeral=True)
 
     @discord.ui.button(label="Fechar Ticket", style=discord.ButtonStyle.red, emoji="🔒", custom_id="nr_ticket_fechar")
+    @instrumentado
     async def fechar(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if await recusar_se_limitado(interaction, "ticket_controle"):
+            return
         info = get_ticket_data(interaction.channel.id)
         if not info:
             await interaction.response.send_message("❌ Ticket inválido.", ephemeral=True)
@@ -409,6 +2741,7 @@ class TicketControls(discord.ui.View):
                 )
                 self.add_item(self.motivo)
 
+            @instrumentado
             async def on_submit(self, modal_interaction: discord.Interaction):
                 await modal_interaction.response.defer(ephemeral=True)
 
@@ -416,23 +2749,8 @@ class TicketControls(discord.ui.View):
                 guild = modal_interaction.guild
                 autor = guild.get_member(autor_id)
 
-                linhas = []
-                async for m in canal.history(limit=None, oldest_first=True):
-                    anexos = ""
-                    if m.attachments:
-                        anexos = " | Anexos: " + ", ".join([a.url for a in m.attachments])
-                    conteudo = m.content if m.content else ""
-                    if m.embeds:
-                        conteudo += f" | (embeds: {len(m.embeds)})"
-                    linhas.append(
-                        f"[{m.created_at.strftime('%d/%m %H:%M')}] {m.author} ({m.author.id}): {conteudo}{anexos}"
-                    )
-
-                transcript = "\n".join(linhas) if linhas else "Sem mensagens no ticket."
-                file_log = discord.File(
-                    io.BytesIO(transcript.encode("utf-8")),
-                    filename=f"{canal.name}.txt"
-                )
+                with medir("transcript"):
+                    transcript = await gerar_transcript(canal)
 
                 e = discord.Embed(title="🔒 Ticket Fechado", color=VERMELHO)
                 e.add_field(name="Canal", value=f"#{canal.name}", inline=False)
@@ -441,123 +2759,402 @@ class TicketControls(discord.ui.View):
                 e.add_field(name="Motivo", value=self.motivo.value, inline=False)
                 e.set_thumbnail(url=LOGO)
 
-                log = await ensure_log_channel(guild)
-                if log:
-                    try:
-                        await log.send(embed=e, file=file_log)
-                    except Exception:
-                        try:
-                            await log.send(embed=e)
-                        except Exception:
-                            pass
-
                 dm_ok = False
-                if autor:
-                    try:
-                        dm_file = discord.File(
-                            io.BytesIO(transcript.encode("utf-8")),
-                            filename=f"{canal.name}.txt"
-                        )
+                try:
+                    if not await LOGS.enviar_e_aguardar(guild, embed=e, files=transcript.arquivos()):
+                        LOGS.enviar(guild, embed=e)
 
-                        dm_embed = discord.Embed(
-                            title="📩 Seu ticket foi encerrado",
-                            description=(
-                                f"**Servidor:** {guild.name}\n"
-                                f"**Ticket:** `#{canal.name}`\n"
-                                f"**Fechado por:** {modal_interaction.user}\n\n"
-                                f"**Motivo:**\n{self.motivo.value}"
-                            ),
-                            color=ROXO
-                        )
-                        dm_embed.set_thumbnail(url=LOGO)
-                        dm_embed.set_footer(text="New Republic Roleplay • Suporte")
+                    if autor:
+                        try:
+                            dm_file = transcript.arquivo()
+
+                            dm_embed = discord.Embed(
+                                title="📩 Seu ticket foi encerrado",
+                                description=(
+                                    f"**Servidor:** {guild.name}\n"
+                                    f"**Ticket:** `#{canal.name}`\n"
+                                    f"**Fechado por:** {modal_interaction.user}\n\n"
+                                    f"**Motivo:**\n{self.motivo.value}"
+                                ),
+                                color=ROXO
+                            )
+                            dm_embed.set_thumbnail(url=LOGO)
+                            dm_embed.set_footer(text="New Republic Roleplay • Suporte")
+
+                            await autor.send(embed=dm_embed, file=dm_file)
+                            dm_ok = True
+                        except discord.Forbidden:
+                            dm_ok = False
+                        except Exception:
+                            dm_ok = False
+                finally:
+                    transcript.close()
 
-                        await autor.send(embed=dm_embed, file=dm_file)
-                        dm_ok = True
-                    except discord.Forbidden:
-                        dm_ok = False
-                    except Exception:
-                        dm_ok = False
-
-                if log and not dm_ok:
-                    try:
-                        await log.send(f"⚠️ Não consegui enviar DM para o autor do ticket. Autor ID: `{autor_id}`")
-                    except Exception:
-                        pass
+                if not dm_ok:
+                    LOGS.enviar(guild, content=f"⚠️ Não consegui enviar DM para o autor do ticket. Autor ID: `{autor_id}`")
 
                 delete_ticket_data(canal.id)
                 await modal_interaction.followup.send("🔒 Ticket encerrado.", ephemeral=True)
-                await asyncio.sleep(2)
-                await canal.delete(reason="Ticket encerrado")
+                agendar_apagar_canal(canal, 2, "Ticket encerrado")
 
         await interaction.response.send_modal(MotivoModal())
 
 # =========================================================
-# WL: LOCK (anti dupla execução)
+# WL: ÍNDICE DE WLs ATIVAS (user -> canal)
 # =========================================================
-ACTIVE_WL: set[int] = set()
+class WLAtiva:
+    __slots__ = ("guild_id", "user_id", "channel_id", "status", "iniciado_em")
 
+    def __init__(self, guild_id: int, user_id: int, channel_id: Optional[int], status: str, iniciado_em: float):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.status = status  # criando | aberta | respondendo | enviada | encerrada
+        self.iniciado_em = iniciado_em
+
+class WLAtivasIndex:
+    # Checagem de WL duplicada em O(1) pelo id do usuário (nome de canal muda
+    # e colide). Fica na memória + SQLite, é conferido com a categoria no
+    # start e limpo quando o canal é apagado. Entre processos vale a trava
+    # "wl_ativa:<guild>:<user>" no estado compartilhado.
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+        self._por_usuario: dict[tuple[int, int], WLAtiva] = {}
+        self._por_canal: dict[int, WLAtiva] = {}
+        self._gravacoes: set[asyncio.Task] = set()
+
+    async def carregar(self):
+        def fn(conn: sqlite3.Connection):
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS wl_ativas (
+                    guild_id    INTEGER NOT NULL,
+                    user_id     INTEGER NOT NULL,
+                    channel_id  INTEGER NOT NULL UNIQUE,
+                    status      TEXT    NOT NULL,
+                    iniciado_em REAL    NOT NULL,
+                    PRIMARY KEY (guild_id, user_id)
+                )
+                """
+            )
+            return conn.execute("SELECT * FROM wl_ativas").fetchall()
+        for r in await self.db.run(fn):
+            if guild_local(r["guild_id"]):
+                self._indexar(WLAtiva(r["guild_id"], r["user_id"], r["channel_id"], r["status"], r["iniciado_em"]))
+
+    async def parar(self):
+        if self._gravacoes:
+            await asyncio.gather(*self._gravacoes, return_exceptions=True)
+
+    def __len__(self) -> int:
+        return len(self._por_canal)
+
+    def get(self, guild_id: int, user_id: int) -> Optional[WLAtiva]:
+        return self._por_usuario.get((guild_id, user_id))
+
+    def do_canal(self, channel_id: int) -> Optional[WLAtiva]:
+        return self._por_canal.get(channel_id)
+
+    def reservar(self, guild_id: int, user_id: int) -> Optional[WLAtiva]:
+        # Síncrono: dois cliques seguidos não passam os dois (sem await no meio)
+        atual = self._por_usuario.get((guild_id, user_id))
+        if atual is not None:
+            return atual
+        self._por_usuario[(guild_id, user_id)] = WLAtiva(guild_id, user_id, None, "criando", time.time())
+        return None
+
+    async def reservar_global(self, guild_id: int, user_id: int) -> bool:
+        # Depois do reservar(): outro processo pode estar criando a WL desse usuário
+        return await ESTADO.adquirir(f"wl_ativa:{guild_id}:{user_id}", PROCESSO_ID, TRAVA_WL_TTL)
+
+    def liberar(self, guild_id: int, user_id: int):
+        atual = self._por_usuario.get((guild_id, user_id))
+        if atual is not None and atual.channel_id is None:
+            del self._por_usuario[(guild_id, user_id)]
+            criar_tarefa(ESTADO.liberar(f"wl_ativa:{guild_id}:{user_id}", PROCESSO_ID))
+
+    def confirmar(self, guild_id: int, user_id: int, channel_id: int):
+        a = WLAtiva(guild_id, user_id, channel_id, "aberta", time.time())
+        self._indexar(a)
+        self._salvar(a)
+
+    def marcar(self, channel_id: int, status: str):
+        a = self._por_canal.get(channel_id)
+        if a is not None and a.status != status:
+            a.status = status
+            self._salvar(a)
+
+    def canal_removido(self, channel_id: int):
+        a = self._por_canal.pop(channel_id, None)
+        if a is None:
+            return
+        if self._por_usuario.get((a.guild_id, a.user_id)) is a:
+            del self._por_usuario[(a.guild_id, a.user_id)]
+            criar_tarefa(ESTADO.delete(f"wl_ativa:{a.guild_id}:{a.user_id}"))
+        self._gravar(lambda conn: conn.execute("DELETE FROM wl_ativas WHERE channel_id = ?", (channel_id,)))
+
+    def reconstruir(self, guild: discord.Guild):
+        # Confere o índice com a categoria (uma passada, só no start/join)
+        for a in [a for a in self._por_canal.values() if a.guild_id == guild.id]:
+            if guild.get_channel(a.channel_id) is None:
+                self.canal_removido(a.channel_id)
+
+        categoria = get_config_category(guild, "CATEGORIA_WL")
+        if categoria is None:
+            return
+        for c in categoria.text_channels:
+            if c.id in self._por_canal or c.name.startswith(POOL_PREFIXO):
+                continue
+            dono = next((alvo.id for alvo in c.overwrites if not isinstance(alvo, discord.Role)), None)
+            if dono is None or (guild.id, dono) in self._por_usuario:
+                continue
+            status = "respondendo" if WL.ativa(c.id) else "aberta"
+            a = WLAtiva(guild.id, dono, c.id, status, c.created_at.timestamp())
+            self._indexar(a)
+            self._salvar(a)
+        criar_tarefa(self._sincronizar_travas(guild.id))
+
+    async def _sincronizar_travas(self, guild_id: int):
+        # Este processo é o dono da guild: trava sem WL no índice some
+        # (processo que caiu no meio da criação), WL sem trava ganha a sua
+        prefixo = f"wl_ativa:{guild_id}:"
+        travas = await ESTADO.itens(prefixo)
+        for chave in travas:
+            if (guild_id, int(chave[len(prefixo):])) not in self._por_usuario:
+                await ESTADO.delete(chave)
+        for gid, uid in [k for k in self._por_usuario if k[0] == guild_id]:
+            if f"{prefixo}{uid}" not in travas:
+                await ESTADO.set(f"{prefixo}{uid}", PROCESSO_ID, TRAVA_WL_TTL)
+
+    def _indexar(self, a: WLAtiva):
+        self._por_usuario[(a.guild_id, a.user_id)] = a
+        if a.channel_id is not None:
+            self._por_canal[a.channel_id] = a
+
+    def _salvar(self, a: WLAtiva):
+        linha = (a.guild_id, a.user_id, a.channel_id, a.status, a.iniciado_em)
+        self._gravar(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO wl_ativas (guild_id, user_id, channel_id, status, iniciado_em) VALUES (?, ?, ?, ?, ?)",
+            linha
+        ))
+
+    def _gravar(self, fn):
+        task = asyncio.create_task(self.db.run(fn))
+        self._gravacoes.add(task)
+        task.add_done_callback(self._gravacoes.discard)
+
+WL_ATIVAS = WLAtivasIndex(DB)
+
+# =========================================================
+# WL: ENCERRAR + CONTROLES DO CANDIDATO
+# =========================================================
 async def encerrar_wl_channel(channel: discord.TextChannel, motivo: str, delete_after: int = 20):
     try:
         await channel.send(f"🔒 **WL encerrada.** Motivo: {motivo}\n🧹 Apagando em **{delete_after}s**.")
     except Exception:
         pass
-    await asyncio.sleep(delete_after)
-    try:
-        await channel.delete(reason=f"WL encerrada: {motivo}")
-    except Exception:
-        pass
+    agendar_apagar_canal(channel, delete_after, f"WL encerrada: {motivo}")
 
 class WLUserControlsView(discord.ui.View):
-    def __init__(self, user_id: int):
+    # Persistente: o dono da WL vem da sessão do canal, então sobrevive a restart
+    def __init__(self, user_id: Optional[int] = None):
         super().__init__(timeout=None)
         self.user_id = user_id
 
     @discord.ui.button(label="Cancelar WL", emoji="🛑", style=discord.ButtonStyle.danger, custom_id="nr_wl_cancelar")
     async def cancelar(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.user_id and not is_staff(interaction.user):
-            await interaction.response.send_message("❌ Você não pode cancelar a WL de outra pessoa.", ephemeral=True)
-            return
-        await interaction.response.send_message("✅ WL cancelada. Fechando canal...", ephemeral=True)
-        await encerrar_wl_channel(interaction.channel, "WL cancelada pelo usuário.")
+        await cancelar_wl(interaction, self.user_id)
+
+@instrumentado
+async def cancelar_wl(interaction: discord.Interaction, user_id: Optional[int] = None):
+    sessao = WL.sessoes.get(interaction.channel.id)
+    dono = sessao.user_id if sessao else user_id
+    if interaction.user.id != dono and not is_staff(interaction.user):
+        await interaction.response.send_message("❌ Você não pode cancelar a WL de outra pessoa.", ephemeral=True)
+        return
+    await interaction.response.send_message("✅ WL cancelada. Fechando canal...", ephemeral=True)
+    await WL.cancelar(interaction.channel, "WL cancelada pelo usuário.")
 
 # =========================================================
 # WL: STAFF REVIEW
 # =========================================================
-class WLStaffReviewView(discord.ui.View):
-    def __init__(self, user_id: int, cidade_id: str, personagem: str):
-        super().__init__(timeout=None)
+class WLReview:
+    __slots__ = ("message_id", "guild_id", "user_id", "cidade_id", "personagem", "status", "motivo", "publicada")
+
+    def __init__(self, message_id: int, guild_id: int, user_id: int, cidade_id: str, personagem: str,
+                 status: str = "PENDENTE", motivo: Optional[str] = None, publicada: bool = False):
+        self.message_id = message_id
+        self.guild_id = guild_id
         self.user_id = user_id
         self.cidade_id = cidade_id
         self.personagem = personagem
-        self.status = "PENDENTE"
-        self.motivo: Optional[str] = None
+        self.status = status
+        self.motivo = motivo
+        self.publicada = publicada
+
+class WLReviewStore:
+    # Revisões da staff por id da mensagem em #respostas-wl: os botões
+    # funcionam depois de restart e nenhuma View fica viva por revisão
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    async def abrir(self):
+        await self.db.run(lambda conn: conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS wl_reviews (
+                message_id INTEGER PRIMARY KEY,
+                guild_id   INTEGER NOT NULL,
+                user_id    INTEGER NOT NULL,
+                cidade_id  TEXT    NOT NULL,
+                personagem TEXT    NOT NULL,
+                status     TEXT    NOT NULL,
+                motivo     TEXT,
+                publicada  INTEGER NOT NULL DEFAULT 0,
+                criado_em  REAL    NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS wl_reviews_fila ON wl_reviews (guild_id, publicada, status);
+            """
+        ))
+
+    @staticmethod
+    def _review(r: sqlite3.Row) -> WLReview:
+        return WLReview(r["message_id"], r["guild_id"], r["user_id"], r["cidade_id"], r["personagem"],
+                        r["status"], r["motivo"], bool(r["publicada"]))
+
+    async def criar(self, rv: WLReview):
+        row = (rv.message_id, rv.guild_id, rv.user_id, rv.cidade_id, rv.personagem, rv.status, rv.motivo,
+               int(rv.publicada), time.time())
+        await self.db.run(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO wl_reviews "
+            "(message_id, guild_id, user_id, cidade_id, personagem, status, motivo, publicada, criado_em) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            row
+        ))
+
+    async def get(self, message_id: int) -> Optional[WLReview]:
+        def fn(conn: sqlite3.Connection):
+            r = conn.execute("SELECT * FROM wl_reviews WHERE message_id = ?", (message_id,)).fetchone()
+            return self._review(r) if r else None
+        return await self.db.run(fn)
+
+    async def marcar(self, message_id: int, status: str, motivo: Optional[str] = None) -> bool:
+        # só muda enquanto não foi publicada
+        def fn(conn: sqlite3.Connection):
+            cur = conn.execute(
+                "UPDATE wl_reviews SET status = ?, motivo = ? WHERE message_id = ? AND publicada = 0",
+                (status, motivo, message_id)
+            )
+            return cur.rowcount > 0
+        return await self.db.run(fn)
+
+    async def publicar(self, message_id: int, status: str) -> bool:
+        # UPDATE condicional: só um clique (ou processo) ganha a publicação
+        def fn(conn: sqlite3.Connection):
+            cur = conn.execute(
+                "UPDATE wl_reviews SET publicada = 1 WHERE message_id = ? AND status = ? AND publicada = 0",
+                (message_id, status)
+            )
+            return cur.rowcount > 0
+        return await self.db.run(fn)
+
+    async def pendentes(self, guild_id: int, limite: int, offset: int = 0) -> tuple[list[WLReview], int]:
+        def fn(conn: sqlite3.Connection):
+            total = conn.execute(
+                "SELECT COUNT(*) FROM wl_reviews WHERE guild_id = ? AND publicada = 0", (guild_id,)
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT * FROM wl_reviews WHERE guild_id = ? AND publicada = 0 ORDER BY criado_em LIMIT ? OFFSET ?",
+                (guild_id, limite, offset)
+            ).fetchall()
+            return [self._review(r) for r in rows], total
+        return await self.db.run(fn)
+
+    async def publicar_lote(self, message_ids: list[int], status: str, motivo: Optional[str]) -> list[WLReview]:
+        # marca e publica de uma vez; devolve só as que ainda não tinham sido publicadas
+        def tx(conn: sqlite3.Connection):
+            ganhas = []
+            for mid in message_ids:
+                r = conn.execute("SELECT * FROM wl_reviews WHERE message_id = ? AND publicada = 0", (mid,)).fetchone()
+                if r is None:
+                    continue
+                conn.execute(
+                    "UPDATE wl_reviews SET status = ?, motivo = ?, publicada = 1 WHERE message_id = ?",
+                    (status, motivo, mid)
+                )
+                rv = self._review(r)
+                rv.status, rv.motivo, rv.publicada = status, motivo, True
+                ganhas.append(rv)
+            return ganhas
+        return await self.db.run(lambda conn: _sqlite_tx(conn, tx))
+
+    async def despublicar(self, message_ids: list[int]):
+        # ganhas no lote mas não anunciadas: voltam pra fila
+        await self.db.run(lambda conn: conn.executemany(
+            "UPDATE wl_reviews SET publicada = 0 WHERE message_id = ?", [(mid,) for mid in message_ids]
+        ))
+
+REVIEWS = WLReviewStore(DB)
+
+_RE_REVIEW_CAMPOS = {
+    "user_id": re.compile(r"\*\*Discord ID:\*\* `(\d+)`"),
+    "cidade_id": re.compile(r"\*\*ID:\*\* `([^`]*)`"),
+    "personagem": re.compile(r"\*\*Personagem:\*\* `([^`]*)`"),
+}
+
+async def carregar_review(message: discord.Message) -> Optional[WLReview]:
+    rv = await REVIEWS.get(message.id)
+    if rv is not None or not message.embeds:
+        return rv
+    # mensagem de antes do registro existir: reconstrói pelo embed
+    desc = message.embeds[0].description or ""
+    achados = {k: r.search(desc) for k, r in _RE_REVIEW_CAMPOS.items()}
+    if not all(achados.values()):
+        return None
+    rv = WLReview(message.id, message.guild.id, int(achados["user_id"].group(1)),
+                  achados["cidade_id"].group(1), achados["personagem"].group(1))
+    await REVIEWS.criar(rv)
+    return rv
+
+class WLStaffReviewView(discord.ui.View):
+    # Uma instância persistente (registrada no setup_hook) atende todas as
+    # revisões: o estado vem do REVIEWS pelo id da mensagem clicada.
+    # layout() monta só os botões (parada, pra não ficar guardada no view store).
+    def __init__(self):
+        super().__init__(timeout=None)
+
+    @classmethod
+    def layout(cls, rv: Optional[WLReview] = None) -> "WLStaffReviewView":
+        view = cls()
+        status = rv.status if rv else "PENDENTE"
+        for item in view.children:
+            if rv is not None and rv.publicada:
+                item.disabled = True
+            elif item.custom_id == "nr_wl_publicar_aprovada":
+                item.disabled = (status != "APROVADA")
+            elif item.custom_id == "nr_wl_publicar_reprovada":
+                item.disabled = (status != "REPROVADA")
+        view.stop()
+        return view
 
     def _ensure_staff(self, interaction: discord.Interaction) -> bool:
         return is_staff(interaction.user)
 
-    def _toggle_buttons(self):
-        for item in self.children:
-            if isinstance(item, discord.ui.Button):
-                if item.custom_id == "nr_wl_publicar_aprovada":
-                    item.disabled = (self.status != "APROVADA")
-                if item.custom_id == "nr_wl_publicar_reprovada":
-                    item.disabled = (self.status != "REPROVADA")
-
-    def _set_status_line(self, embed: discord.Embed):
+    @staticmethod
+    def _set_status_line(rv: WLReview, embed: discord.Embed):
         desc = embed.description or ""
         lines = desc.split("\n")
         if not lines:
             return
-        if self.status == "PENDENTE":
+        if rv.status == "PENDENTE":
             lines[0] = "**Status:** 🟣 PENDENTE"
-        elif self.status == "APROVADA":
+        elif rv.status == "APROVADA":
             lines[0] = "**Status:** 🟢 APROVADA (aguardando lançamento)"
         else:
             lines[0] = "**Status:** 🔴 REPROVADA (aguardando lançamento)"
         embed.description = "\n".join(lines)
 
-    def _public_embed(self, final: str) -> discord.Embed:
+    @staticmethod
+    def _public_embed(rv: WLReview, final: str) -> discord.Embed:
         if final == "APROVADA":
             status_txt = "✅ APROVADA"
             color = VERDE
@@ -569,28 +3166,29 @@ class WLStaffReviewView(discord.ui.View):
             title="📌 Resultado da Whitelist",
             description=(
                 f"**Status:** {status_txt}\n"
-                f"**Personagem:** `{self.personagem}`\n"
-                f"**ID Cidade:** `{self.cidade_id}`\n"
-                f"**Discord ID:** `{self.user_id}`"
+                f"**Personagem:** `{rv.personagem}`\n"
+                f"**ID Cidade:** `{rv.cidade_id}`\n"
+                f"**Discord ID:** `{rv.user_id}`"
             ),
             color=color
         )
-        if final == "REPROVADA" and self.motivo:
-            e.add_field(name="Motivo", value=self.motivo[:1024], inline=False)
+        if final == "REPROVADA" and rv.motivo:
+            e.add_field(name="Motivo", value=rv.motivo[:1024], inline=False)
         e.set_thumbnail(url=LOGO)
         return e
 
-    async def _apply_cidadao_and_nick(self, guild: discord.Guild) -> tuple[bool, str]:
-        membro = guild.get_member(self.user_id)
+    @staticmethod
+    async def _apply_cidadao_and_nick(rv: WLReview, guild: discord.Guild) -> tuple[bool, str]:
+        membro = guild.get_member(rv.user_id)
         if membro is None:
             try:
-                membro = await guild.fetch_member(self.user_id)
+                membro = await guild.fetch_member(rv.user_id)
             except Exception:
                 return (False, "Não consegui encontrar o membro no servidor.")
 
-        cargo = discord.utils.get(guild.roles, name=CARGO_CIDADAO)
+        cargo = get_config_role(guild, "CARGO_CIDADAO")
         if cargo is None:
-            return (False, f"Cargo **{CARGO_CIDADAO}** não encontrado.")
+            return (False, f"Cargo **{config_da_guild(guild).nome('CARGO_CIDADAO')}** não encontrado.")
 
         try:
             await membro.add_roles(cargo, reason="WL aprovada")
@@ -600,7 +3198,7 @@ class WLStaffReviewView(discord.ui.View):
             return (False, f"Erro ao setar cargo: {repr(e)}")
 
         try:
-            await membro.edit(nick=f"{self.personagem} - {self.cidade_id}", reason="WL aprovada")
+            await membro.edit(nick=f"{rv.personagem} - {rv.cidade_id}", reason="WL aprovada")
         except discord.Forbidden:
             return (True, "Cargo setado ✅ | Nick não alterado (sem permissão).")
         except Exception:
@@ -608,20 +3206,34 @@ class WLStaffReviewView(discord.ui.View):
 
         return (True, "Cargo setado ✅ | Nick alterado ✅")
 
+    async def _review_ou_aviso(self, interaction: discord.Interaction) -> Optional[WLReview]:
+        rv = await carregar_review(interaction.message)
+        if rv is None:
+            await interaction.followup.send("⚠️ Registro dessa WL não encontrado.", ephemeral=True)
+        elif rv.publicada:
+            await interaction.followup.send("⚠️ Essa WL já foi publicada.", ephemeral=True)
+            return None
+        return rv
+
     @discord.ui.button(label="Marcar Aprovada", emoji="✅", style=discord.ButtonStyle.green, custom_id="nr_wl_marcar_aprovada")
+    @instrumentado
     async def marcar_aprovada(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
         if not self._ensure_staff(interaction):
             await interaction.followup.send("❌ Apenas staff.", ephemeral=True)
             return
-        self.status = "APROVADA"
-        self._toggle_buttons()
+        rv = await self._review_ou_aviso(interaction)
+        if rv is None:
+            return
+        rv.status, rv.motivo = "APROVADA", None
+        await REVIEWS.marcar(rv.message_id, rv.status)
         embed = interaction.message.embeds[0]
-        self._set_status_line(embed)
-        await interaction.message.edit(embed=embed, view=self)
+        self._set_status_line(rv, embed)
+        await interaction.message.edit(embed=embed, view=self.layout(rv))
         await interaction.followup.send("✅ Marcada como APROVADA. Publique depois de aprovar na cidade.", ephemeral=True)
 
     @discord.ui.button(label="Marcar Reprovada", emoji="❌", style=discord.ButtonStyle.red, custom_id="nr_wl_marcar_reprovada")
+    @instrumentado
     async def marcar_reprovada(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not self._ensure_staff(interaction):
             await interaction.response.send_message("❌ Apenas staff.", ephemeral=True)
@@ -639,286 +3251,1047 @@ class WLStaffReviewView(discord.ui.View):
                 )
                 self.add_item(self.motivo)
 
+            @instrumentado
             async def on_submit(self, modal_interaction: discord.Interaction):
                 await modal_interaction.response.defer(ephemeral=True)
-                self.parent.status = "REPROVADA"
-                self.parent.motivo = self.motivo.value
-                self.parent._toggle_buttons()
+                rv = await self.parent._review_ou_aviso(modal_interaction)
+                if rv is None:
+                    return
+                rv.status, rv.motivo = "REPROVADA", self.motivo.value
+                await REVIEWS.marcar(rv.message_id, rv.status, rv.motivo)
 
                 embed = modal_interaction.message.embeds[0]
-                self.parent._set_status_line(embed)
+                self.parent._set_status_line(rv, embed)
 
                 found = False
                 for i, f in enumerate(embed.fields):
                     if f.name == "Motivo (Staff)":
-                        embed.set_field_at(i, name="Motivo (Staff)", value=self.parent.motivo[:1024], inline=False)
+                        embed.set_field_at(i, name="Motivo (Staff)", value=rv.motivo[:1024], inline=False)
                         found = True
                         break
                 if not found:
-                    embed.add_field(name="Motivo (Staff)", value=self.parent.motivo[:1024], inline=False)
+                    embed.add_field(name="Motivo (Staff)", value=rv.motivo[:1024], inline=False)
 
-                await modal_interaction.message.edit(embed=embed, view=self.parent)
+                await modal_interaction.message.edit(embed=embed, view=self.parent.layout(rv))
                 await modal_interaction.followup.send("✅ Marcada como REPROVADA. Agora publique.", ephemeral=True)
 
         await interaction.response.send_modal(MotivoModal(self))
 
     @discord.ui.button(label="Publicar ✅", emoji="🚀", style=discord.ButtonStyle.blurple, custom_id="nr_wl_publicar_aprovada", disabled=True)
+    @instrumentado
     async def publicar_aprovada(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
         if not self._ensure_staff(interaction):
             await interaction.followup.send("❌ Apenas staff.", ephemeral=True)
             return
-        if self.status != "APROVADA":
+        rv = await self._review_ou_aviso(interaction)
+        if rv is None:
+            return
+        if rv.status != "APROVADA":
             await interaction.followup.send("⚠️ Marque como APROVADA primeiro.", ephemeral=True)
             return
 
         ch = get_wl_aprovadas_channel(interaction.guild)
         if not ch:
-            await interaction.followup.send(f"❌ Crie o canal #{CANAL_WL_APROVADAS}.", ephemeral=True)
+            await interaction.followup.send(f"❌ Crie o canal #{config_da_guild(interaction.guild).nome('CANAL_WL_APROVADAS')}.", ephemeral=True)
+            return
+        if not await REVIEWS.publicar(rv.message_id, "APROVADA"):
+            await interaction.followup.send("⚠️ Essa WL já foi publicada.", ephemeral=True)
             return
+        rv.publicada = True
 
-        await ch.send(embed=self._public_embed("APROVADA"))
-        ok, msg = await self._apply_cidadao_and_nick(interaction.guild)
+        await ch.send(embed=self._public_embed(rv, "APROVADA"))
+        ok, msg = await self._apply_cidadao_and_nick(rv, interaction.guild)
 
-        for item in self.children:
-            item.disabled = True
-        await interaction.message.edit(view=self)
+        await interaction.message.edit(view=self.layout(rv))
 
         await interaction.followup.send(f"✅ Publicado em aprovadas.\n{msg}", ephemeral=True)
 
     @discord.ui.button(label="Publicar ❌", emoji="🚫", style=discord.ButtonStyle.secondary, custom_id="nr_wl_publicar_reprovada", disabled=True)
+    @instrumentado
     async def publicar_reprovada(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
         if not self._ensure_staff(interaction):
             await interaction.followup.send("❌ Apenas staff.", ephemeral=True)
             return
-        if self.status != "REPROVADA":
+        rv = await self._review_ou_aviso(interaction)
+        if rv is None:
+            return
+        if rv.status != "REPROVADA":
             await interaction.followup.send("⚠️ Marque como REPROVADA primeiro.", ephemeral=True)
             return
 
         ch = get_wl_reprovadas_channel(interaction.guild)
         if not ch:
-            await interaction.followup.send(f"❌ Crie o canal #{CANAL_WL_REPROVADAS}.", ephemeral=True)
+            await interaction.followup.send(f"❌ Crie o canal #{config_da_guild(interaction.guild).nome('CANAL_WL_REPROVADAS')}.", ephemeral=True)
+            return
+        if not await REVIEWS.publicar(rv.message_id, "REPROVADA"):
+            await interaction.followup.send("⚠️ Essa WL já foi publicada.", ephemeral=True)
             return
+        rv.publicada = True
 
-        await ch.send(embed=self._public_embed("REPROVADA"))
+        await ch.send(embed=self._public_embed(rv, "REPROVADA"))
 
-        for item in self.children:
-            item.disabled = True
-        await interaction.message.edit(view=self)
+        await interaction.message.edit(view=self.layout(rv))
 
         await interaction.followup.send("✅ Publicado em reprovadas.", ephemeral=True)
 
 # =========================================================
-# WL FLOW: SUAS 11 PERGUNTAS
+# WL: FILA DA STAFF (revisão em lote)
 # =========================================================
-async def run_wl_flow_in_channel(bot: commands.Bot, channel: discord.TextChannel, user: discord.Member):
-    if channel.id in ACTIVE_WL:
+WL_FILA_PAGINA = 25  # limite de opções de um Select
+
+def _embeds_resultado_lote(status: str, reviews: list[WLReview], motivo: Optional[str]) -> list[discord.Embed]:
+    # um embed por até 10 resultados (em vez de um embed por WL)
+    aprovada = status == "APROVADA"
+    embeds = []
+    for i in range(0, len(reviews), 10):
+        parte = reviews[i:i + 10]
+        e = discord.Embed(
+            title=f"📌 Resultado da Whitelist — {'✅ APROVADAS' if aprovada else '❌ REPROVADAS'}",
+            description="\n".join(
+                f"**{rv.personagem}** • ID Cidade `{rv.cidade_id}` • <@{rv.user_id}>" for rv in parte
+            ),
+            color=VERDE if aprovada else VERMELHO
+        )
+        if not aprovada and motivo:
+            e.add_field(name="Motivo", value=motivo[:1024], inline=False)
+        e.set_thumbnail(url=LOGO)
+        embeds.append(e)
+    return embeds
+
+class ProgressoLote:
+    # Atualiza a resposta efêmera no máximo a cada 2s
+    def __init__(self, interaction: discord.Interaction, titulo: str, total: int):
+        self.interaction = interaction
+        self.titulo = titulo
+        self.total = total
+        self.feitos = 0
+        self._ultimo = 0.0
+
+    async def passo(self):
+        self.feitos += 1
+        agora = time.monotonic()
+        if self.feitos < self.total and agora - self._ultimo < 2.0:
+            return
+        self._ultimo = agora
+        with suppress(discord.HTTPException):
+            await self.interaction.edit_original_response(content=f"⏳ {self.titulo}: **{self.feitos}/{self.total}**")
+
+async def _membros_do_lote(guild: discord.Guild, user_ids: list[int]) -> dict[int, discord.Member]:
+    membros = {uid: m for uid in user_ids if (m := guild.get_member(uid)) is not None}
+    faltando = [uid for uid in user_ids if uid not in membros]
+    # fora do cache: uma consulta pelo gateway a cada 100, em vez de um fetch_member por pessoa
+    for i in range(0, len(faltando), 100):
+        try:
+            for m in await guild.query_members(user_ids=faltando[i:i + 100], limit=100):
+                membros[m.id] = m
+        except Exception:
+            pass
+    return membros
+
+async def aplicar_aprovacoes(guild: discord.Guild, reviews: list[WLReview], progresso: ProgressoLote) -> list[str]:
+    cargo = get_config_role(guild, "CARGO_CIDADAO")
+    if cargo is None:
+        return [f"Cargo **{config_da_guild(guild).nome('CARGO_CIDADAO')}** não encontrado."]
+    membros = await _membros_do_lote(guild, [rv.user_id for rv in reviews])
+    staff_channel = get_wl_staff_channel(guild)
+    sem = asyncio.Semaphore(WL_LOTE_CONCORRENCIA)
+    erros: list[str] = []
+
+    async def aplicar(rv: WLReview):
+        async with sem:
+            try:
+                membro = membros.get(rv.user_id)
+                if membro is None:
+                    erros.append(f"<@{rv.user_id}>: não está no servidor.")
+                    return
+                # membro.roles vem do cache mantido pelo gateway (intent de membros)
+                roles = [r for r in membro.roles if not r.is_default()]
+                if cargo not in roles:
+                    roles.append(cargo)
+                nick = f"{rv.personagem} - {rv.cidade_id}"[:32]
+                try:
+                    # cargo + nick numa chamada só
+                    await membro.edit(roles=roles, nick=nick, reason="WL aprovada")
+                except discord.Forbidden:
+                    try:
+                        await membro.edit(roles=roles, reason="WL aprovada")
+                        erros.append(f"<@{rv.user_id}>: cargo setado, nick não (sem permissão).")
+                    except discord.HTTPException:
+                        erros.append(f"<@{rv.user_id}>: sem permissão para setar cargo.")
+                except discord.HTTPException as e:
+                    erros.append(f"<@{rv.user_id}>: erro ao setar cargo/nick ({e.status}).")
+                await _desativar_review(staff_channel, rv)
+            finally:
+                await progresso.passo()
+
+    await asyncio.gather(*(aplicar(rv) for rv in reviews))
+    return erros
+
+async def _desativar_review(staff_channel: Optional[discord.TextChannel], rv: WLReview):
+    if staff_channel is None:
+        return
+    with suppress(discord.HTTPException):
+        await staff_channel.get_partial_message(rv.message_id).edit(view=WLStaffReviewView.layout(rv))
+
+async def processar_lote(interaction: discord.Interaction, message_ids: list[int], status: str, motivo: Optional[str] = None):
+    guild = interaction.guild
+    destino = get_wl_aprovadas_channel(guild) if status == "APROVADA" else get_wl_reprovadas_channel(guild)
+    if destino is None:
+        chave = "CANAL_WL_APROVADAS" if status == "APROVADA" else "CANAL_WL_REPROVADAS"
+        await interaction.edit_original_response(content=f"❌ Crie o canal #{config_da_guild(guild).nome(chave)}.", embed=None, view=None)
         return
-    ACTIVE_WL.add(channel.id)
 
-    def check(m: discord.Message):
-        return m.author.id == user.id and m.channel.id == channel.id
+    reviews = await REVIEWS.publicar_lote(message_ids, status, motivo)
+    if not reviews:
+        await interaction.edit_original_response(content="⚠️ Nenhuma das selecionadas estava pendente.", embed=None, view=None)
+        return
 
-    answers: dict[str, str] = {}
-    last_question_msg: Optional[discord.Message] = None
+    ganhas = len(reviews)
+    embeds = _embeds_resultado_lote(status, reviews, motivo)
+    anunciadas, falha = 0, None
+    for i in range(0, len(embeds), 10):
+        try:
+            await destino.send(embeds=embeds[i:i + 10])
+        except Exception as e:
+            falha = e
+            break
+        # cada embed leva até 10 WLs
+        anunciadas = min(ganhas, (i + 10) * 10)
+    if falha is not None:
+        await REVIEWS.despublicar([rv.message_id for rv in reviews[anunciadas:]])
+        reviews = reviews[:anunciadas]
+        logger.warning("Falha publicando lote de WL em #%s: %r", destino.name, falha)
+        if not reviews:
+            await interaction.edit_original_response(
+                content=f"❌ Não consegui publicar em {destino.mention}. As WLs continuam na fila.", embed=None, view=None
+            )
+            return
 
-    async def send_question_embed(title: str, desc: str):
-        nonlocal last_question_msg
-        if last_question_msg:
-            try:
-                await last_question_msg.delete()
-            except Exception:
-                pass
+    progresso = ProgressoLote(interaction, "Aplicando cargo e nick" if status == "APROVADA" else "Atualizando revisões", len(reviews))
+    if status == "APROVADA":
+        erros = await aplicar_aprovacoes(guild, reviews, progresso)
+    else:
+        erros = []
+        staff_channel = get_wl_staff_channel(guild)
+        sem = asyncio.Semaphore(WL_LOTE_CONCORRENCIA)
+
+        async def desativar(rv: WLReview):
+            async with sem:
+                await _desativar_review(staff_channel, rv)
+                await progresso.passo()
+        await asyncio.gather(*(desativar(rv) for rv in reviews))
+
+    resumo = discord.Embed(
+        title="✅ Lote publicado",
+        description=f"**{len(reviews)}** WL(s) {'aprovada(s)' if status == 'APROVADA' else 'reprovada(s)'} em {destino.mention}.",
+        color=VERDE if status == "APROVADA" else VERMELHO
+    )
+    if ganhas < len(message_ids):
+        resumo.add_field(name="Ignoradas", value=f"{len(message_ids) - ganhas} já tinham sido publicadas.", inline=False)
+    if falha is not None:
+        resumo.add_field(name="Não publicadas", value=f"{ganhas - len(reviews)} voltaram pra fila (falha ao enviar em {destino.mention}).", inline=False)
+    if erros:
+        resumo.add_field(name="Avisos", value="\n".join(erros)[:1024], inline=False)
+    await interaction.edit_original_response(content=None, embed=resumo, view=None)
+
+    log = discord.Embed(
+        title="📝 WL em lote",
+        description=f"**Staff:** {interaction.user.mention}\n**Resultado:** {status}\n**Quantidade:** {len(reviews)}",
+        color=ROXO
+    )
+    LOGS.enviar(guild, embed=log)
+
+async def pagina_fila(guild: discord.Guild, pagina: int) -> tuple[discord.Embed, Optional["WLFilaView"]]:
+    reviews, total = await REVIEWS.pendentes(guild.id, WL_FILA_PAGINA, pagina * WL_FILA_PAGINA)
+    paginas = max(1, -(-total // WL_FILA_PAGINA))
+    embed = discord.Embed(title="📋 Fila de WL", color=ROXO)
+    if not reviews:
+        embed.description = "✅ Nenhuma WL pendente."
+        return embed, None
+    embed.description = "\n".join(
+        f"{'🟢' if rv.status == 'APROVADA' else '🔴' if rv.status == 'REPROVADA' else '🟣'} "
+        f"**{rv.personagem}** • ID `{rv.cidade_id}` • <@{rv.user_id}>"
+        for rv in reviews
+    )[:4096]
+    embed.set_footer(text=f"Página {pagina + 1}/{paginas} • {total} pendente(s)")
+    return embed, WLFilaView(pagina, paginas, reviews)
+
+class WLFilaView(discord.ui.View):
+    def __init__(self, pagina: int, paginas: int, reviews: list[WLReview]):
+        super().__init__(timeout=600)
+        self.pagina = pagina
+        self.selecionadas: list[int] = []
+
+        self.escolha = discord.ui.Select(
+            placeholder="Selecione as WLs…",
+            min_values=1,
+            max_values=len(reviews),
+            options=[
+                discord.SelectOption(
+                    label=f"{rv.personagem} • ID {rv.cidade_id}"[:100],
+                    description=f"Discord {rv.user_id}",
+                    value=str(rv.message_id)
+                )
+                for rv in reviews
+            ],
+            row=0
+        )
+        self.escolha.callback = self.selecionar
+        self.add_item(self.escolha)
+        self.anterior.disabled = pagina <= 0
+        self.proxima.disabled = pagina >= paginas - 1
+
+    @instrumentado
+    async def selecionar(self, interaction: discord.Interaction):
+        self.selecionadas = [int(v) for v in self.escolha.values]
+        await interaction.response.defer()
+
+    async def _checar(self, interaction: discord.Interaction) -> bool:
+        if not is_staff(interaction.user):
+            await interaction.response.send_message("❌ Apenas staff.", ephemeral=True)
+            return False
+        if not self.selecionadas:
+            await interaction.response.send_message("⚠️ Selecione pelo menos uma WL.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="Aprovar selecionadas", emoji="✅", style=discord.ButtonStyle.green, row=1)
+    @instrumentado
+    async def aprovar(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if not await self._checar(interaction):
+            return
+        self.stop()
+        await interaction.response.edit_message(content=f"⏳ Publicando {len(self.selecionadas)} aprovação(ões)…", embed=None, view=None)
+        await processar_lote(interaction, self.selecionadas, "APROVADA")
+
+    @discord.ui.button(label="Reprovar selecionadas", emoji="❌", style=discord.ButtonStyle.red, row=1)
+    @instrumentado
+    async def reprovar(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if not await self._checar(interaction):
+            return
+        selecionadas = self.selecionadas
+        parent = self
+
+        class MotivoModal(discord.ui.Modal, title="Reprovar WLs selecionadas"):
+            motivo = discord.ui.TextInput(
+                label="Motivo (vale para todas)",
+                style=discord.TextStyle.paragraph,
+                max_length=300,
+                required=True
+            )
+
+            @instrumentado
+            async def on_submit(self, modal_interaction: discord.Interaction):
+                parent.stop()
+                await modal_interaction.response.edit_message(
+                    content=f"⏳ Publicando {len(selecionadas)} reprovação(ões)…", embed=None, view=None
+                )
+                await processar_lote(modal_interaction, selecionadas, "REPROVADA", self.motivo.value)
+
+        await interaction.response.send_modal(MotivoModal())
 
-        e = discord.Embed(title=title, description=desc, color=ROXO)
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary, row=1)
+    @instrumentado
+    async def anterior(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._ir(interaction, self.pagina - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary, row=1)
+    @instrumentado
+    async def proxima(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._ir(interaction, self.pagina + 1)
+
+    async def _ir(self, interaction: discord.Interaction, pagina: int):
+        self.stop()
+        embed, view = await pagina_fila(interaction.guild, max(0, pagina))
+        await interaction.response.edit_message(embed=embed, view=view)
+
+# =========================================================
+# WL FLOW: SUAS 11 PERGUNTAS
+# =========================================================
+# As perguntas vêm de wl_perguntas.json (trocar perguntas não precisa de deploy).
+# O arquivo é compilado uma vez no start: regex, faixas, embeds e campos do
+# embed da staff ficam prontos; o fluxo só percorre a tupla.
+WL_PERGUNTAS_FILE = Path(os.getenv("NR_WL_PERGUNTAS_FILE", str(Path(__file__).resolve().with_name("wl_perguntas.json"))))
+WL_LETRAS = ("A", "B", "C", "D")
+
+class PerguntaWL:
+    __slots__ = ("chave", "tipo", "texto", "opcoes", "tempo", "regex", "faixa",
+                 "min_caracteres", "max_caracteres", "erro", "embed", "longa", "rotulo")
+
+    def __init__(self, data: dict, tempo_padrao: int = TEMPO_WL_POR_PERGUNTA):
+        self.chave = str(data["chave"])
+        self.tipo = data.get("tipo", "texto")
+        if self.tipo not in ("texto", "mc"):
+            raise ValueError(f"pergunta {self.chave!r}: tipo inválido {self.tipo!r}")
+        self.texto = str(data["texto"])
+        self.opcoes = tuple(str(o) for o in data.get("opcoes") or ())
+        if self.tipo == "mc" and not 2 <= len(self.opcoes) <= len(WL_LETRAS):
+            raise ValueError(f"pergunta {self.chave!r}: marcação precisa de 2 a {len(WL_LETRAS)} opções")
+        self.tempo = int(data.get("tempo") or tempo_padrao)
+        self.longa = bool(data.get("longa", False))
+        # label de modal/select tem limite de 45 caracteres
+        self.rotulo = self.texto if len(self.texto) <= 45 else self.chave[:45]
+
+        v = data.get("validacao") or {}
+        self.regex = re.compile(v["regex"]) if v.get("regex") else None
+        self.faixa = tuple(v["numero"]) if v.get("numero") else None
+        self.min_caracteres = int(v.get("min_caracteres") or 0)
+        self.max_caracteres = int(v.get("max_caracteres") or 0)
+        self.erro = v.get("erro")
+        self.embed = self._montar_embed()
+
+    def _montar_embed(self) -> discord.Embed:
+        if self.tipo == "mc":
+            letras = WL_LETRAS[:len(self.opcoes)]
+            desc = "\n".join([f"**{letras[i]})** {self.opcoes[i]}" for i in range(len(self.opcoes))])
+            e = discord.Embed(
+                title="✅ Pergunta de Marcação",
+                description=(
+                    f"**{self.texto}**\n\n{desc}\n\nResponda com: **{', '.join(letras[:-1])} ou {letras[-1]}**\n"
+                    f"⏳ Você tem **{self.tempo // 60} minutos**."
+                ),
+                color=ROXO
+            )
+        else:
+            e = discord.Embed(
+                title="📝 Whitelist — New Republic",
+                description=f"**Pergunta:**\n{self.texto}\n\n⏳ Você tem **{self.tempo // 60} minutos**.",
+                color=ROXO
+            )
         e.set_thumbnail(url=LOGO)
         e.set_footer(text="New Republic Roleplay • WL")
-        last_question_msg = await channel.send(embed=e, view=WLUserControlsView(user_id=user.id))
+        return e
 
-    async def ask(question: str) -> Optional[str]:
-        await send_question_embed(
-            "📝 Whitelist — New Republic",
-            f"**Pergunta:**\n{question}\n\n⏳ Você tem **{TEMPO_WL_POR_PERGUNTA // 60} minutos**."
-        )
-        try:
-            msg = await bot.wait_for("message", check=check, timeout=TEMPO_WL_POR_PERGUNTA)
-            txt = (msg.content or "").strip()
+    def validar(self, conteudo: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+        # (resposta normalizada, None) ou (None, motivo)
+        txt = (conteudo or "").strip()
+        if self.tipo == "mc":
+            ans = txt.upper()
+            if ans in WL_LETRAS[:len(self.opcoes)]:
+                return f"{ans}) {self.opcoes[WL_LETRAS.index(ans)]}", None
+            return None, f"responda só com a letra ({', '.join(WL_LETRAS[:len(self.opcoes)])})."
+        if not txt:
+            return None, "resposta vazia."
+        if self.regex is not None and not self.regex.fullmatch(txt):
+            return None, self.erro or "formato inválido."
+        if self.faixa is not None:
             try:
-                await msg.delete()
-            except Exception:
-                pass
-            return txt if txt else None
-        except asyncio.TimeoutError:
-            return None
-
-    async def ask_mc(title: str, options: list[str]) -> Optional[str]:
-        letters = ["A", "B", "C", "D"]
-        desc = "\n".join([f"**{letters[i]})** {options[i]}" for i in range(len(options))])
-
-        await send_question_embed(
-            "✅ Pergunta de Marcação",
-            f"**{title}**\n\n{desc}\n\nResponda com: **A, B, C ou D**\n"
-            f"⏳ Você tem **{TEMPO_WL_POR_PERGUNTA // 60} minutos**."
+                n = int(txt)
+            except ValueError:
+                return None, self.erro or "informe um número."
+            if not self.faixa[0] <= n <= self.faixa[1]:
+                return None, f"deve estar entre {self.faixa[0]} e {self.faixa[1]}."
+        if len(txt) < self.min_caracteres:
+            return None, self.erro or f"mínimo de {self.min_caracteres} caracteres."
+        if self.max_caracteres and len(txt) > self.max_caracteres:
+            return None, self.erro or f"máximo de {self.max_caracteres} caracteres."
+        return txt, None
+
+class EtapaWL:
+    # Modo formulário: perguntas abertas seguidas viram uma página de modal
+    # (até 5 campos); marcações seguidas viram selects numa mensagem (até 4)
+    __slots__ = ("numero", "inicio", "perguntas", "tipo", "tempo", "embed", "total", "prefixo")
+
+    def __init__(self, numero: int, inicio: int, perguntas: tuple[PerguntaWL, ...], total: int, prefixo: str):
+        self.numero = numero
+        self.inicio = inicio
+        self.perguntas = perguntas
+        self.total = total
+        self.prefixo = prefixo  # custom_id dos componentes da etapa
+        self.tipo = "select" if perguntas[0].tipo == "mc" else "modal"
+        self.tempo = sum(p.tempo for p in perguntas)
+
+        if self.tipo == "modal":
+            desc = "\n".join(f"• {p.texto}" for p in perguntas)
+            acao = "Clique em **Responder** para abrir o formulário."
+        else:
+            desc = "\n\n".join(
+                f"**{p.texto}**\n" + "\n".join(f"**{WL_LETRAS[i]})** {op}" for i, op in enumerate(p.opcoes))
+                for p in perguntas
+            )
+            acao = "Escolha as respostas nos menus e clique em **Confirmar**."
+        e = discord.Embed(
+            title=f"📝 Whitelist — Etapa {numero + 1}/{total}",
+            description=f"{desc}\n\n{acao}\n⏳ Você tem **{self.tempo // 60} minutos** para esta etapa.",
+            color=ROXO
         )
-        try:
-            msg = await bot.wait_for("message", check=check, timeout=TEMPO_WL_POR_PERGUNTA)
-            ans = (msg.content or "").strip().upper()
+        e.set_thumbnail(url=LOGO)
+        e.set_footer(text="New Republic Roleplay • WL")
+        self.embed = e
+
+def _agrupar_etapas(perguntas: tuple[PerguntaWL, ...], prefixo: str) -> tuple[EtapaWL, ...]:
+    grupos: list[tuple[int, list[PerguntaWL]]] = []
+    for i, p in enumerate(perguntas):
+        limite = 4 if p.tipo == "mc" else 5
+        if grupos and grupos[-1][1][0].tipo == p.tipo and len(grupos[-1][1]) < limite:
+            grupos[-1][1].append(p)
+        else:
+            grupos.append((i, [p]))
+    return tuple(EtapaWL(n, inicio, tuple(ps), len(grupos), prefixo) for n, (inicio, ps) in enumerate(grupos))
+
+class Questionario:
+    def __init__(self, perguntas: tuple[PerguntaWL, ...], descricao: tuple[tuple[str, str], ...],
+                 campos: tuple[tuple[str, str, bool], ...], prefixo: str = "nr_wl_f"):
+        self.perguntas = perguntas
+        self.descricao = descricao  # (rótulo, chave) na descrição do embed da staff
+        self.campos = campos  # (nome do campo, chave, inline)
+        self.etapas = _agrupar_etapas(perguntas, prefixo)
+        # índice da pergunta -> etapa que a contém
+        self._etapa_de = tuple(e for e in self.etapas for _ in e.perguntas)
+
+    def etapa(self, indice: int) -> EtapaWL:
+        return self._etapa_de[indice]
+
+    @classmethod
+    def carregar(cls, path: Path, tempo_padrao: int = TEMPO_WL_POR_PERGUNTA, prefixo: str = "nr_wl_f") -> "Questionario":
+        data = _load_json(path, None)
+        if not data or not data.get("perguntas"):
+            raise RuntimeError(f"Questionário de WL não encontrado ou vazio: {path}")
+        perguntas = tuple(PerguntaWL(p, tempo_padrao) for p in data["perguntas"])
+        chaves = [p.chave for p in perguntas]
+        if len(set(chaves)) != len(chaves):
+            raise ValueError("Questionário de WL: chaves repetidas")
+        for obrigatoria in ("ID", "Personagem"):
+            if obrigatoria not in chaves:
+                raise ValueError(f"Questionário de WL: falta a pergunta {obrigatoria!r} (usada na revisão da staff)")
+
+        descricao, campos = [], []
+        for bruto, p in zip(data["perguntas"], perguntas):
+            embed = bruto.get("embed") or {"campo": p.chave}
+            if embed.get("descricao"):
+                descricao.append((embed["descricao"], p.chave))
+            elif embed.get("campo"):
+                campos.append((embed["campo"], p.chave, bool(embed.get("inline", False))))
+        return cls(perguntas, tuple(descricao), tuple(campos), prefixo)
+
+    def __len__(self) -> int:
+        return len(self.perguntas)
+
+    def __getitem__(self, indice: int) -> PerguntaWL:
+        return self.perguntas[indice]
+
+    def embed_staff(self, user_id: int, respostas: dict[str, str]) -> discord.Embed:
+        linhas = ["**Status:** 🟣 PENDENTE", f"**Usuário:** <@{user_id}>", f"**Discord ID:** `{user_id}`"]
+        linhas += [f"**{rotulo}:** `{respostas.get(chave, '—')}`" for rotulo, chave in self.descricao]
+        e = discord.Embed(title="📝 Whitelist Recebida", description="\n".join(linhas), color=ROXO)
+        for nome, chave, inline in self.campos:
+            e.add_field(name=nome, value=respostas.get(chave, "—")[:1024], inline=inline)
+        e.set_thumbnail(url=LOGO)
+        return e
+
+def _chave_questionario(cfg: BotConfig) -> tuple[Path, int]:
+    return (cfg.wl_perguntas or WL_PERGUNTAS_FILE, cfg.tempo_wl_por_pergunta)
+
+QUESTIONARIO = Questionario.carregar(*_chave_questionario(CONFIG))
+
+def _carregar_questionarios() -> dict[tuple[Path, int], Questionario]:
+    # Um compilado por (arquivo, tempo): guilds com a mesma config dividem.
+    # O padrão mantém os custom_ids de sempre; os outros ganham prefixo próprio
+    # pra view persistente de uma guild não responder pela etapa de outra.
+    qs = {_chave_questionario(CONFIG): QUESTIONARIO}
+    for cfg in CONFIG.guilds.values():
+        chave = _chave_questionario(cfg)
+        if chave not in qs:
+            slug = re.sub(r"[^a-z0-9]", "", chave[0].stem.lower())[:20]
+            qs[chave] = Questionario.carregar(chave[0], chave[1], prefixo=f"nr_wl_{slug}{chave[1]}_f")
+    return qs
+
+QUESTIONARIOS = _carregar_questionarios()
+
+def questionario_da_guild(guild_id: int) -> Questionario:
+    return QUESTIONARIOS[_chave_questionario(CONFIG.da_guild(guild_id))]
+
+class WLSession:
+    __slots__ = ("channel_id", "guild_id", "user_id", "indice", "respostas", "deadline", "pergunta_msg_id",
+                 "aguardando", "modo")
+
+    def __init__(self, channel_id: int, guild_id: int, user_id: int, indice: int = 0,
+                 respostas: Optional[dict] = None, deadline: float = 0.0, pergunta_msg_id: Optional[int] = None,
+                 modo: str = "mensagem"):
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.indice = indice
+        self.respostas: dict[str, str] = respostas or {}
+        self.deadline = deadline  # epoch (time.time), sobrevive a restart
+        self.pergunta_msg_id = pergunta_msg_id
+        self.aguardando = False  # só aceita resposta depois que a pergunta foi enviada
+        self.modo = modo
+
+class WLSessionStore:
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    async def abrir(self):
+        def fn(conn: sqlite3.Connection):
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS wl_sessoes (
+                    channel_id      INTEGER PRIMARY KEY,
+                    guild_id        INTEGER NOT NULL,
+                    user_id         INTEGER NOT NULL,
+                    indice          INTEGER NOT NULL,
+                    respostas       TEXT    NOT NULL,
+                    deadline        REAL    NOT NULL,
+                    pergunta_msg_id INTEGER,
+                    modo            TEXT    NOT NULL DEFAULT 'mensagem'
+                );
+                """
+            )
+            colunas = {r["name"] for r in conn.execute("PRAGMA table_info(wl_sessoes)")}
+            if "modo" not in colunas:
+                conn.execute("ALTER TABLE wl_sessoes ADD COLUMN modo TEXT NOT NULL DEFAULT 'mensagem'")
+        await self.db.run(fn)
+
+    async def carregar(self) -> list[WLSession]:
+        def fn(conn: sqlite3.Connection):
+            rows = conn.execute("SELECT * FROM wl_sessoes").fetchall()
+            return [
+                WLSession(r["channel_id"], r["guild_id"], r["user_id"], r["indice"],
+                          json.loads(r["respostas"]), r["deadline"], r["pergunta_msg_id"], r["modo"])
+                for r in rows
+            ]
+        return await self.db.run(fn)
+
+    async def salvar(self, s: WLSession):
+        row = (s.channel_id, s.guild_id, s.user_id, s.indice,
+               json.dumps(s.respostas, ensure_ascii=False), s.deadline, s.pergunta_msg_id, s.modo)
+        await self.db.run(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO wl_sessoes "
+            "(channel_id, guild_id, user_id, indice, respostas, deadline, pergunta_msg_id, modo) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            row
+        ))
+
+    async def remover(self, channel_id: int):
+        await self.db.run(lambda conn: conn.execute("DELETE FROM wl_sessoes WHERE channel_id = ?", (channel_id,)))
+
+class WLEngine:
+    # Máquina de estados da WL: nenhuma corrotina parada por candidato.
+    # Modo "mensagem": cada resposta chega pelo on_message do bot (despacho por
+    # channel_id). Modo "formulario": respostas chegam por modal/select numa
+    # mensagem só. Nos dois, o índice avança e é gravado antes do próximo passo.
+    def __init__(self, store: WLSessionStore):
+        self.store = store
+        self.sessoes: dict[int, WLSession] = {}
+        self._retomado = False
+        self._views_etapa: dict[tuple[str, int], "WLFormView"] = {}
+        self._controles: Optional[WLUserControlsView] = None
+        self._enviando: set[int] = set()
+        AGENDA.registrar("wl_prazo", self._tarefa_prazo)
+        AGENDA.registrar("wl_lembrete", self._tarefa_lembrete)
+        AGENDA.registrar("wl_reenvio", self._tarefa_reenvio)
+
+    def ativa(self, channel_id: int) -> bool:
+        return channel_id in self.sessoes
+
+    def view_etapa(self, etapa: EtapaWL) -> "WLFormView":
+        # uma view persistente por etapa, compartilhada por todas as sessões
+        chave = (etapa.prefixo, etapa.numero)
+        view = self._views_etapa.get(chave)
+        if view is None:
+            view = self._views_etapa[chave] = WLFormView(etapa)
+        return view
+
+    def controles(self) -> WLUserControlsView:
+        # uma instância só pro cartão de pergunta de todas as sessões
+        if self._controles is None:
+            self._controles = WLUserControlsView()
+        return self._controles
+
+    def registrar_views(self, client: commands.Bot):
+        client.add_view(self.controles())
+        for q in QUESTIONARIOS.values():
+            for etapa in q.etapas:
+                client.add_view(self.view_etapa(etapa))
+
+    async def carregar(self):
+        await self.store.abrir()
+        for s in await self.store.carregar():
+            if guild_local(s.guild_id):
+                self.sessoes[s.channel_id] = s
+
+    async def retomar(self, client: discord.Client):
+        # ✅ Depois de restart: quem estava no meio continua da mesma pergunta
+        if self._retomado:
+            return
+        self._retomado = True
+        for s in list(self.sessoes.values()):
+            channel = client.get_channel(s.channel_id)
+            if not isinstance(channel, discord.TextChannel):
+                await self._descartar(s)
+                continue
+            if s.indice >= len(questionario_da_guild(s.guild_id)):
+                # concluída sem chegar na staff, ou questionário encurtou entre um start
+                # e outro: o que tem já vai pra staff (antes do prazo, que não vale mais)
+                criar_tarefa(self._concluir(s, channel))
+                continue
+            if s.deadline <= time.time():
+                criar_tarefa(self._finalizar(s, channel, "Tempo esgotado ou resposta inválida."))
+                continue
+            if s.modo == "formulario":
+                # a mensagem da etapa continua lá e a view é persistente
+                continue
             try:
-                await msg.delete()
+                await channel.send("♻️ O bot foi reiniciado — sua WL continua de onde parou.")
             except Exception:
                 pass
-            if ans in letters[:len(options)]:
-                return f"{ans}) {options[letters.index(ans)]}"
-            return None
-        except asyncio.TimeoutError:
-            return None
-
-    try:
-        r = await ask("Qual seu ID?")
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+            await self._enviar_pergunta(s, channel, renovar_prazo=False)
+
+    async def iniciar(self, channel: discord.TextChannel, user: discord.abc.User) -> bool:
+        if channel.id in self.sessoes:
+            return False
+        s = WLSession(channel.id, channel.guild.id, user.id, modo="formulario" if WL_MODO == "formulario" else "mensagem")
+        self.sessoes[channel.id] = s
+        WL_ATIVAS.marcar(channel.id, "respondendo")
+        if s.modo == "formulario":
+            etapa = questionario_da_guild(s.guild_id).etapa(0)
+            msg = await channel.send(embed=etapa.embed, view=self.view_etapa(etapa))
+            s.pergunta_msg_id = msg.id
+            s.deadline = time.time() + etapa.tempo
+            self._agendar_prazo(s)
+            await self.store.salvar(s)
+        else:
+            await self._enviar_pergunta(s, channel)
+        return True
+
+    def sessao_do_dono(self, interaction: discord.Interaction, etapa: EtapaWL) -> tuple[Optional[WLSession], Optional[str]]:
+        s = self.sessoes.get(interaction.channel_id)
+        if s is None:
+            return None, "❌ Essa WL não está mais ativa."
+        if interaction.user.id != s.user_id:
+            return None, "❌ Apenas o dono da WL pode responder."
+        if s.indice != etapa.inicio:
+            return None, "⚠️ Essa etapa já foi respondida."
+        return s, None
+
+    async def responder_modal(self, interaction: discord.Interaction, etapa: EtapaWL, valores: list[str]):
+        s, aviso = self.sessao_do_dono(interaction, etapa)
+        if s is None:
+            await interaction.response.send_message(aviso, ephemeral=True)
             return
-        answers["ID"] = r
-
-        r = await ask("Qual nome e sobrenome do seu personagem?")
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+        respostas = {}
+        for pergunta, valor in zip(etapa.perguntas, valores):
+            resposta, erro = pergunta.validar(valor)
+            if not resposta:
+                # no formulário corrigir não custa nada: a etapa continua aberta
+                await interaction.response.send_message(
+                    f"❌ **{pergunta.chave}**: {erro}\nClique em **Responder** e envie de novo.", ephemeral=True
+                )
+                return
+            respostas[pergunta.chave] = resposta
+        s.respostas.update(respostas)
+        await self._avancar_formulario(s, etapa, interaction)
+
+    async def escolher(self, interaction: discord.Interaction, etapa: EtapaWL, pergunta: PerguntaWL, letra: str):
+        s, aviso = self.sessao_do_dono(interaction, etapa)
+        if s is None:
+            await interaction.response.send_message(aviso, ephemeral=True)
             return
-        answers["Personagem"] = r
-
-        r = await ask("Qual idade do seu personagem?")
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+        resposta, _ = pergunta.validar(letra)
+        if resposta:
+            s.respostas[pergunta.chave] = resposta
+        await interaction.response.defer()
+        await self.store.salvar(s)
+
+    async def confirmar(self, interaction: discord.Interaction, etapa: EtapaWL):
+        s, aviso = self.sessao_do_dono(interaction, etapa)
+        if s is None:
+            await interaction.response.send_message(aviso, ephemeral=True)
             return
-        answers["Idade Personagem"] = r
-
-        r = await ask("Qual sua idade real?")
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+        faltando = [p.chave for p in etapa.perguntas if p.chave not in s.respostas]
+        if faltando:
+            await interaction.response.send_message(f"⚠️ Falta responder: **{', '.join(faltando)}**.", ephemeral=True)
             return
-        answers["Idade Real"] = r
-
-        r = await ask("Para você o que é Hard Roleplay?")
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+        await self._avancar_formulario(s, etapa, interaction)
+
+    async def _avancar_formulario(self, s: WLSession, etapa: EtapaWL, interaction: discord.Interaction):
+        # A própria resposta da interação edita a mensagem: nenhuma chamada extra no canal
+        q = questionario_da_guild(s.guild_id)
+        s.indice = etapa.inicio + len(etapa.perguntas)
+        if s.indice >= len(q):
+            await interaction.response.edit_message(
+                embed=discord.Embed(title="✅ Respostas enviadas", description="Aguarde a análise da staff.", color=ROXO),
+                view=None
+            )
+            await self._concluir(s, interaction.channel)
             return
-        answers["Hard Roleplay"] = r
+        proxima = q.etapa(s.indice)
+        s.deadline = time.time() + proxima.tempo
+        self._agendar_prazo(s)
+        await interaction.response.edit_message(embed=proxima.embed, view=self.view_etapa(proxima))
+        await self.store.salvar(s)
+
+    async def cancelar(self, channel: discord.TextChannel, motivo: str):
+        s = self.sessoes.get(channel.id)
+        if s is not None:
+            await self._descartar(s)
+        WL_ATIVAS.marcar(channel.id, "encerrada")
+        await encerrar_wl_channel(channel, motivo)
+
+    async def canal_removido(self, channel_id: int):
+        s = self.sessoes.get(channel_id)
+        if s is not None:
+            await self._descartar(s)
+
+    async def on_message(self, message: discord.Message):
+        s = self.sessoes.get(message.channel.id)
+        if s is None or message.author.id != s.user_id or not s.aguardando:
+            return
+        s.aguardando = False
+        channel = message.channel
+        q = questionario_da_guild(s.guild_id)
+        pergunta = q[s.indice]
+        resposta, erro = pergunta.validar(message.content)
+        try:
+            await message.delete()
+        except Exception:
+            pass
 
-        r = await ask("É permitido usar conhecimento de fora no jogo (ex: conhecimentos mecânicos)? Explique sua resposta.")
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+        if not resposta:
+            # mesma pergunta de novo, sem renovar o prazo: o cartão continua valendo
+            try:
+                await channel.send(f"{message.author.mention} ❌ **{pergunta.chave}**: {erro}\nResponda de novo.",
+                                   delete_after=10)
+            except discord.HTTPException:
+                pass
+            s.aguardando = True
             return
-        answers["Conhecimento de Fora"] = r
 
-        r = await ask_mc("Em qual quebra de regra o RDM e VDM se encaixa?", [
-            "Atirar em alguém sem motivo.",
-            "Atropelar propositalmente.",
-            "Anti-RP.",
-            "Nenhuma das opções."
-        ])
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+        s.respostas[pergunta.chave] = resposta
+        s.indice += 1
+        if s.indice >= len(q):
+            await self._concluir(s, channel)
             return
-        answers["RDM/VDM"] = r
+        await self._enviar_pergunta(s, channel)
 
-        r = await ask_mc("O que é o Fear RP?", [
-            "Medo de morrer e se machucar.",
-            "Roleplay de preconceito.",
-            "Medo do que pode acontecer de ruim com o personagem.",
-            "Roleplay de bulling."
-        ])
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+    async def _enviar_pergunta(self, s: WLSession, channel: discord.TextChannel, renovar_prazo: bool = True):
+        # Um "cartão" por sessão, editado a cada pergunta (a view continua a mesma)
+        pergunta = questionario_da_guild(s.guild_id)[s.indice]
+        editado = False
+        if s.pergunta_msg_id:
+            try:
+                await channel.get_partial_message(s.pergunta_msg_id).edit(embed=pergunta.embed)
+                editado = True
+            except discord.HTTPException:
+                # apagado, sem acesso, limite de edição...: cai pro cartão novo em vez de travar a sessão
+                pass
+        if not editado:
+            msg = await channel.send(embed=pergunta.embed, view=self.controles())
+            s.pergunta_msg_id = msg.id
+        if renovar_prazo:
+            s.deadline = time.time() + pergunta.tempo
+        self._agendar_prazo(s)
+        # ✅ Estado gravado a cada resposta/pergunta
+        await self.store.salvar(s)
+        s.aguardando = True
+
+    def _agendar_prazo(self, s: WLSession):
+        AGENDA.agendar(f"wl_prazo:{s.channel_id}", "wl_prazo", s.deadline, s.guild_id,
+                       canal=s.channel_id, indice=s.indice)
+        lembrete = CONFIG.da_guild(s.guild_id).tempo_wl_lembrete
+        if lembrete and s.deadline - lembrete > time.time():
+            AGENDA.agendar(f"wl_lembrete:{s.channel_id}", "wl_lembrete", s.deadline - lembrete, s.guild_id,
+                           canal=s.channel_id, indice=s.indice)
+        else:
+            AGENDA.cancelar(f"wl_lembrete:{s.channel_id}")
+
+    async def _descartar(self, s: WLSession):
+        self.sessoes.pop(s.channel_id, None)
+        AGENDA.cancelar(f"wl_prazo:{s.channel_id}")
+        AGENDA.cancelar(f"wl_lembrete:{s.channel_id}")
+        AGENDA.cancelar(f"wl_reenvio:{s.channel_id}")
+        await self.store.remover(s.channel_id)
+
+    async def _finalizar(self, s: WLSession, channel: discord.TextChannel, motivo: str):
+        await self._descartar(s)
+        WL_ATIVAS.marcar(channel.id, "encerrada")
+        await encerrar_wl_channel(channel, motivo)
+
+    async def _concluir(self, s: WLSession, channel: discord.TextChannel, reenvio: bool = False):
+        # A sessão (com as respostas) só sai do banco depois que a revisão existe;
+        # se o envio pra staff falhar, fica parada e o envio é tentado de novo
+        if s.channel_id in self._enviando:
             return
-        answers["Fear RP"] = r
+        self._enviando.add(s.channel_id)
+        try:
+            s.aguardando = False
+            AGENDA.cancelar(f"wl_prazo:{s.channel_id}")
+            AGENDA.cancelar(f"wl_lembrete:{s.channel_id}")
+            await self.store.salvar(s)
+            answers = s.respostas
+            try:
+                staff_channel = get_wl_staff_channel(channel.guild)
+                if not staff_channel:
+                    raise RuntimeError(f"canal #{config_da_guild(channel.guild).nome('CANAL_WL_STAFF')} não encontrado")
+                embed_staff = questionario_da_guild(s.guild_id).embed_staff(s.user_id, answers)
+                msg = await staff_channel.send(embed=embed_staff, view=WLStaffReviewView.layout())
+                await REVIEWS.criar(WLReview(msg.id, channel.guild.id, s.user_id, answers["ID"], answers["Personagem"]))
+            except Exception:
+                logger.exception("Falha ao enviar a WL do canal %s para a staff.", channel.id)
+                AGENDA.agendar(f"wl_reenvio:{s.channel_id}", "wl_reenvio", time.time() + TEMPO_WL_REENVIO, s.guild_id,
+                               canal=s.channel_id, indice=s.indice)
+                if not reenvio:
+                    with suppress(discord.HTTPException):
+                        await channel.send(
+                            f"⚠️ <@{s.user_id}> não consegui enviar sua WL para a staff agora. "
+                            "Suas respostas estão salvas e o envio será tentado de novo automaticamente."
+                        )
+                return
+
+            await self._descartar(s)
+            WL_ATIVAS.marcar(channel.id, "enviada")
+        finally:
+            self._enviando.discard(s.channel_id)
+        await encerrar_wl_channel(channel, "WL enviada para análise da staff.")
 
-        r = await ask_mc("Qual dessas irregularidades quebra a regra de desenvolvimento do personagem?", [
-            "Realizar um corte de cabelo sem narrativa.",
-            "Assaltar um caixa eletrônico usando o veículo do táxi.",
-            "Assaltar um caixa eletrônico usando uma Ferrari.",
-            "Nenhuma das alternativas acima."
-        ])
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+    def _sessao_da_tarefa(self, dados: dict) -> Optional[WLSession]:
+        # tarefa antiga (de uma pergunta já respondida) não vale mais
+        s = self.sessoes.get(dados["canal"])
+        if s is None or s.indice != dados["indice"]:
+            return None
+        return s
+
+    async def _tarefa_prazo(self, client: discord.Client, dados: dict):
+        s = self._sessao_da_tarefa(dados)
+        if s is None:
             return
-        answers["Desenvolvimento"] = r
+        s.aguardando = False
+        channel = client.get_channel(s.channel_id)
+        if isinstance(channel, discord.TextChannel):
+            await self._finalizar(s, channel, "Tempo esgotado ou resposta inválida.")
+        else:
+            await self._descartar(s)
 
-        r = await ask_mc("Quais são as safe zones?", [
-            "Apenas hospital.",
-            "Mecânicas, garagens e empregos legais.",
-            "Empregos Ilegais e Hospital.",
-            "Nenhuma das alternativas acima."
-        ])
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+    async def _tarefa_reenvio(self, client: discord.Client, dados: dict):
+        s = self._sessao_da_tarefa(dados)
+        if s is None:
             return
-        answers["Safe Zones"] = r
+        channel = client.get_channel(s.channel_id)
+        if isinstance(channel, discord.TextChannel):
+            await self._concluir(s, channel, reenvio=True)
+        else:
+            await self._descartar(s)
 
-        r = await ask("Crie a história do seu personagem.")
-        if not r:
-            await encerrar_wl_channel(channel, "Tempo esgotado ou resposta inválida.")
+    async def _tarefa_lembrete(self, client: discord.Client, dados: dict):
+        s = self._sessao_da_tarefa(dados)
+        channel = client.get_channel(dados["canal"])
+        if s is None or channel is None:
             return
-        answers["História"] = r
+        restante = max(0, int(s.deadline - time.time()))
+        await channel.send(f"⏰ <@{s.user_id}> faltam **{max(1, restante // 60)} min** para responder a pergunta atual.")
+
+WL = WLEngine(WLSessionStore(DB))
+
+class WLFormModal(discord.ui.Modal):
+    def __init__(self, etapa: EtapaWL):
+        super().__init__(title=f"Whitelist — Etapa {etapa.numero + 1}/{etapa.total}", timeout=etapa.tempo)
+        self.etapa = etapa
+        self.campos: list[discord.ui.TextInput] = []
+        for p in etapa.perguntas:
+            campo = discord.ui.TextInput(
+                label=p.rotulo,
+                placeholder=p.texto[:100],
+                style=discord.TextStyle.paragraph if p.longa else discord.TextStyle.short,
+                min_length=min(p.min_caracteres, 4000) or None,
+                max_length=min(p.max_caracteres or 4000, 4000),
+                required=True
+            )
+            self.campos.append(campo)
+            self.add_item(campo)
+
+    @instrumentado
+    async def on_submit(self, interaction: discord.Interaction):
+        await WL.responder_modal(interaction, self.etapa, [c.value for c in self.campos])
 
-        staff_channel = get_wl_staff_channel(channel.guild)
-        if not staff_channel:
-            await encerrar_wl_channel(channel, f"Canal #{CANAL_WL_STAFF} não encontrado.")
+class WLFormView(discord.ui.View):
+    # Persistente e compartilhada: custom_ids fixos por etapa, dono vem da sessão
+    def __init__(self, etapa: EtapaWL):
+        super().__init__(timeout=None)
+        self.etapa = etapa
+        n = etapa.numero
+        if etapa.tipo == "modal":
+            b = discord.ui.Button(label="Responder", emoji="✍️", style=discord.ButtonStyle.green, custom_id=f"{etapa.prefixo}{n}_abrir")
+            b.callback = self.responder
+            self.add_item(b)
+        else:
+            for i, p in enumerate(etapa.perguntas):
+                sel = discord.ui.Select(
+                    custom_id=f"{etapa.prefixo}{n}_q{etapa.inicio + i}",
+                    placeholder=p.rotulo,
+                    options=[
+                        discord.SelectOption(label=f"{WL_LETRAS[j]}) {op}"[:100], value=WL_LETRAS[j])
+                        for j, op in enumerate(p.opcoes)
+                    ],
+                    row=i
+                )
+                sel.callback = partial(self.escolher, sel, p)
+                self.add_item(sel)
+            b = discord.ui.Button(label="Confirmar", emoji="✅", style=discord.ButtonStyle.green,
+                                  custom_id=f"{etapa.prefixo}{n}_ok", row=4)
+            b.callback = self.confirmar
+            self.add_item(b)
+        # "nr_wl_cancelar" é só do WLUserControlsView (que também atende cartões antigos de etapa)
+        cancelar = discord.ui.Button(label="Cancelar WL", emoji="🛑", style=discord.ButtonStyle.danger,
+                                     custom_id=f"{etapa.prefixo}{n}_cancelar", row=None if etapa.tipo == "modal" else 4)
+        cancelar.callback = cancelar_wl
+        self.add_item(cancelar)
+
+    @instrumentado
+    async def responder(self, interaction: discord.Interaction):
+        _, aviso = WL.sessao_do_dono(interaction, self.etapa)
+        if aviso:
+            await interaction.response.send_message(aviso, ephemeral=True)
             return
+        await interaction.response.send_modal(WLFormModal(self.etapa))
 
-        embed_staff = discord.Embed(
-            title="📝 Whitelist Recebida",
-            description=(
-                f"**Status:** 🟣 PENDENTE\n"
-                f"**Usuário:** {user.mention}\n"
-                f"**Discord ID:** `{user.id}`\n"
-                f"**ID:** `{answers['ID']}`\n"
-                f"**Personagem:** `{answers['Personagem']}`"
-            ),
-            color=ROXO
-        )
-        embed_staff.add_field(name="Idade (Personagem)", value=answers["Idade Personagem"][:1024], inline=True)
-        embed_staff.add_field(name="Idade (Real)", value=answers["Idade Real"][:1024], inline=True)
-        embed_staff.add_field(name="Hard Roleplay", value=answers["Hard Roleplay"][:1024], inline=False)
-        embed_staff.add_field(name="Conhecimento de Fora", value=answers["Conhecimento de Fora"][:1024], inline=False)
-        embed_staff.add_field(name="RDM/VDM", value=answers["RDM/VDM"][:1024], inline=True)
-        embed_staff.add_field(name="Fear RP", value=answers["Fear RP"][:1024], inline=True)
-        embed_staff.add_field(name="Desenvolvimento", value=answers["Desenvolvimento"][:1024], inline=False)
-        embed_staff.add_field(name="Safe Zones", value=answers["Safe Zones"][:1024], inline=False)
-        embed_staff.add_field(name="História", value=answers["História"][:1024], inline=False)
-        embed_staff.set_thumbnail(url=LOGO)
-
-        await staff_channel.send(
-            embed=embed_staff,
-            view=WLStaffReviewView(user_id=user.id, cidade_id=answers["ID"], personagem=answers["Personagem"])
-        )
+    @instrumentado
+    async def escolher(self, select: discord.ui.Select, pergunta: PerguntaWL, interaction: discord.Interaction):
+        await WL.escolher(interaction, self.etapa, pergunta, select.values[0])
 
-        await encerrar_wl_channel(channel, "WL enviada para análise da staff.")
-        return
+    @instrumentado
+    async def confirmar(self, interaction: discord.Interaction):
+        await WL.confirmar(interaction, self.etapa)
 
-    finally:
-        ACTIVE_WL.discard(channel.id)
+async def run_wl_flow_in_channel(bot: commands.Bot, channel: discord.TextChannel, user: discord.Member):
+    # Só cria a sessão e manda a 1ª pergunta; o resto anda pelo on_message
+    await WL.iniciar(channel, user)
 
 # =========================================================
 # WL: VIEW "Começar"
 # =========================================================
 class WLIniciarNoCanalView(discord.ui.View):
-    def __init__(self, user_id: int):
+    # Persistente (registrada no setup_hook): o dono vem do índice de WLs ativas
+    # pelo canal, então o botão funciona em canais criados antes de um restart
+    def __init__(self):
         super().__init__(timeout=None)
-        self.user_id = user_id
+
+    @classmethod
+    def layout(cls, usado: bool = False) -> "WLIniciarNoCanalView":
+        # só os botões (parada, pra não ficar guardada no view store por mensagem)
+        view = cls()
+        for item in view.children:
+            item.disabled = usado
+        view.stop()
+        return view
 
     @discord.ui.button(label="Começar Perguntas", emoji="🚀", style=discord.ButtonStyle.green, custom_id="nr_wl_comecar")
+    @instrumentado
     async def comecar(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.user_id:
+        ativa = WL_ATIVAS.do_canal(interaction.channel_id)
+        if ativa is None:
+            await interaction.response.send_message("❌ Essa WL não está mais ativa.", ephemeral=True)
+            return
+        if interaction.user.id != ativa.user_id:
             await interaction.response.send_message("❌ Apenas o dono da WL pode iniciar.", ephemeral=True)
             return
 
         await interaction.response.send_message("✅ Iniciando perguntas...", ephemeral=True)
 
-        for item in self.children:
-            item.disabled = True
         try:
-            await interaction.message.edit(view=self)
+            await interaction.message.edit(view=WLIniciarNoCanalView.layout(usado=True))
         except Exception:
             pass
 
@@ -932,25 +4305,32 @@ class WLPanelView(discord.ui.View):
         super().__init__(timeout=None)
 
     @discord.ui.button(label="Iniciar WL", emoji="📝", style=discord.ButtonStyle.green, custom_id="nr_wl_iniciar")
+    @instrumentado
     async def iniciar(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if await recusar_se_limitado(interaction, "wl_iniciar"):
+            return
+        existente = WL_ATIVAS.get(interaction.guild.id, interaction.user.id)
+        if existente is not None and existente.channel_id:
+            await interaction.response.send_message(f"⚠️ Você já tem uma WL aberta: <#{existente.channel_id}>", ephemeral=True)
+            return
         await interaction.response.defer(ephemeral=True)
 
-        if is_wl_locked():
+        if is_wl_locked(interaction.guild.id):
             await interaction.followup.send("🔒 WL TRANCADA no momento. Aguarde a staff.", ephemeral=True)
             return
 
         guild = interaction.guild
         user = interaction.user
 
-        categoria = discord.utils.get(guild.categories, name=CATEGORIA_WL)
+        categoria = get_config_category(guild, "CATEGORIA_WL")
         if not categoria:
             try:
-                categoria = await guild.create_category(CATEGORIA_WL)
+                categoria = await guild.create_category(config_da_guild(guild).nome("CATEGORIA_WL"))
             except discord.Forbidden:
                 await interaction.followup.send("❌ Sem permissão para criar a categoria WHITELIST.", ephemeral=True)
                 return
 
-        staff_role = discord.utils.get(guild.roles, name=CARGO_STAFF)
+        staff_role = get_config_role(guild, "CARGO_STAFF")
 
         overwrites = {
             guild.default_role: discord.PermissionOverwrite(view_channel=False),
@@ -959,17 +4339,35 @@ class WLPanelView(discord.ui.View):
         if staff_role:
             overwrites[staff_role] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
 
-        safe_name = user.name.lower().replace(" ", "-")
-        existing = discord.utils.get(categoria.text_channels, name=f"wl-{safe_name}")
+        existing = WL_ATIVAS.reservar(guild.id, user.id)
         if existing:
-            await interaction.followup.send(f"⚠️ Você já tem uma WL aberta: {existing.mention}", ephemeral=True)
+            if existing.channel_id:
+                await interaction.followup.send(f"⚠️ Você já tem uma WL aberta: <#{existing.channel_id}>", ephemeral=True)
+            else:
+                await interaction.followup.send("⏳ Sua WL já está sendo criada.", ephemeral=True)
             return
+        if not await WL_ATIVAS.reservar_global(guild.id, user.id):
+            WL_ATIVAS.liberar(guild.id, user.id)
+            await interaction.followup.send("⏳ Sua WL já está sendo criada.", ephemeral=True)
+            return
+
+        safe_name = user.name.lower().replace(" ", "-")
 
+        async def gerar_nome() -> str:
+            return f"wl-{safe_name}"
+
+        wl_channel = None
         try:
-            wl_channel = await guild.create_text_channel(name=f"wl-{safe_name}", category=categoria, overwrites=overwrites)
+            wl_channel = await obter_canal(interaction, "wl", "CATEGORIA_WL", categoria, overwrites, gerar_nome, "canal de WL")
         except discord.Forbidden:
             await interaction.followup.send("❌ Sem permissão para criar canal WL.", ephemeral=True)
             return
+        finally:
+            if wl_channel is None:
+                WL_ATIVAS.liberar(guild.id, user.id)
+        if wl_channel is None:
+            return
+        WL_ATIVAS.confirmar(guild.id, user.id, wl_channel.id)
 
         await interaction.followup.send(f"✅ Sua WL foi criada: {wl_channel.mention}", ephemeral=True)
 
@@ -978,23 +4376,24 @@ class WLPanelView(discord.ui.View):
             description=(
                 f"{user.mention}, bem-vindo(a)!\n\n"
                 "Você vai responder **pergunta por pergunta**.\n"
-                f"⏳ **{TEMPO_WL_POR_PERGUNTA // 60} min por pergunta**.\n\n"
+                f"⏳ **{config_da_guild(guild).tempo_wl_por_pergunta // 60} min por pergunta**.\n\n"
                 "Clique em **Começar Perguntas**."
             ),
             color=ROXO
         )
         embed.set_thumbnail(url=LOGO)
 
-        await wl_channel.send(embed=embed, view=WLIniciarNoCanalView(user_id=user.id))
+        await wl_channel.send(embed=embed, view=WLIniciarNoCanalView.layout())
 
     @discord.ui.button(label="Travar/Destravar WL", emoji="🔒", style=discord.ButtonStyle.secondary, custom_id="nr_wl_toggle_lock")
+    @instrumentado
     async def toggle_lock(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not is_staff(interaction.user):
             await interaction.response.send_message("❌ Apenas staff.", ephemeral=True)
             return
 
-        locked = is_wl_locked()
-        set_wl_locked(not locked)
+        locked = is_wl_locked(interaction.guild.id)
+        set_wl_locked(interaction.guild.id, not locked)
         now_locked = not locked
 
         # ✅ Atualiza o painel (embed) na mesma mensagem
@@ -1005,7 +4404,7 @@ class WLPanelView(discord.ui.View):
                 embed.description = (
                     f"Status da WL: **{status}**\n\n"
                     "Clique para iniciar sua WL.\n"
-                    f"⏳ **{TEMPO_WL_POR_PERGUNTA // 60} min por pergunta**."
+                    f"⏳ **{config_da_guild(interaction.guild).tempo_wl_por_pergunta // 60} min por pergunta**."
                 )
                 await interaction.message.edit(embed=embed, view=self)
         except Exception:
@@ -1014,33 +4413,170 @@ class WLPanelView(discord.ui.View):
         state = "TRANCADA 🔒" if now_locked else "DESTRANCADA ✅"
         await interaction.response.send_message(f"✅ WL agora está: **{state}**", ephemeral=True)
 
+# =========================================================
+# MÉTRICAS: gauges (lidos na hora do scrape)
+# =========================================================
+METRICAS.gauge("nr_tickets_abertos", "Tickets abertos", lambda: sum(STATE.abertos_por_usuario.values()))
+METRICAS.gauge("nr_wl_sessoes", "Sessões de WL respondendo perguntas", lambda: len(WL.sessoes))
+METRICAS.gauge("nr_wl_ativas", "WLs com canal aberto", lambda: len(WL_ATIVAS))
+METRICAS.gauge("nr_logs_fila", "Logs esperando envio", LOGS.tamanho_fila)
+METRICAS.gauge("nr_logs_enviados_total", "Logs enviados", lambda: LOGS.enviados, "counter")
+METRICAS.gauge("nr_logs_descartados_total", "Logs descartados com a fila cheia", lambda: LOGS.descartados, "counter")
+METRICAS.gauge("nr_provisao_fila", "Pedidos de canal na fila", lambda: PROVISAO.metricas()["fila_total"])
+METRICAS.gauge("nr_pool_disponiveis", "Canais prontos no pool", lambda: POOL.metricas()["disponiveis"])
+METRICAS.gauge("nr_agenda_pendentes", "Tarefas agendadas", AGENDA.pendentes)
+METRICAS.gauge("nr_throttle_recusas_total", "Cliques recusados pelo throttle", lambda: THROTTLE.recusas, "counter")
+
 # =========================================================
 # BOT
 # =========================================================
-class NewRepublicBOT(commands.Bot):
+# Com NR_SHARDS o bot vira AutoShardedBot; NR_SHARD_IDS divide os shards entre processos
+_BOT_BASE = commands.AutoShardedBot if SHARDS else commands.Bot
+
+class NewRepublicBOT(_BOT_BASE):
     def __init__(self):
-        super().__init__(command_prefix="nr", intents=intents)
+        shards = {}
+        if SHARD_COUNT:
+            shards["shard_count"] = SHARD_COUNT
+        if SHARD_IDS:
+            shards["shard_ids"] = list(SHARD_IDS)
+        super().__init__(command_prefix="nr", intents=intents, http_trace=trace_http(), **shards)
 
     async def setup_hook(self):
+        logger.info(
+            "[config] %s IDs fixos carregados (%s); o resto por nome. %s guild(s) com config própria.",
+            len(CONFIG.ids), CONFIG_FILE if CONFIG_FILE.exists() else "sem config.json, só env", len(CONFIG.guilds)
+        )
+        if SHARDS:
+            logger.info(
+                "[shard] %s shards, este processo: %s (estado compartilhado: %s)",
+                SHARD_COUNT or "auto", list(SHARD_IDS) or "todos", ESTADO_BACKEND
+            )
+        await TICKET_REPO.abrir()
+        await ESTADO.abrir()
+        await STATE.carregar()
+        await AGENDA.carregar()
+        await WL.carregar()
+        await REVIEWS.abrir()
+        await WL_ATIVAS.carregar()
+        LOGS.iniciar()
+        await SERVIDOR_METRICAS.iniciar()
+        WATCHDOG.iniciar()
+
         self.add_view(VerificarView())
         self.add_view(TicketPanel())
         self.add_view(TicketControls())
         self.add_view(WLPanelView())
+        self.add_view(WLIniciarNoCanalView())
+        WL.registrar_views(self)
+        self.add_view(WLStaffReviewView())
 
-        # Sync
-        if GUILD_ID:
-            guild_obj = discord.Object(id=int(GUILD_ID))
-            self.tree.copy_global_to(guild=guild_obj)
-            await self.tree.sync(guild=guild_obj)
+        # Sync: uma chamada por guild configurada (cada uma no seu bucket de rate limit).
+        # Com vários processos, só o do shard 0 sincroniza.
+        if not PROCESSO_PRINCIPAL:
+            return
+        if GUILD_IDS:
+            await asyncio.gather(*(self._sync_guild(gid) for gid in GUILD_IDS))
         else:
             await self.tree.sync()
 
+    async def _sync_guild(self, guild_id: int):
+        guild_obj = discord.Object(id=guild_id)
+        self.tree.copy_global_to(guild=guild_obj)
+        try:
+            await self.tree.sync(guild=guild_obj)
+        except discord.HTTPException as e:
+            # bot fora da guild (ou sem applications.commands) não derruba o start
+            logger.warning("[sync] guild %s: %s %s", guild_id, e.status, e.text)
+
+    # ✅ Índice de nomes: montado no ready e mantido pelos eventos
+    async def on_ready(self):
+        for guild in self.guilds:
+            LOOKUP.construir(guild)
+            self.relatorio_config(guild)
+            POOL.adotar(guild)
+            WL_ATIVAS.reconstruir(guild)
+            reconciliar_tickets(guild)
+        POOL.iniciar(self)
+        await WL.retomar(self)
+        AGENDA.iniciar(self)
+
+    async def on_message(self, message: discord.Message):
+        # ✅ Respostas de WL: um despachante só, por channel_id
+        if not message.author.bot and message.guild is not None:
+            await WL.on_message(message)
+        await self.process_commands(message)
+
+    async def on_guild_join(self, guild: discord.Guild):
+        LOOKUP.construir(guild)
+        self.relatorio_config(guild)
+        WL_ATIVAS.reconstruir(guild)
+
+    def relatorio_config(self, guild: discord.Guild):
+        # ✅ Validação na subida: tudo que faltar aparece aqui, não no meio de um clique
+        problemas, sem_id = validar_config(guild)
+        for p in problemas:
+            logger.warning("[config] %s (%s): %s", guild.name, guild.id, p)
+        if sem_id:
+            logger.info("[config] %s: resolvidos por nome (fixe os IDs): %s", guild.name, " ".join(sem_id))
+        if not problemas:
+            logger.info("[config] %s: todos os %s itens configurados encontrados.", guild.name, len(CONFIG_ITENS))
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        LOOKUP.remover_guild(guild.id)
+
+    async def on_guild_role_create(self, role: discord.Role):
+        LOOKUP.cargo_criado(role)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        LOOKUP.cargo_removido(role)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        LOOKUP.cargo_atualizado(before, after)
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        LOOKUP.canal_criado(channel)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        LOOKUP.canal_removido(channel)
+        LOGS.esquecer_canal(channel)
+        POOL.esquecer(channel)
+        AGENDA.cancelar(f"apagar:{channel.id}")
+        # ✅ Canal de ticket apagado na mão: não pode continuar contando no limite do usuário
+        if get_ticket_data(channel.id) is not None:
+            delete_ticket_data(channel.id)
+        WL_ATIVAS.canal_removido(channel.id)
+        await WL.canal_removido(channel.id)
+
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        LOOKUP.canal_atualizado(before, after)
+
+    async def close(self):
+        # ✅ Logs pendentes saem antes de fechar a sessão HTTP
+        await LOGS.parar()
+        await POOL.parar()
+        await AGENDA.parar()
+        await WL_ATIVAS.parar()
+        await SERVIDOR_METRICAS.parar()
+        await WATCHDOG.parar()
+        # desligando o bot ninguém pediu o arquivo: só para a amostragem
+        await PERFIL.desligar(gravar=False)
+        try:
+            await super().close()
+        finally:
+            # ✅ Flush garantido antes de soltar o banco
+            await STATE.fechar()
+            await ESTADO.fechar()
+            await TICKET_REPO.fechar()
+            await DB.close()
+
 bot = NewRepublicBOT()
 
 # =========================================================
 # SLASH COMMANDS
 # =========================================================
 @bot.tree.command(name="painel_registro", description="Envia o painel de verificação/registro")
+@instrumentado
 async def painel_registro(interaction: discord.Interaction):
     embed = discord.Embed(
         title="🔐 Verificação • New Republic",
@@ -1060,6 +4596,7 @@ async def painel_registro(interaction: discord.Interaction):
     await interaction.channel.send(embed=embed, view=VerificarView())
 
 @bot.tree.command(name="ticket_painel", description="Envia o painel da central de tickets")
+@instrumentado
 async def ticket_painel(interaction: discord.Interaction):
     embed = discord.Embed(
         title="🎫 Central de Atendimento",
@@ -1077,14 +4614,16 @@ async def ticket_painel(interaction: discord.Interaction):
 
 @bot.tree.command(name="anunciar", description="Enviar anúncio em embed (somente staff/admin)")
 @app_commands.checks.has_permissions(manage_messages=True)
+@instrumentado
 async def anunciar(interaction: discord.Interaction, titulo: str, mensagem: str):
     await interaction.response.defer(ephemeral=True)
     await interaction.channel.send(embed=build_announcement_embed(titulo, mensagem))
     await interaction.followup.send("✅ Anúncio enviado.", ephemeral=True)
 
 @bot.tree.command(name="wl_painel", description="Envia o painel para iniciar a whitelist")
+@instrumentado
 async def wl_painel(interaction: discord.Interaction):
-    locked = is_wl_locked()
+    locked = is_wl_locked(interaction.guild.id)
     status = "🔒 TRANCADA" if locked else "✅ ABERTA"
 
     embed = discord.Embed(
@@ -1092,7 +4631,7 @@ async def wl_painel(interaction: discord.Interaction):
         description=(
             f"Status da WL: **{status}**\n\n"
             "Clique para iniciar sua WL.\n"
-            f"⏳ **{TEMPO_WL_POR_PERGUNTA // 60} min por pergunta**."
+            f"⏳ **{config_da_guild(interaction.guild).tempo_wl_por_pergunta // 60} min por pergunta**."
         ),
         color=ROXO
     )
@@ -1100,6 +4639,81 @@ async def wl_painel(interaction: discord.Interaction):
     await interaction.response.send_message("✅ Painel de WL enviado.", ephemeral=True)
     await interaction.channel.send(embed=embed, view=WLPanelView())
 
+@bot.tree.command(name="provisao_status", description="Fila de criação de canais (somente staff)")
+@instrumentado
+async def provisao_status(interaction: discord.Interaction):
+    if not is_staff(interaction.user):
+        await interaction.response.send_message("❌ Apenas staff.", ephemeral=True)
+        return
+    m = PROVISAO.metricas()
+    embed = discord.Embed(title="🏗️ Fila de criação de canais", color=AZUL)
+    embed.add_field(name="Na fila", value=str(m["fila_total"]), inline=True)
+    embed.add_field(name="Criando agora", value=str(m["em_andamento"]), inline=True)
+    embed.add_field(name="Atendidos / falhas", value=f"{m['atendidos']} / {m['falhas']}", inline=True)
+    embed.add_field(name="Espera média", value=f"{m['espera_media_s']:.1f}s", inline=True)
+    embed.add_field(name="Espera máxima", value=f"{m['espera_max_s']:.1f}s", inline=True)
+    if POOL.ativo:
+        pm = POOL.metricas()
+        embed.add_field(
+            name="Pool de canais",
+            value=f"{pm['disponiveis']} prontos • hits {pm['hits']} / misses {pm['misses']} ({pm['taxa_hit']:.0%})",
+            inline=False
+        )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="perfil", description="Liga/desliga o perfil de CPU do bot (somente staff)")
+@instrumentado
+async def perfil(interaction: discord.Interaction, acao: Literal["ligar", "desligar"]):
+    if not is_staff(interaction.user):
+        await interaction.response.send_message("❌ Apenas staff.", ephemeral=True)
+        return
+    if acao == "ligar":
+        if not PERFIL.ligar():
+            await interaction.response.send_message("⚠️ O perfil já está ligado.", ephemeral=True)
+            return
+        await interaction.response.send_message(
+            f"🔬 Perfil ligado (1 amostra a cada {PERFIL_INTERVALO * 1000:.0f} ms). Use `/perfil desligar` para gerar o arquivo.",
+            ephemeral=True
+        )
+        return
+
+    if not PERFIL.ativo:
+        await interaction.response.send_message("⚠️ O perfil não está ligado.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    duracao = time.monotonic() - PERFIL.inicio
+    caminho = await PERFIL.desligar()
+    ocupadas = sum(PERFIL.amostras.values())
+    embed = discord.Embed(title="🔬 Perfil do event loop", color=AZUL)
+    embed.add_field(name="Duração", value=f"{duracao:.0f}s", inline=True)
+    embed.add_field(name="Amostras", value=f"{ocupadas} ocupado • {PERFIL.ociosas} ocioso", inline=True)
+    embed.add_field(
+        name="Travamentos (watchdog)",
+        value=f"{WATCHDOG.travamentos} • pior {WATCHDOG.pior_lag:.2f}s",
+        inline=True
+    )
+    pesados = PERFIL.mais_pesados()
+    if pesados:
+        embed.add_field(
+            name="Mais pesados",
+            value="\n".join(f"`{q.split(':', 1)[1]}` — {n / ocupadas:.0%}" for q, n in pesados)[:1024],
+            inline=False
+        )
+    embed.set_footer(text=f"{caminho.name} • abra em speedscope.app ou flamegraph.pl")
+    await interaction.followup.send(embed=embed, file=discord.File(caminho), ephemeral=True)
+
+@bot.tree.command(name="wl_fila", description="Revisar WLs pendentes em lote (somente staff)")
+@instrumentado
+async def wl_fila(interaction: discord.Interaction):
+    if not is_staff(interaction.user):
+        await interaction.response.send_message("❌ Apenas staff.", ephemeral=True)
+        return
+    embed, view = await pagina_fila(interaction.guild, 0)
+    if view is None:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
 # =========================================================
 # CHANGELOG: /log (abre modal, envia no mesmo canal)
 # =========================================================
@@ -1135,6 +4749,7 @@ class LogModal(discord.ui.Modal, title="📌 Nova Change Log — New Republic"):
         super().__init__()
         self.author = author
 
+    @instrumentado
     async def on_submit(self, interaction: discord.Interaction):
         channel = interaction.channel
         if channel is None:
@@ -1162,12 +4777,14 @@ class LogModal(discord.ui.Modal, title="📌 Nova Change Log — New Republic"):
 
 @bot.tree.command(name="log", description="Criar uma Change Log (abre um painel).")
 @app_commands.checks.has_permissions(manage_guild=True)
+@instrumentado
 async def log(interaction: discord.Interaction):
     await interaction.response.send_modal(LogModal(interaction.user))
 
 # =========================================================
 # START
 # =========================================================
-if not TOKEN:
-    raise RuntimeError("DISCORD_TOKEN não encontrado no Render.")
-bot.run("MTQ3NTQ5NzgxMjE5MDk1NzY4MA.G7H61J.nJaP66zpMepqxgeMqZzKykCz1XqcgOqLZkHGpk")
\ No newline at end of file
+if __name__ == "__main__":
+    if not TOKEN:
+        raise RuntimeError("DISCORD_TOKEN não encontrado no Render.")
+    bot.run(TOKEN)
\ No newline at end of file